@@ -1,10 +1,12 @@
 from .analyze import calc_profile_props as analyze_profile
 from .excel_config import CryoGridConfigExcel
-from .forcing import era5_to_matlab
+from .forcing import era5_to_matlab, era5_to_matlab_chunked
 from .matlab_helpers import read_mat_struct_as_dataset, read_mat_struct_flat_as_dict
 from .outputs import read_OUT_regridded_files, read_OUT_regridded_file, read_OUT_regridded_FCI2_file
 from .utils import change_logger_level as _change_logger_level
+from . import bias_correction
 from . import spatial_clusters
+from . import trends
 
 _change_logger_level("INFO")
 
@@ -15,7 +17,10 @@ __all__ = [
     "read_OUT_regridded_FCI2_file",
     "read_OUT_regridded_files",
     "era5_to_matlab",
+    "era5_to_matlab_chunked",
     "CryoGridConfigExcel",
     "analyze_profile",
+    "bias_correction",
     "spatial_clusters",
+    "trends",
 ]
@@ -2,7 +2,9 @@ import numpy as np
 import xarray as xr
 
 
-def calc_profile_props(ground_temperature_profile: xr.DataArray) -> xr.Dataset:
+def calc_profile_props(
+    ground_temperature_profile: xr.DataArray, interpolate_depths: bool = False
+) -> xr.Dataset:
     """
     Get properties of the ground temperature profile
 
@@ -10,6 +12,11 @@ def calc_profile_props(ground_temperature_profile: xr.DataArray) -> xr.Dataset:
     ----------
     ground_temperature_profile : xr.DataArray
         Ground temperature profile in degrees Celsius
+    interpolate_depths : bool, optional
+        If True, the active layer and bottom thawing depths are found by linearly
+        interpolating the 0 °C crossing between output levels (see
+        get_zero_isotherm_depth). If False [default], depths are snapped to the
+        nearest output level.
 
     Returns
     -------
@@ -19,9 +26,11 @@ def calc_profile_props(ground_temperature_profile: xr.DataArray) -> xr.Dataset:
         - active_layer_mask: True if active layer, False otherwise
         - permafrost_mask: True if permafrost, False otherwise
         - permafrost_state: 1 if permafrost, 2 if active layer, 3 if bottom thawing
-        - active_layer_depth: Depth of the active layer (m)
+        - active_layer_depth: Depth of the active layer (m), 0 if the
+          ground does not thaw and NaN if there is no permafrost
         - bottom_thawing_depth: Depth of the bottom thawing layer (m)
-        - permafrost_thickness: Thickness of the permafrost layer (m)
+        - permafrost_thickness: Thickness of the permafrost layer (m), 0 if
+          there is no permafrost
         - active_layer_temp: Statistics of the active layer temperature
         - permafrost_temp: Statistics of the permafrost temperature
 
@@ -70,13 +79,22 @@ def calc_profile_props(ground_temperature_profile: xr.DataArray) -> xr.Dataset:
     )
 
     # derived varaibles
-    ds["active_layer_depth"] = get_mask_depth(active_layer_mask_year)
-    ds["bottom_thawing_depth"] = get_mask_depth(~bottom_thawing_mask_year).where(
-        lambda x: x != 0
-    )
-    ds["permafrost_thickness"] = ds.active_layer_depth - ds.bottom_thawing_depth.fillna(
-        depth.min()
-    )
+    if interpolate_depths:
+        ds["active_layer_depth"] = calc_active_layer_depth(da)
+        ds["bottom_thawing_depth"] = calc_bottom_thawing_depth(da).where(
+            bottom_thawing_mask_year.any("depth")
+        )
+    else:
+        ds["active_layer_depth"] = get_mask_depth(active_layer_mask_year)
+        ds["bottom_thawing_depth"] = get_mask_depth(~bottom_thawing_mask_year).where(
+            lambda x: x != 0
+        )
+    # years without permafrost are encoded the same way for both depth methods
+    has_permafrost = (~active_layer_mask_year & ~bottom_thawing_mask_year).any("depth")
+    ds["active_layer_depth"] = ds.active_layer_depth.where(has_permafrost)
+    ds["permafrost_thickness"] = (
+        ds.active_layer_depth - ds.bottom_thawing_depth.fillna(depth.min())
+    ).where(has_permafrost, 0)
 
     # layer statistics
     ds["active_layer_temp"] = da.where(active_layer_mask).pipe(get_annual_stats)
@@ -220,6 +238,236 @@ def get_mask_depth(mask: xr.DataArray) -> xr.DataArray:
     return mask_depth
 
 
+def get_zero_isotherm_depth(
+    temperature: xr.DataArray,
+    dim: str = "depth",
+    from_surface: bool = True,
+    threshold: float = 0.0,
+) -> xr.DataArray:
+    """
+    Find the depth where the temperature first crosses the threshold (0 °C)
+
+    The search starts at the surface (or the bottom) of each profile and finds
+    the first pair of adjacent levels that bracket the threshold. The depth of
+    the crossing is then linearly interpolated between these two levels, so
+    the result is not restricted to the output levels. All other dimensions
+    (e.g., profile, year) are processed in one call and dask arrays are
+    processed chunk by chunk.
+
+    Parameters
+    ----------
+    temperature : xr.DataArray
+        Temperature in degrees Celsius with `dim` as a dimension.
+    dim : str, optional
+        The name of the vertical dimension, by default "depth". The coordinate
+        values must increase towards the surface (i.e., negative depths below
+        the surface or elevation).
+    from_surface : bool, optional
+        If True [default], search downwards from the surface. If False, search
+        upwards from the deepest level.
+    threshold : float, optional
+        The temperature of the isotherm, by default 0.0
+
+    Returns
+    -------
+    xr.DataArray
+        Interpolated depth of the first crossing (same units as `dim`).
+        NaN where the profile does not cross the threshold.
+    """
+    assert dim in temperature.dims, f"{dim} dimension is required"
+
+    # order levels so that the search starts at the first element
+    da = temperature.sortby(dim, ascending=not from_surface)
+    if da[dim].size < 2:
+        raise ValueError(f"At least two levels along `{dim}` are required")
+
+    if da.chunks is not None:
+        da = da.chunk({dim: -1})
+
+    depth = da[dim].values.astype("float64")
+
+    out = xr.apply_ufunc(
+        _zero_crossing_kernel,
+        da,
+        input_core_dims=[[dim]],
+        kwargs=dict(levels=depth, threshold=threshold),
+        dask="parallelized",
+        output_dtypes=["float64"],
+    )
+
+    out = out.assign_attrs(
+        long_name=f"Depth of the {threshold} degC isotherm",
+        units=temperature[dim].attrs.get("units", "m"),
+    )
+
+    return out
+
+
+def _zero_crossing_kernel(
+    arr: np.ndarray, levels: np.ndarray, threshold: float = 0.0
+) -> np.ndarray:
+    """
+    Locate the first threshold crossing along the last axis of arr.
+
+    Only boolean and [..., 2] float temporaries are created, so the memory
+    overhead is small compared to the input array.
+    """
+    above = arr > threshold
+    # crossings between level k and k + 1 (NaNs are never part of a crossing)
+    valid = ~np.isnan(arr)
+    crossing = (above[..., :-1] != above[..., 1:]) & valid[..., :-1] & valid[..., 1:]
+
+    has_crossing = crossing.any(axis=-1)
+    k0 = crossing.argmax(axis=-1)[..., None]
+
+    t0 = np.take_along_axis(arr, k0, axis=-1)[..., 0]
+    t1 = np.take_along_axis(arr, k0 + 1, axis=-1)[..., 0]
+    z0 = levels[k0[..., 0]]
+    z1 = levels[k0[..., 0] + 1]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        frac = (threshold - t0) / (t1 - t0)
+    depth = z0 + frac * (z1 - z0)
+
+    return np.where(has_crossing, depth, np.nan)
+
+
+def calc_active_layer_depth(ground_temperature: xr.DataArray) -> xr.DataArray:
+    """
+    Interpolated active layer depth (maximum annual thaw depth)
+
+    The annual maximum temperature of each level is computed and the depth of
+    the first 0 °C crossing below the surface is found with
+    get_zero_isotherm_depth. Profiles without any thaw at the surface are set
+    to 0, profiles that are thawed over the entire depth are NaN.
+
+    Parameters
+    ----------
+    ground_temperature : xr.DataArray
+        Ground temperature in degrees Celsius with depth and time dimensions.
+        Can contain any number of profiles (e.g., gridcell / profile dims).
+
+    Returns
+    -------
+    xr.DataArray
+        Active layer depth (m) reported for each year
+    """
+    da = ground_temperature.pipe(get_ground_only)
+    max_temp_annual = da.groupby("time.year").max()
+
+    surface = max_temp_annual.sel(depth=max_temp_annual.depth.max(), drop=True)
+    depth = get_zero_isotherm_depth(max_temp_annual, from_surface=True)
+    depth = depth.where(surface > 0, 0)
+
+    return depth.assign_attrs(long_name="Active layer depth", units="m")
+
+
+def calc_bottom_thawing_depth(ground_temperature: xr.DataArray) -> xr.DataArray:
+    """
+    Interpolated upper depth of the layer thawing from below
+
+    The annual maximum temperature of each level is computed and the depth of
+    the first 0 °C crossing above the deepest level is found with
+    get_zero_isotherm_depth. Profiles where the deepest level is frozen are NaN.
+
+    Parameters
+    ----------
+    ground_temperature : xr.DataArray
+        Ground temperature in degrees Celsius with depth and time dimensions.
+
+    Returns
+    -------
+    xr.DataArray
+        Bottom thawing depth (m) reported for each year
+    """
+    da = ground_temperature.pipe(get_ground_only)
+    max_temp_annual = da.groupby("time.year").max()
+
+    bottom = max_temp_annual.sel(depth=max_temp_annual.depth.min(), drop=True)
+    depth = get_zero_isotherm_depth(max_temp_annual, from_surface=False)
+    depth = depth.where(bottom > 0)
+
+    return depth.assign_attrs(long_name="Bottom thawing depth", units="m")
+
+
+def calc_trumpet_curves(
+    ground_temperature: xr.DataArray,
+    stats: tuple = ("min", "mean", "max"),
+    cluster_labels: xr.DataArray = None,
+) -> xr.Dataset:
+    """
+    Compute the annual temperature envelopes ("trumpet curves") of profiles
+
+    The annual statistics are computed for all profiles and depths in a single
+    grouped reduction over time. Dask arrays are reduced lazily.
+
+    Parameters
+    ----------
+    ground_temperature : xr.DataArray
+        Ground temperature in degrees Celsius with a time dimension and a
+        vertical dimension (depth or level). Can have any number of other
+        dimensions (e.g., profile from read_OUT_regridded_files).
+    stats : tuple of str, optional
+        Names of the reductions to compute for each year, by default
+        ("min", "mean", "max"). Any groupby reduction method is valid
+        (e.g., "median", "std").
+    cluster_labels : xr.DataArray, optional
+        2D array with the index of the cluster centroid of each pixel (e.g.
+        `cluster_centroid_index_mapped` from spatial_clusters.read_spatial_data).
+        If given, the `profile` dimension is mapped to the [y, x] grid.
+
+    Returns
+    -------
+    xr.Dataset
+        Dataset with the following variables:
+        - envelope: annual statistics with dims [..., year, depth, stat]
+        - amplitude: annual temperature range (max - min) with dims [..., year, depth]
+    """
+    da = ground_temperature
+    assert "time" in da.dims, "time dimension is required"
+    if "level" in da.dims and "depth" in da.coords and "depth" not in da.dims:
+        da = da.swap_dims(level="depth")
+
+    grouped = da.groupby("time.year")
+    reductions = {stat: getattr(grouped, stat)("time") for stat in stats}
+    minimum = reductions["min"] if "min" in reductions else grouped.min("time")
+    maximum = reductions["max"] if "max" in reductions else grouped.max("time")
+
+    envelope = xr.concat(
+        list(reductions.values()), dim=xr.Variable("stat", list(reductions))
+    )
+    vertical = "depth" if "depth" in envelope.dims else "level"
+    envelope = envelope.transpose(..., "year", vertical, "stat")
+
+    amplitude = maximum - minimum
+    amplitude = amplitude.transpose(..., "year", vertical)
+
+    ds = xr.Dataset(
+        dict(
+            envelope=envelope.assign_attrs(
+                long_name="Annual temperature envelope", units="degC"
+            ),
+            amplitude=amplitude.assign_attrs(
+                long_name="Annual temperature amplitude", units="degC"
+            ),
+        ),
+        attrs=dict(description="Trumpet curves of the ground temperature profile"),
+    )
+
+    if cluster_labels is not None:
+        from .spatial_clusters import map_gridcells_to_clusters
+
+        assert "profile" in ds.dims, "profile dimension is required for mapping"
+        ds = ds.map(
+            map_gridcells_to_clusters,
+            keep_attrs=True,
+            cluster_labels=cluster_labels,
+            dim="profile",
+        )
+
+    return ds
+
+
 def get_ground_only(profile: xr.DataArray) -> xr.DataArray:
     da = profile.sortby("depth").sel(depth=slice(-np.inf, 0))
     da = da.dropna("depth", how="all")
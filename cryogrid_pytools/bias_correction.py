@@ -0,0 +1,228 @@
+import numpy as np
+import xarray as xr
+
+
+def fit_quantile_mapping(
+    model: xr.DataArray,
+    observed: xr.DataArray,
+    n_quantiles: int = 99,
+    by_month: bool = True,
+) -> xr.Dataset:
+    """
+    Fit empirical quantile maps of model data (e.g., ERA5) to observations
+
+    The quantiles of all gridcells (and months) are computed at once with
+    xarray's vectorised quantile along time. The calibration periods of the
+    model and the observations do not have to overlap exactly, but must
+    have the same time resolution (e.g., resample hourly ERA5 to the
+    resolution of the station data).
+
+    Parameters
+    ----------
+    model : xr.DataArray
+        Model data with a time dimension (e.g., T2 from read_mat_ear5 with
+        dims [time, lat, lon]) over the calibration period.
+    observed : xr.DataArray
+        Observations with a time dimension. The other dimensions must either
+        match those of model (e.g., gridded or per-gridcell observations)
+        or be absent (e.g., a single station that is used for all
+        gridcells).
+    n_quantiles : int, optional
+        Number of quantiles between 0 and 1 (including both), by default 99.
+    by_month : bool, optional
+        If True [default], a quantile map is fit for each calendar month.
+
+    Returns
+    -------
+    xr.Dataset
+        Dataset with `model_quantiles` and `observed_quantiles` with dims
+        [month, quantile, ...] (without month if by_month is False).
+    """
+    assert "time" in model.dims, "model must have a time dimension"
+    assert "time" in observed.dims, "observed must have a time dimension"
+    assert n_quantiles >= 2, "n_quantiles must be at least 2"
+
+    quantiles = np.linspace(0, 1, n_quantiles)
+
+    def calc_quantiles(da):
+        if da.chunks is not None:
+            da = da.chunk(time=-1)
+        if by_month:
+            return da.groupby("time.month").quantile(quantiles, dim="time")
+        return da.quantile(quantiles, dim="time")
+
+    qmap = xr.Dataset(
+        dict(
+            model_quantiles=calc_quantiles(model),
+            observed_quantiles=calc_quantiles(observed),
+        )
+    )
+    qmap = qmap.transpose(*[d for d in ["month", "quantile"] if d in qmap.dims], ...)
+    qmap.attrs = dict(
+        description="Empirical quantile mapping",
+        by_month=int(by_month),
+        units=model.attrs.get("units", ""),
+    )
+
+    return qmap
+
+
+def apply_quantile_mapping(
+    model: xr.DataArray,
+    qmap: xr.Dataset,
+    kind: str = "additive",
+    time_chunk: int = 744,
+) -> xr.DataArray:
+    """
+    Bias correct model data with a quantile map (lazily, in time chunks)
+
+    Each value is mapped from the model to the observed distribution by
+    linear interpolation between the quantiles of its gridcell (and month).
+    The interpolation is vectorised over all gridcells. The correction is
+    applied lazily with dask in chunks of `time_chunk` time steps, so that
+    decades of hourly forcing can be corrected and written, e.g., with
+    forcing.write_mat_era5.
+
+    Parameters
+    ----------
+    model : xr.DataArray
+        Model data with a time dimension (e.g., T2 from read_mat_ear5).
+    qmap : xr.Dataset
+        Quantile map from fit_quantile_mapping.
+    kind : str, optional
+        How values outside the fitted range are corrected:
+        - "additive" [default]: the correction of the nearest quantile is
+          added (e.g., temperature)
+        - "multiplicative": the ratio of the nearest quantile is applied,
+          zeros stay zero and the output is not negative (e.g., precipitation)
+    time_chunk : int, optional
+        Number of time steps corrected at a time, by default 744.
+
+    Returns
+    -------
+    xr.DataArray
+        The bias corrected data (lazy dask array) with the shape of model.
+    """
+    assert kind in ["additive", "multiplicative"], (
+        "kind must be 'additive' or 'multiplicative'"
+    )
+
+    by_month = "month" in qmap.dims
+    spatial_dims = [
+        d for d in qmap.model_quantiles.dims if d not in ["month", "quantile"]
+    ]
+    missing = set(spatial_dims) - set(model.dims)
+    assert not missing, f"model is missing the dimensions of qmap: {missing}"
+
+    # month 0 is used for all time steps if the map is not by month
+    if by_month:
+        month = model.time.dt.month
+        qmap = qmap.reindex(month=np.arange(13))
+    else:
+        month = xr.zeros_like(model.time, dtype=int)
+        qmap = qmap.expand_dims(month=[0])
+
+    # the gridcells are the core dims, so that the time chunks are independent
+    model = model.chunk({"time": time_chunk, **{d: -1 for d in spatial_dims}})
+    model_q = qmap.model_quantiles
+    observed_q = qmap.observed_quantiles.broadcast_like(model_q)
+    map_dims = spatial_dims + ["month", "quantile"]
+
+    corrected = xr.apply_ufunc(
+        _quantile_mapping_kernel,
+        model,
+        month.chunk(time=time_chunk),
+        model_q,
+        observed_q,
+        input_core_dims=[spatial_dims, [], map_dims, map_dims],
+        output_core_dims=[spatial_dims],
+        kwargs=dict(kind=kind),
+        dask="parallelized",
+        output_dtypes=["float64"],
+    )
+
+    corrected = corrected.transpose(*model.dims).assign_attrs(model.attrs)
+    corrected.attrs["bias_correction"] = f"empirical quantile mapping ({kind})"
+
+    return corrected
+
+
+def _quantile_mapping_kernel(arr, month, model_q, observed_q, kind="additive"):
+    """
+    Map arr [..., cells] with the quantiles [cells, month, quantile] of the
+    month [...] of each value.
+    """
+    n_month, n_quantiles = model_q.shape[-2:]
+    n_cell_dims = model_q.ndim - 2
+    shape = arr.shape
+    loop_shape = shape[: arr.ndim - n_cell_dims]
+    n_cells = int(np.prod(shape[arr.ndim - n_cell_dims :]))
+
+    # [cell, value] with the month of each value
+    x = arr.reshape(-1, n_cells).T
+    month = np.broadcast_to(month, loop_shape).ravel()
+    model_q = model_q.reshape(n_cells, n_month, n_quantiles)
+    observed_q = observed_q.reshape(n_cells, n_month, n_quantiles)
+
+    out = np.full(x.shape, np.nan)
+    for m in np.unique(month):
+        index = month == m
+        out[:, index] = _interp_rows(
+            x[:, index], model_q[:, m], observed_q[:, m], kind=kind
+        )
+
+    return out.T.reshape(shape)
+
+
+def _interp_rows(x, xp, fp, kind="additive"):
+    """
+    Row-wise linear interpolation of x [row, n] with the sorted nodes
+    xp [row, node] and values fp [row, node], vectorised over all rows.
+
+    The rows are placed after each other on one monotonic axis (by adding
+    an offset per row to the normalised nodes), so that the nodes of all
+    values are found with a single searchsorted.
+    """
+    n_rows, n_nodes = xp.shape
+    valid = np.isfinite(xp).all(axis=1) & np.isfinite(fp).all(axis=1)
+    xp = np.where(valid[:, None], xp, 0)
+    fp = np.where(valid[:, None], fp, 0)
+
+    lo, hi = xp.min(), xp.max()
+    scale = (hi - lo) if hi > lo else 1.0
+    offset = 2 * np.arange(n_rows)[:, None]
+    keys = (xp - lo) / scale + offset
+
+    x_clipped = np.clip(x, xp[:, :1], xp[:, -1:])
+    x_keys = (x_clipped - lo) / scale + offset
+    flat_index = np.searchsorted(
+        keys.ravel(), np.nan_to_num(x_keys).ravel(), side="right"
+    )
+    i0 = flat_index.reshape(x.shape) - 1 - n_nodes * np.arange(n_rows)[:, None]
+    i0 = np.clip(i0, 0, n_nodes - 2)
+
+    x0 = np.take_along_axis(xp, i0, axis=1)
+    x1 = np.take_along_axis(xp, i0 + 1, axis=1)
+    f0 = np.take_along_axis(fp, i0, axis=1)
+    f1 = np.take_along_axis(fp, i0 + 1, axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        weight = np.where(x1 > x0, (x_clipped - x0) / (x1 - x0), 0.5)
+    out = f0 + weight * (f1 - f0)
+
+    # values outside of the fitted range
+    below, above = x < xp[:, :1], x > xp[:, -1:]
+    if kind == "additive":
+        out = np.where(below, x + (fp[:, :1] - xp[:, :1]), out)
+        out = np.where(above, x + (fp[:, -1:] - xp[:, -1:]), out)
+    else:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            ratio_lo = np.where(xp[:, :1] > 0, fp[:, :1] / xp[:, :1], 1)
+            ratio_hi = np.where(xp[:, -1:] > 0, fp[:, -1:] / xp[:, -1:], 1)
+        out = np.where(below, x * ratio_lo, out)
+        out = np.where(above, x * ratio_hi, out)
+        out = np.where(x == 0, 0, np.maximum(out, 0))
+
+    out[~valid] = np.nan
+    out[np.isnan(x)] = np.nan
+
+    return out
@@ -187,10 +187,17 @@ def get_res_in_proj_units(res_m, epsg, min_res=30):
     return res
 
 
-def smooth_data(da: _xr.DataArray, kernel_size: int = 3, n_iters=1) -> _xr.DataArray:
+def smooth_data(
+    da: _xr.DataArray, kernel_size: int = 3, n_iters=1, tile_size=None
+) -> _xr.DataArray:
     """
     Smooth the data using a rolling mean filter (box kernel).
 
+    Dask arrays (or any array if tile_size is given) are smoothed lazily on
+    overlapping tiles, with a halo of (kernel_size // 2) * n_iters pixels, so
+    that the result is the same as in memory. Float data keeps its dtype,
+    other data is smoothed as float64.
+
     Parameters
     ----------
     da : xarray.DataArray
@@ -199,29 +206,62 @@ def smooth_data(da: _xr.DataArray, kernel_size: int = 3, n_iters=1) -> _xr.DataA
         The size of the kernel for the rolling mean filter.
     n_iters : int
         The number of iterations to apply the filter.
+    tile_size : int, optional
+        The size of the tiles (pixels along x and y) that are smoothed at a
+        time. The default is None, in which case numpy arrays are smoothed in
+        memory and dask arrays keep their chunks.
 
     Returns
     -------
     xarray.DataArray
         The smoothed data as an xarray DataArray.
     """
+    import numpy as np
 
-    da_smooth = da.copy()
-    for _ in range(n_iters):
-        da_smooth = da_smooth.rolling(
-            x=kernel_size, y=kernel_size, center=True, min_periods=1
-        ).mean()
+    from ..xr_raster_vector.tiling import get_smoothing_depth, map_tiles
+
+    if not n_iters:
+        return da.copy()
 
-    if n_iters:
-        da_smooth = da_smooth.assign_attrs(
-            smoothing_kernel="box_kernel",
-            smoothing_kernel_size=kernel_size,
-            smoothing_iterations=n_iters,
+    # the rolling mean keeps float dtypes, so the dtype is known lazily
+    dtype = da.dtype if np.issubdtype(da.dtype, np.floating) else np.float64
+    da = da.astype(dtype, copy=False)
+    if da.chunks is None and tile_size is None:
+        da_smooth = da.copy(
+            data=_smooth_array(da.values, da.dims, kernel_size, n_iters)
+        )
+    else:
+        depth = get_smoothing_depth(kernel_size, n_iters)
+        da_smooth = map_tiles(
+            _smooth_array,
+            da,
+            dict(x=depth, y=depth),
+            tile_size=tile_size,
+            dtype=dtype,
+            dims=da.dims,
+            kernel_size=kernel_size,
+            n_iters=n_iters,
         )
 
+    da_smooth = da_smooth.assign_attrs(
+        smoothing_kernel="box_kernel",
+        smoothing_kernel_size=kernel_size,
+        smoothing_iterations=n_iters,
+    )
+
     return da_smooth
 
 
+def _smooth_array(arr, dims, kernel_size=3, n_iters=1):
+    """Rolling mean over the x and y dims of a numpy array (see smooth_data)."""
+    da_smooth = _xr.DataArray(arr, dims=dims)
+    for _ in range(n_iters):
+        da_smooth = da_smooth.rolling(
+            x=kernel_size, y=kernel_size, center=True, min_periods=1
+        ).mean()
+    return da_smooth.values
+
+
 def read_zenodo_record(zenodo_id, flist=None, dest_dir=None):
     """
     Downloads files from a Zenodo record and optionally filters them by a specified list of filenames.
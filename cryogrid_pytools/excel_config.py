@@ -1,4 +1,5 @@
 # standalone file that can be shared without the rest of the package
+import os
 import pathlib
 
 import numpy as np
@@ -13,7 +14,13 @@ class CryoGridConfigExcel:
     and maybe in the future do some checks etc
     """
 
-    def __init__(self, fname_xls: str, check_file_paths=True, check_strat_layers=True):
+    def __init__(
+        self,
+        fname_xls: str,
+        check_file_paths=True,
+        check_strat_layers=True,
+        cache_dir=None,
+    ):
         """
         Initialize the CryoGridConfigExcel object.
 
@@ -30,12 +37,17 @@ class CryoGridConfigExcel:
         check_strat_layers : bool, default=True, optional
             If True, perform a check that stratigraphy layer parameters are
             physically plausible
+        cache_dir : path-like, default=None, optional
+            If given, the parsed configuration is cached in this directory
+            with the hash of the file contents as key. Loading an unchanged
+            file again reads the cache and skips parsing the Excel file.
         """
         from functools import partial
 
         self.fname = pathlib.Path(fname_xls).resolve()
+        self.fname_xls = self.fname
         self.root = self._get_root_path()
-        self._df = self._load_xls(fname_xls)
+        self._df, self._class_index = self._load_parsed(fname_xls, cache_dir)
         logger.success(f"Loaded CryoGrid Excel configuration file: {self.fname}")
 
         self.path_funcs = {
@@ -89,20 +101,16 @@ class CryoGridConfigExcel:
         pathlib.Path
             The discovered root path or the current directory if not found.
         """
-        path = self.fname.parent
-        while True:
-            flist = path.glob("run_cryogrid.m")
-            if len(list(flist)) > 0:
-                self.root = path
-                logger.debug(f"Found root path: {path}")
-                return self.root
-            elif str(path) == "/":
-                logger.warning(
-                    "Could not find root path. Set to current directory. You can change this manually with excel_config.root = pathlib.Path('/path/to/root')"
-                )
-                return pathlib.Path(".")
-            else:
-                path = path.parent
+        path = _find_root_path(self.fname.parent)
+        if path is not None:
+            self.root = path
+            logger.debug(f"Found root path: {path}")
+            return self.root
+        else:
+            logger.warning(
+                "Could not find root path. Set to current directory. You can change this manually with excel_config.root = pathlib.Path('/path/to/root')"
+            )
+            return pathlib.Path(".")
 
     def get_start_end_times(self):
         """
@@ -158,7 +166,7 @@ class CryoGridConfigExcel:
         """
         import re
 
-        fname = self.get_forcing_path()
+        fname = self.path_funcs["era5"]()
         times = self.get_start_end_times().dt.year.astype(str).values.tolist()
 
         fname_years = re.findall(r"[-_]([12][1089][0-9][0-9])", fname.stem)
@@ -186,12 +194,66 @@ class CryoGridConfigExcel:
         alph = list(string.ascii_uppercase)
         alphabet_extra = alph + [a + b for a in alph for b in alph]
 
-        df = pd.read_excel(fname_xls, header=None, dtype=str)
+        df = _read_xlsx_as_str(fname_xls)
         df.columns = [c for c in alphabet_extra[: df.columns.size]]
         df.index = df.index + 1
 
         return df
 
+    def _load_parsed(self, fname_xls: str, cache_dir=None) -> tuple:
+        """
+        Load the Excel data and the class index, using the cache if possible.
+
+        Parameters
+        ----------
+        fname_xls : str
+            Path to the Excel file.
+        cache_dir : path-like or None
+            Directory of the cache. If None, the cache is not used.
+
+        Returns
+        -------
+        tuple
+            The loaded data (see _load_xls) and the class index (see
+            _build_class_index).
+        """
+        import pickle
+        import tempfile
+
+        if cache_dir is None:
+            df = self._load_xls(fname_xls)
+            self._df = df
+            return df, self._build_class_index()
+
+        cache_dir = pathlib.Path(cache_dir).expanduser()
+        sname = cache_dir / f"{_get_file_hash(fname_xls)}.pkl"
+
+        if sname.exists():
+            try:
+                with open(sname, "rb") as file:
+                    cached = pickle.load(file)
+                if cached.get("version") == _CACHE_VERSION:
+                    logger.debug(f"Loaded parsed configuration from cache: {sname}")
+                    return cached["df"], cached["class_index"]
+            except Exception as e:
+                logger.debug(f"Could not read cached configuration {sname}: {e}")
+
+        df = self._load_xls(fname_xls)
+        self._df = df
+        class_index = self._build_class_index()
+
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        cached = dict(version=_CACHE_VERSION, df=df, class_index=class_index)
+        # write to a unique temporary file first so that parallel readers
+        # never see a partially written cache and writers do not collide
+        with tempfile.NamedTemporaryFile(
+            dir=cache_dir, prefix=f"{sname.stem}.", suffix=".tmp", delete=False
+        ) as file:
+            pickle.dump(cached, file, protocol=pickle.HIGHEST_PROTOCOL)
+        pathlib.Path(file.name).replace(sname)
+
+        return df, class_index
+
     def _get_unique_key(self, key: str, col_value="B"):
         """
         Retrieve a single unique value for a given key from the Excel data.
@@ -234,17 +296,9 @@ class CryoGridConfigExcel:
         dict of int: str
             A dictionary mapping class names to row indices
         """
-        df = self._df
+        index = self._class_index
 
-        class_idx = []
-        for i in range(len(df)):
-            try:
-                self._find_class_block(i)
-                class_idx.append(i)
-            except Exception:
-                pass
-
-        classes = df.loc[class_idx, "A"].to_dict()
+        classes = {int(i): index["names"][i] for i in index["rows"]}
         return classes
 
     def get_class_filepath(
@@ -309,9 +363,7 @@ class CryoGridConfigExcel:
         pandas.DataFrame
             The concatenated DataFrame of class blocks.
         """
-        df = self._df
-        i0s = df.A == class_name
-        i0s = i0s[i0s].index.values
+        i0s = self._class_index["by_name"].get(class_name, [])
 
         blocks = [self._find_class_block(i0) for i0 in i0s]
         try:
@@ -323,9 +375,64 @@ class CryoGridConfigExcel:
 
         return df
 
+    def _build_class_index(self) -> dict:
+        """
+        Parse all class blocks of the Excel data in a single pass.
+
+        A row is the start of a class if column B of the row itself or the
+        row above contains 'index'. The block runs from the 'index' row to the
+        next CLASS_END. Each block is parsed once, even if several rows point
+        to it.
+
+        Returns
+        -------
+        dict
+            Dictionary with the keys:
+            - rows: row indices that start a class (sorted)
+            - names: class name (column A) of every row
+            - by_name: row indices of every name in column A
+            - start: 'index' row of the block for each class row
+            - blocks: parsed block (or raised exception) for each 'index' row
+        """
+        df = self._df
+
+        rows = df.index.values
+        names = df.A.to_dict()
+        has_index = df.B.str.contains("index", na=False).astype(bool).values
+        class_ends = rows[(df.A == "CLASS_END").values]
+
+        by_name = {}
+        for i, name in names.items():
+            by_name.setdefault(name, []).append(i)
+
+        # the 'index' row of each row: the row above has priority over the row itself
+        above = np.r_[False, has_index[:-1]]
+        start = np.where(above, rows - 1, np.where(has_index, rows, -1))
+
+        blocks = {}
+        for i0 in np.unique(start[start >= 0]):
+            # first CLASS_END at or after the 'index' row (block of one row if none)
+            j = np.searchsorted(class_ends, i0)
+            i1 = class_ends[j] if j < class_ends.size else i0
+            try:
+                blocks[i0] = self._process_class_block(df.loc[i0:i1])
+            except Exception as error:
+                blocks[i0] = error
+
+        start = {i: i0 for i, i0 in zip(rows, start) if i0 >= 0}
+        class_rows = [
+            i for i, i0 in start.items() if not isinstance(blocks[i0], Exception)
+        ]
+
+        index = dict(
+            rows=class_rows, names=names, by_name=by_name, start=start, blocks=blocks
+        )
+
+        return index
+
     def _find_class_block(self, class_idx0: int):
         """
-        Identify and extract the block of rows corresponding to a class definition.
+        Return the parsed block of rows corresponding to a class definition.
 
         Parameters
         ----------
@@ -342,23 +449,17 @@ class CryoGridConfigExcel:
         AssertionError
             If the class structure is missing required indicators.
         """
-        df = self._df
+        index = self._class_index
 
-        class_name = df.A.loc[class_idx0]
+        class_name = index["names"].get(class_idx0)
         msg = f"Given class_idx0 ({class_name}) is not a class. Must have 'index' adjacent or on cell up and right."
-        is_index = df.B.loc[class_idx0 - 1 : class_idx0].str.contains("index")
-        assert is_index.any(), msg
+        assert class_idx0 in index["start"], msg
 
-        index_idx = is_index.idxmax()
-        class_idx0 = index_idx
+        class_block = index["blocks"][index["start"][class_idx0]]
+        if isinstance(class_block, Exception):
+            raise class_block
 
-        class_idx1 = df.A.loc[class_idx0:] == "CLASS_END"
-        # get first True occurrence
-        class_idx1 = class_idx1.idxmax()
-        class_block = df.loc[class_idx0:class_idx1]
-        class_block = self._process_class_block(class_block)
-
-        return class_block
+        return class_block.copy()
 
     def _process_class_block(self, df: pd.DataFrame) -> pd.DataFrame:
         """
@@ -436,18 +537,116 @@ class CryoGridConfigExcel:
 
         return df
 
-    def check_strat_layers(self):
+    def check_strat_layers(self) -> pd.DataFrame:
         """
         Run checks to ensure stratigraphy layers have physically plausible parameter values.
+
+        All STRAT_layers classes are checked at once (see
+        get_strat_layer_violations) and the failed checks are logged per class.
+
+        Returns
+        -------
+        pd.DataFrame
+            The violations with one row per failed check (empty if all passed).
         """
-        strat_layers = self.get_class("STRAT_layers")
         logger.debug("Checking stratigraphy layers...")
-        for layer in strat_layers:
-            try:
-                check_strat_layer_values(strat_layers[layer].iloc[0])
-                logger.success(f"[{layer}]  parameters passed checks")
-            except ValueError as error:
-                logger.warning(f"[{layer}]  {error}")
+        strat_layers = self.get_class("STRAT_layers")
+        names, layer_labels, values, passed = _calc_strat_layer_checks(strat_layers)
+
+        for c, name in enumerate(names):
+            if passed[c].all():
+                logger.success(f"[{name}]  parameters passed checks")
+            else:
+                labels = layer_labels[c]
+                checks = pd.DataFrame(
+                    passed[c, : len(labels)],
+                    index=pd.Index(labels, name="layer"),
+                    columns=STRAT_LAYER_CHECKS,
+                )
+                logger.warning(
+                    f"[{name}]  parameters are not physically plausible. "
+                    "below are the violations: \n" + str(checks.T)
+                )
+
+        return _strat_checks_to_violations(names, layer_labels, values, passed)
+
+    def get_cell_address(self, key: str) -> str:
+        """
+        Find the Excel cell (e.g., 'B12') of a parameter in the configuration.
+
+        Parameters
+        ----------
+        key : str
+            The parameter as `<class>_<index>.<parameter>` for single values
+            (e.g., 'read_mat_ERA_1.filename') or as
+            `<class>_<index>.<column>[<row>]` for a cell of a MATRIX
+            (e.g., 'STRAT_layers_1.waterIce[0]' where 0 is the matrix index).
+
+        Returns
+        -------
+        str
+            The address of the cell in Excel notation.
+
+        Raises
+        ------
+        KeyError
+            If the class, parameter or matrix cell cannot be found.
+        """
+        import re
+
+        match = re.match(
+            r"^(?P<cls>.+)_(?P<idx>\d+)\.(?P<param>[^\[\]]+)(\[(?P<row>[^\]]+)\])?$",
+            key,
+        )
+        if match is None:
+            raise KeyError(
+                f"Invalid key: {key}. Must be <class>_<index>.<param> or "
+                "<class>_<index>.<column>[<row>]"
+            )
+        class_name, class_num, param, row = match.group("cls", "idx", "param", "row")
+
+        df = self._df
+        index = self._class_index
+        rows = [
+            i
+            for i in index["by_name"].get(class_name, [])
+            if i in index["rows"] and str(df.B.loc[i]).strip() == class_num
+        ]
+        if len(rows) != 1:
+            raise KeyError(f"Could not find a unique class {class_name} {class_num}")
+
+        i0 = index["start"][rows[0]]
+        i1 = (df.A.loc[i0:] == "CLASS_END").idxmax()
+        block = df.loc[i0:i1]
+
+        if row is None:
+            param_rows = block.index[block.A == param]
+            if len(param_rows) != 1:
+                raise KeyError(f"Could not find a unique parameter {param} in {key}")
+            return f"B{param_rows[0]}"
+
+        matrix_rows = block.index[block.B.str.contains("MATRIX", na=False)]
+        if len(matrix_rows) == 0:
+            raise KeyError(f"No MATRIX found in {class_name}_{class_num}")
+        r0 = matrix_rows[0]
+        is_vmatrix = "V_MATRIX" in block.B.loc[r0]
+
+        header = block.loc[r0]
+        columns = header.index[header == param]
+        if len(columns) != 1:
+            raise KeyError(f"Could not find a unique matrix column {param} in {key}")
+
+        r1 = block.index[(block.index > r0) & (block.B == "END").values][0]
+        data_rows = block.index[(block.index > r0) & (block.index < r1)]
+        if is_vmatrix:
+            # V_MATRIX rows are numbered from 0 (see _process_class_block)
+            data_rows = data_rows[[int(row)]] if int(row) < len(data_rows) else []
+        else:
+            data_rows = data_rows[block.B.loc[data_rows].values == row]
+        if len(data_rows) != 1:
+            raise KeyError(f"Could not find a unique matrix row {row} in {key}")
+
+        return f"{columns[0]}{data_rows[0]}"
 
     def check_files_exist(self):
         """
@@ -464,6 +663,394 @@ class CryoGridConfigExcel:
                 logger.success(f"Located file: {f}")
 
 
+# increase when the structure of the parsed configuration changes
+_CACHE_VERSION = 1
+
+# the same values that pandas.read_excel interprets as NaN by default
+_NA_STRINGS = {
+    "",
+    "#N/A",
+    "#N/A N/A",
+    "#NA",
+    "-1.#IND",
+    "-1.#QNAN",
+    "-NaN",
+    "-nan",
+    "1.#IND",
+    "1.#QNAN",
+    "<NA>",
+    "N/A",
+    "NA",
+    "NULL",
+    "NaN",
+    "None",
+    "n/a",
+    "nan",
+    "null",
+}
+
+
+def _read_xlsx_as_str(fname_xls: str) -> pd.DataFrame:
+    """
+    Stream the first sheet of an Excel file into a DataFrame of strings.
+
+    Uses openpyxl in read-only mode and converts the cells in the same way as
+    pd.read_excel(fname_xls, header=None, dtype=str), without the overhead of
+    the pandas text parser.
+
+    Parameters
+    ----------
+    fname_xls : str
+        Path to the Excel file.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The cell values as strings (NaN for empty cells) with a 0-based
+        integer index and columns.
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(fname_xls, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        sheet.reset_dimensions()
+
+        rows = []
+        last_row_with_data = -1
+        for i, row in enumerate(sheet.iter_rows(values_only=True)):
+            row = list(row)
+            # trim trailing empty cells before NA strings are converted
+            while row and row[-1] is None:
+                row.pop()
+            if row:
+                last_row_with_data = i
+            rows.append([_cell_to_str(value) for value in row])
+    finally:
+        workbook.close()
+
+    rows = rows[: last_row_with_data + 1]
+    width = max([len(row) for row in rows], default=0)
+    rows = [row + [np.nan] * (width - len(row)) for row in rows]
+
+    return pd.DataFrame(rows, dtype=object)
+
+
+def _cell_to_str(value):
+    """Converts an openpyxl cell value to a string (NaN if empty)."""
+    if value is None:
+        return np.nan
+    elif isinstance(value, bool):
+        value = str(value)
+    elif isinstance(value, (int, float)):
+        # integer valued numbers are written without decimals (as in pandas)
+        value = str(int(value)) if int(value) == value else str(float(value))
+    else:
+        value = str(value)
+
+    return np.nan if value in _NA_STRINGS else value
+
+
+def _get_file_hash(fname: str) -> str:
+    """Returns the sha256 hash of the contents of a file."""
+    import hashlib
+
+    sha = hashlib.sha256()
+    with open(fname, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            sha.update(block)
+
+    return sha.hexdigest()
+
+
+def _find_root_path(path: pathlib.Path):
+    """
+    Find the first parent directory that contains 'run_cryogrid.m'.
+
+    The result is not cached, since run directories can be created or moved
+    while the process runs.
+
+    Returns
+    -------
+    pathlib.Path or None
+        The root path or None if not found.
+    """
+    while True:
+        if (path / "run_cryogrid.m").exists():
+            return path
+        elif path == path.parent:
+            return None
+        else:
+            path = path.parent
+
+
+STRAT_LAYER_PARAMS = ("mineral", "organic", "waterIce", "field_capacity")
+STRAT_LAYER_CHECKS = (
+    "field_capacity_lt_porosity",
+    "airspace_ge_0",
+    "volume_le_1",
+    "waterice_le_porosity",
+)
+
+
+def _strat_matrices_to_array(matrices: list) -> tuple:
+    """
+    Stack STRAT_layers matrices to a [class, layer, parameter] array.
+
+    Parameters
+    ----------
+    matrices : list of dict
+        The matrix dictionaries ({column: {row: value}}) of each class.
+
+    Returns
+    -------
+    tuple
+        The float array (NaN padded for classes with fewer layers) with the
+        parameters in the order of STRAT_LAYER_PARAMS and a list of the row
+        labels of each class.
+    """
+    n_layers = max([len(next(iter(m.values()))) for m in matrices], default=0)
+    arr = np.full((len(matrices), n_layers, len(STRAT_LAYER_PARAMS)), np.nan)
+    layer_labels = []
+    for c, matrix in enumerate(matrices):
+        labels = list(next(iter(matrix.values())))
+        layer_labels.append(labels)
+        for p, param in enumerate(STRAT_LAYER_PARAMS):
+            values = [matrix[param][label] for label in labels]
+            arr[c, : len(labels), p] = np.asarray(values, dtype=float)
+
+    return arr, layer_labels
+
+
+def _check_strat_arrays(arr: np.ndarray) -> np.ndarray:
+    """
+    Vectorised stratigraphy checks over an [..., parameter] array.
+
+    The parameters of the last axis must be ordered as STRAT_LAYER_PARAMS.
+    Returns a boolean array [..., check] (ordered as STRAT_LAYER_CHECKS) that
+    is True where a check passes. NaN layers (padding) pass all checks.
+    See check_strat_layer_values for the definitions.
+    """
+    arr = arr.round(3)
+    mineral, organic, water_ice, field_capacity = np.moveaxis(arr, -1, 0)
+
+    porosity = (1 - mineral - organic).round(3)
+    airspace = (porosity - water_ice).round(3)
+    volume = (mineral + organic + water_ice).round(3)
+
+    checks = np.stack(
+        [
+            field_capacity <= porosity,
+            airspace >= 0,
+            volume <= 1,
+            water_ice <= porosity,
+        ],
+        axis=-1,
+    )
+    padding = np.isnan(arr).all(axis=-1)
+
+    return checks | padding[..., None]
+
+
+def generate_config_sweep(
+    template,
+    params: pd.DataFrame,
+    output_dir: str,
+    fname_format: str = "{stem}_{run:04d}.xlsx",
+    **joblib_kwargs,
+) -> tuple:
+    """
+    Write one Excel configuration per row of a parameter table from a template.
+
+    Only the cells of the parameters in the table are changed. The cell of
+    each parameter is located once in the template and each workbook is
+    patched and saved by a parallel worker. Before writing, the
+    stratigraphy of all variants is checked at once with the vectorised
+    plausibility checks (see check_strat_layer_values).
+
+    Parameters
+    ----------
+    template : CryoGridConfigExcel or path-like
+        The template configuration.
+    params : pandas.DataFrame
+        One row per variant. The columns are the parameters to change (see
+        CryoGridConfigExcel.get_cell_address for the notation), e.g.
+        'STRAT_layers_1.waterIce[0]' or 'read_mat_ERA_1.filename'.
+    output_dir : path-like
+        Directory where the configurations are written.
+    fname_format : str, optional
+        File name of each variant. Can contain `stem` (the template file
+        name without suffix), `run` (the row number) and any column of
+        params without special characters, by default "{stem}_{run:04d}.xlsx".
+    joblib_kwargs : dict
+        Uses the joblib library to write the files in parallel.
+        Defaults are: n_jobs=-1, backend='loky'
+
+    Returns
+    -------
+    tuple of pandas.DataFrame
+        - summary: params with the columns `fname` and `valid` (True if all
+          stratigraphy checks passed) added
+        - violations: one row per failed check with the columns `run`,
+          `class`, `layer`, `check` and the layer values (see
+          get_strat_layer_violations)
+    """
+    import joblib
+
+    if not isinstance(template, CryoGridConfigExcel):
+        template = CryoGridConfigExcel(
+            template, check_file_paths=False, check_strat_layers=False
+        )
+
+    addresses = {key: template.get_cell_address(key) for key in params.columns}
+
+    # vectorised stratigraphy checks of all variants [run, class, layer, param]
+    strat_layers = template.get_class("STRAT_layers")
+    strat_names = list(strat_layers.columns) if len(strat_layers) else []
+    matrices = [strat_layers[name].iloc[0][0] for name in strat_names]
+    base, layer_labels = _strat_matrices_to_array(matrices)
+    variants = np.repeat(base[None], len(params), axis=0)
+    for key in params.columns:
+        class_key, _, column = key.partition(".")
+        param, _, row = column.rstrip("]").partition("[")
+        if class_key in strat_names and param in STRAT_LAYER_PARAMS and row:
+            c = strat_names.index(class_key)
+            # V_MATRIX labels are integers, but the row of the key is a string
+            layer = [str(label) for label in layer_labels[c]].index(row)
+            p = STRAT_LAYER_PARAMS.index(param)
+            variants[:, c, layer, p] = params[key].values.astype(float)
+
+    passed = _check_strat_arrays(variants)
+    violations = _strat_checks_to_violations(
+        strat_names, layer_labels, variants, passed
+    )
+
+    output_dir = pathlib.Path(output_dir).expanduser()
+    output_dir.mkdir(parents=True, exist_ok=True)
+    stem = template.fname_xls.stem
+
+    summary = params.copy()
+    summary["fname"] = [
+        str(output_dir / fname_format.format(stem=stem, run=i, **_format_keys(row)))
+        for i, row in enumerate(params.to_dict("records"))
+    ]
+    summary["valid"] = passed.all(axis=(1, 2, 3))
+
+    tasks = [
+        joblib.delayed(_write_patched_workbook)(
+            template.fname_xls,
+            sname,
+            {addresses[key]: value for key, value in row.items()},
+        )
+        for sname, row in zip(summary["fname"], params.to_dict("records"))
+    ]
+    props = dict(n_jobs=-1, backend="loky")
+    props.update(joblib_kwargs)
+    joblib.Parallel(**props)(tasks)
+
+    logger.info(
+        f"Wrote {len(summary)} configurations to {output_dir} "
+        f"({(~summary.valid).sum()} with implausible stratigraphy)"
+    )
+
+    return summary, violations
+
+
+def _format_keys(row: dict) -> dict:
+    """Keys of row that can be used in str.format."""
+    return {k: v for k, v in row.items() if str(k).isidentifier()}
+
+
+def _write_patched_workbook(fname_template, sname, cells: dict):
+    """Copy the template workbook and change the values of the given cells."""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(fname_template)
+    sheet = workbook.worksheets[0]
+    for address, value in cells.items():
+        sheet[address] = _str_to_cell(value)
+    workbook.save(sname)
+    workbook.close()
+
+    return sname
+
+
+def _str_to_cell(value):
+    """Numbers are written as numbers, everything else as a string."""
+    if isinstance(value, (int, float, np.number)) and not isinstance(value, bool):
+        value = float(value)
+        return int(value) if value.is_integer() else value
+    try:
+        return _str_to_cell(float(value))
+    except (TypeError, ValueError):
+        return str(value)
+
+
+def get_strat_layer_violations(strat_layers: pd.DataFrame) -> pd.DataFrame:
+    """
+    Check the plausibility of all stratigraphy layers in a single vectorised pass.
+
+    The layers of all classes are stacked into a [class, layer, parameter]
+    array, so that thousands of layer definitions are checked at once. See
+    check_strat_layer_values for the definitions and checks.
+
+    Parameters
+    ----------
+    strat_layers : pd.DataFrame
+        The STRAT_layers classes as returned by
+        CryoGridConfigExcel.get_class('STRAT_layers').
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per failed check with the columns `class`, `layer`, `check`
+        and the values of the layer (mineral, organic, waterIce,
+        field_capacity). The table is empty if all layers are plausible.
+    """
+    return _strat_checks_to_violations(*_calc_strat_layer_checks(strat_layers))
+
+
+def _calc_strat_layer_checks(strat_layers: pd.DataFrame) -> tuple:
+    """
+    Returns the class names, the layer labels of each class, the stacked
+    [class, layer, parameter] values and the boolean [class, layer, check]
+    array of the passed checks. Configurations without STRAT_layers classes
+    (get_class returns an empty list) have no classes to check.
+    """
+    if isinstance(strat_layers, pd.DataFrame) and not strat_layers.empty:
+        names = list(strat_layers.columns)
+    else:
+        names = []
+    matrices = [strat_layers[name].iloc[0][0] for name in names]
+    values, layer_labels = _strat_matrices_to_array(matrices)
+    passed = _check_strat_arrays(values)
+
+    return names, layer_labels, values, passed
+
+
+def _strat_checks_to_violations(names, layer_labels, values, passed) -> pd.DataFrame:
+    """
+    Convert the [..., class, layer, check] array of passed checks to a table
+    of violations. A leading dimension (e.g., sweep runs) is added as `run`.
+    """
+    *lead, c, layer, check = np.where(~passed)
+
+    violations = pd.DataFrame(
+        {
+            "class": np.array(names, dtype=object)[c],
+            "layer": [layer_labels[ci][li] for ci, li in zip(c, layer)],
+            "check": np.array(STRAT_LAYER_CHECKS, dtype=object)[check],
+        }
+    )
+    layer_values = values[(*lead, c, layer)]
+    for p, param in enumerate(STRAT_LAYER_PARAMS):
+        violations[param] = layer_values[:, p]
+    if lead:
+        violations.insert(0, "run", lead[0])
+
+    return violations
+
+
 def check_strat_layer_values(tuple_containing_dict):
     """
     Validate that stratigraphy layer parameters are physically plausible.
@@ -492,22 +1079,152 @@ def check_strat_layer_values(tuple_containing_dict):
     - `waterIce <= porosity`  :  waterIce cannot exceed porosity
 
     """
-    dictionary = tuple_containing_dict[0]
-    df = pd.DataFrame(dictionary).astype(float).round(3)
-
-    df["porosity"] = (1 - df.mineral - df.organic).round(3)
-    df["airspace"] = (df.porosity - df.waterIce).round(3)
-    df["volume"] = (df.mineral + df.organic + df.waterIce).round(3)
-
-    checks = pd.DataFrame()
-    checks["field_capacity_lt_porosity"] = df.field_capacity <= df.porosity
-    checks["airspace_ge_0"] = df.airspace >= 0
-    checks["volume_le_1"] = df.volume <= 1
-    checks["waterice_le_porosity"] = df.waterIce <= df.porosity
-    checks.index.name = "layer"
+    values, (labels,) = _strat_matrices_to_array([tuple_containing_dict[0]])
+    checks = pd.DataFrame(
+        _check_strat_arrays(values[0]),
+        index=pd.Index(labels, name="layer"),
+        columns=STRAT_LAYER_CHECKS,
+    )
 
     if not checks.values.all():
         raise ValueError(
             "parameters are not physically plausible. "
             "below are the violations: \n" + str(checks.T)
         )
+
+
+def validate_configs(configs, n_jobs=-1, cache_dir=None, **joblib_kwargs):
+    """
+    Validate many CryoGrid Excel configurations in parallel.
+
+    Each configuration is parsed on a process pool and the stratigraphy and
+    forcing file name checks are run in the workers. The file paths of all
+    configurations are then checked in one pass, so each unique path is only
+    checked (stat) once, even if it is shared by many configurations.
+
+    Parameters
+    ----------
+    configs : str, path-like or list
+        A directory (all *.xlsx files are used), a glob pattern or a list of
+        Excel configuration files.
+    n_jobs : int, default=-1, optional
+        Number of worker processes (-1 uses all cores).
+    cache_dir : path-like, default=None, optional
+        Passed to CryoGridConfigExcel to cache the parsed configurations.
+    joblib_kwargs : dict
+        Additional keyword arguments passed to joblib.Parallel.
+
+    Returns
+    -------
+    pandas.DataFrame
+        One row per violation with the columns `config`, `check`, `item` and
+        `message`. An empty DataFrame means that all configurations passed.
+    """
+    import glob
+
+    import joblib
+
+    if isinstance(configs, (str, pathlib.Path)):
+        path = pathlib.Path(configs).expanduser()
+        if path.is_dir():
+            flist = sorted(path.glob("*.xlsx"))
+        else:
+            flist = sorted(glob.glob(str(path)))
+    else:
+        flist = list(configs)
+    flist = [str(pathlib.Path(f).resolve()) for f in flist]
+
+    if len(flist) == 0:
+        raise FileNotFoundError(f"No configuration files found with {configs}")
+
+    props = dict(n_jobs=n_jobs, backend="loky")
+    props.update(joblib_kwargs)
+    func = joblib.delayed(_collect_config_violations)
+    results = joblib.Parallel(**props)(func(f, cache_dir) for f in flist)
+
+    records = []
+    paths = {}
+    for config, (config_records, config_paths) in zip(flist, results):
+        records += config_records
+        for key, path in config_paths.items():
+            paths.setdefault(path, []).append((config, key))
+
+    # each unique path is only checked once (threads since stat is IO bound)
+    unique_paths = list(paths)
+    exists = joblib.Parallel(n_jobs=n_jobs, backend="threading")(
+        joblib.delayed(os.path.exists)(p) for p in unique_paths
+    )
+    for path, path_exists in zip(unique_paths, exists):
+        if not path_exists:
+            records += [
+                dict(
+                    config=config,
+                    check="files_exist",
+                    item=key,
+                    message=f"Cannot find file: {path}",
+                )
+                for config, key in paths[path]
+            ]
+
+    columns = ["config", "check", "item", "message"]
+    report = pd.DataFrame.from_records(records, columns=columns)
+    report = report.sort_values(["config", "check", "item"]).reset_index(drop=True)
+    logger.info(
+        f"Validated {len(flist)} configurations: "
+        f"{report.config.nunique()} with {len(report)} violations"
+    )
+
+    return report
+
+
+def _collect_config_violations(fname: str, cache_dir=None) -> tuple:
+    """
+    Parse a single configuration and run the checks that do not touch the filesystem.
+
+    The log messages of this module are disabled while checking, since the
+    violations are reported in the table. The handlers are not touched, as
+    the task may run in the caller's process (e.g., n_jobs=1).
+
+    Returns
+    -------
+    tuple
+        A list of violation records and a dictionary of the file paths of the
+        configuration (as strings) that still have to be checked.
+    """
+    logger.disable(__name__)
+    try:
+        return _check_config(fname, cache_dir=cache_dir)
+    finally:
+        logger.enable(__name__)
+
+
+def _check_config(fname: str, cache_dir=None) -> tuple:
+    """See _collect_config_violations."""
+    records = []
+
+    def record(check, item, message):
+        records.append(dict(config=fname, check=check, item=item, message=message))
+
+    try:
+        config = CryoGridConfigExcel(
+            fname, check_file_paths=False, check_strat_layers=False, cache_dir=cache_dir
+        )
+    except Exception as error:
+        record("parse", "", f"{type(error).__name__}: {error}")
+        return records, {}
+
+    try:
+        violations = get_strat_layer_violations(config.get_class("STRAT_layers"))
+        for row in violations.itertuples(index=False):
+            record("strat_layers", f"{row[0]} layer {row.layer}", row.check)
+    except Exception as error:
+        record("strat_layers", "", f"{type(error).__name__}: {error}")
+
+    try:
+        config.check_forcing_fname_times()
+    except Exception as error:
+        record("forcing_fname_times", "era5", f"{type(error).__name__}: {error}")
+
+    paths = {key: str(path) for key, path in config.fname.items()}
+
+    return records, paths
@@ -2,22 +2,33 @@
 import xarray as xr
 
 
-def _era5_mat_dict_to_xarray(era5_dict: dict) -> xr.Dataset:
+def _era5_mat_dict_to_xarray(era5_dict: dict, decode: bool = True) -> xr.Dataset:
     """
     Convert a dictionary with the ERA5 forcing variables to a xarray Dataset.
 
+    The packed integer variables are kept as integers and the scaling factors
+    are attached as CF `scale_factor` attributes. Decoding with xr.decode_cf
+    is lazy, so the scaling is only applied to the data that is accessed
+    (e.g., after selecting a single grid point or year).
+
     Parameters
     ----------
     era5_dict : dict
         Dictionary with the ERA5 forcing variables. Must contain keys:
         u10, v10, u, v, Td2, T2, T, Z, q, P, ps, SW, LW, S_TOA, Zs,
         wind_sf, q_sf, ps_sf, rad_sf, T_sf, P_sf
+    decode : bool, optional
+        If True [default], variables are (lazily) scaled to the original
+        units. If False, the packed integers are returned with the
+        `scale_factor` attributes.
 
     Returns
     -------
     xr.Dataset
         Dataset with the ERA5 forcing variables and variables are scaled to the original units
     """
+    import numpy as np
+
     from .matlab_helpers import matlab2datetime
 
     dat = era5_dict
@@ -46,31 +57,33 @@ def _era5_mat_dict_to_xarray(era5_dict: dict) -> xr.Dataset:
 
         out[key] = xr.DataArray(arr, dims=dims)
 
-    wind_vars = ["u10", "v10", "u", "v"]
-    for key in wind_vars:
-        out[key] = (out[key] * dat["wind_sf"]).assign_attrs(units="m s-1")
-
-    temp_vars = ["Td2", "T2", "T"]
-    for key in temp_vars:
-        out[key] = (out[key] * dat["T_sf"]).assign_attrs(units="degC")
-
-    radiation_vars = ["SW", "LW", "S_TOA"]
-    for key in radiation_vars:
-        out[key] = (out[key] * dat["rad_sf"]).assign_attrs(units="W m-2 hr-1")
+    def scale_factor(key):
+        return np.float64(dat[key])
 
-    out["ps"] = (out["ps"] * dat["ps_sf"]).assign_attrs(
-        long_name="pressure", units="Pa"
+    attrs = dict()
+    for key in ["u10", "v10", "u", "v"]:
+        attrs[key] = dict(units="m s-1", scale_factor=scale_factor("wind_sf"))
+    for key in ["Td2", "T2", "T"]:
+        attrs[key] = dict(units="degC", scale_factor=scale_factor("T_sf"))
+    for key in ["SW", "LW", "S_TOA"]:
+        attrs[key] = dict(units="W m-2 hr-1", scale_factor=scale_factor("rad_sf"))
+    attrs["ps"] = dict(
+        long_name="pressure", units="Pa", scale_factor=scale_factor("ps_sf")
     )
-    out["P"] = (out["P"] * dat["P_sf"]).assign_attrs(
-        long_name="precipitation", units="mm hr-1"
+    attrs["P"] = dict(
+        long_name="precipitation", units="mm hr-1", scale_factor=scale_factor("P_sf")
     )
-    out["q"] = (out["q"] * dat["q_sf"]).assign_attrs(
-        long_name="specific humidity", units="kg kg-1"
+    attrs["q"] = dict(
+        long_name="specific humidity",
+        units="kg kg-1",
+        scale_factor=scale_factor("q_sf"),
     )
+    # geopotential height is not scaled, but decoded to float
+    attrs["Z"] = dict(scale_factor=np.float64(1))
+    for key in attrs:
+        out[key].attrs.update(attrs[key])
 
-    out["Zs"] = out["Zs"].astype(float)
-    out["Z"] = out["Z"].astype(float)
-
+    # transposing before decoding keeps the packed data a (lazy) view
     out = out.transpose("time", "level", "lat", "lon").assign_coords(
         time=lambda x: matlab2datetime(x.time.values)
     )
@@ -79,17 +92,30 @@ def _era5_mat_dict_to_xarray(era5_dict: dict) -> xr.Dataset:
         (out["level"] / 100).astype(int).assign_attrs(long_name="pressure", units="hPa")
     )
 
+    if decode:
+        out = xr.decode_cf(out, decode_times=False)
+        out["Zs"] = out["Zs"].astype(float)
+
     return out
 
 
-def read_mat_ear5(filename: str) -> xr.Dataset:
+def read_mat_ear5(filename: str, decode: bool = True) -> xr.Dataset:
     """
     Read the ERA5.mat forcing file for CryoGrid and return a xarray Dataset.
 
+    The packed integer variables are not scaled when reading, but decoded
+    lazily on access, so memory scales with the selected data. MATLAB v7.3
+    (HDF5) files, e.g. from era5_to_matlab_chunked, are read lazily from
+    disk as dask arrays (requires h5py).
+
     Parameters
     ----------
     filename : str
         Path to the ERA5.mat file
+    decode : bool, optional
+        If True [default], variables are scaled to the original units on
+        access. If False, the packed integers are returned with CF
+        `scale_factor` attributes (decode with xr.decode_cf).
 
     Returns
     -------
@@ -102,13 +128,16 @@ def read_mat_ear5(filename: str) -> xr.Dataset:
 
     filename = pathlib.Path(filename).expanduser().absolute().resolve()
 
-    dat = read_mat_struct_flat_as_dict(filename)
-    out = _era5_mat_dict_to_xarray(dat)
+    if _is_hdf5(filename):
+        dat = _read_mat_v73_struct_lazy(filename)
+    else:
+        dat = read_mat_struct_flat_as_dict(filename)
+    out = _era5_mat_dict_to_xarray(dat, decode=decode)
 
     out = out.assign_attrs(
         info=(
             "Data read in from CryoGrid ERA5 forcing file. "
-            "Data has been scaled to the original units with some modifications - units are given. "
+            "Data is scaled to the original units on access with some modifications - units are given. "
             "Data has been transposed from [lon, lat, level, time] --> [time, level, lat, lon]. "
             "See the ERA5 documentation for more info about the units etc."
         ),
@@ -118,7 +147,222 @@ def read_mat_ear5(filename: str) -> xr.Dataset:
     return out
 
 
-def era5_to_matlab(ds: xr.Dataset, save_path: str = None) -> dict:
+def _is_hdf5(filename) -> bool:
+    """MATLAB v7.3 files are HDF5 files with the signature after a 512 byte header."""
+    with open(filename, "rb") as file:
+        file.seek(512)
+        return file.read(8) == b"\x89HDF\r\n\x1a\n"
+
+
+def _read_mat_v73_struct_lazy(filename, key: str = "era") -> dict:
+    """
+    Read the fields of a struct in a MATLAB v7.3 file as lazy dask arrays.
+
+    Arrays are returned in MATLAB order (i.e., transposed from the HDF5
+    order) and squeezed like read_mat_struct_flat_as_dict. Small arrays
+    (coordinates and scaling factors) are loaded. The file stays open as
+    long as the arrays are referenced.
+    """
+    import dask.array as da
+    import h5py
+    import numpy as np
+
+    file = h5py.File(filename, "r")
+    group = file[key]
+
+    dat = dict()
+    for name, dset in group.items():
+        if dset.attrs.get("MATLAB_class", b"") == b"char":
+            dat[name] = "".join(chr(c) for c in dset[()].ravel())
+        elif dset.ndim > 2:
+            chunks = dset.chunks if dset.chunks is not None else "auto"
+            dat[name] = da.from_array(dset, chunks=chunks).T
+        else:
+            dat[name] = np.squeeze(dset[()].T)
+
+    return dat
+
+
+# scaling factors of the packed integer variables in the ERA5.mat forcing file
+ERA5_SCALE_FACTORS = {
+    "wind_sf": 1e-2,
+    "q_sf": 1e-6,
+    "ps_sf": 1e2,
+    "rad_sf": 1e-1,
+    "T_sf": 1e-2,
+    "P_sf": 1e-2,
+}
+
+# CryoGrid name: (ERA5 name, conversion to CryoGrid units, scale factor, packed dtype)
+_ERA5_PACKING = {
+    # single_level variables
+    # wind and pressure (no transformations)
+    "u10": ("u10", lambda x: x, "wind_sf", "int16"),
+    "v10": ("v10", lambda x: x, "wind_sf", "int16"),
+    "ps": ("sp", lambda x: x, "ps_sf", "uint16"),
+    # temperature variables (degK -> degC)
+    "Td2": ("d2m", lambda x: x - 273.15, "T_sf", "int16"),
+    "T2": ("t2m", lambda x: x - 273.15, "T_sf", "int16"),
+    # radiation variables (/sec -> /hour)
+    "SW": ("ssrd", lambda x: x / 3600, "rad_sf", "uint16"),
+    "LW": ("strd", lambda x: x / 3600, "rad_sf", "uint16"),
+    "S_TOA": ("tisr", lambda x: x / 3600, "rad_sf", "uint16"),
+    # precipitation (m -> mm)
+    "P": ("tp", lambda x: x * 1000, "P_sf", "uint16"),
+    # pressure levels
+    "T": ("t", lambda x: x - 273.15, "T_sf", "int16"),  # K to C
+    "Z": ("z", lambda x: x / 9.81, None, "int16"),  # gravity m/s2, no scaling
+    "q": ("q", lambda x: x, "q_sf", "uint16"),
+    "u": ("u", lambda x: x, "wind_sf", "int16"),
+    "v": ("v", lambda x: x, "wind_sf", "int16"),
+}
+
+
+# plausible range of the variables in CryoGrid units (before scaling)
+ERA5_PHYSICAL_BOUNDS = {
+    "u10": (-100, 100),
+    "v10": (-100, 100),
+    "ps": (3e4, 1.1e5),
+    "Td2": (-100, 60),
+    "T2": (-100, 60),
+    "SW": (0, 1500),
+    "LW": (0, 1000),
+    "S_TOA": (0, 1500),
+    "P": (0, 300),
+    "T": (-120, 60),
+    "Z": (-1000, 50000),
+    "q": (0, 0.05),
+    "u": (-150, 150),
+    "v": (-150, 150),
+}
+
+
+class PackingQA:
+    """
+    Collects quality checks of the ERA5 variables while they are packed to integers.
+
+    Pass an instance to the ERA5 converters (e.g., era5_to_matlab_chunked)
+    to get the counts and locations of the violations. The checks are done
+    on each chunk as it is converted, so there is no extra pass over the
+    data. The checks are:
+    - nan: non-finite values (undefined when cast to integers)
+    - below_dtype / above_dtype: values that wrap around when cast to the
+      packed int16/uint16 type
+    - below_physical / above_physical: values outside ERA5_PHYSICAL_BOUNDS
+
+    Parameters
+    ----------
+    max_locations : int, optional
+        Maximum number of locations stored per variable and check, by
+        default 100.
+    """
+
+    checks = ("nan", "below_dtype", "above_dtype", "below_physical", "above_physical")
+
+    def __init__(self, max_locations: int = 100):
+        self.max_locations = max_locations
+        self._counts = dict()
+        self._locations = []
+
+    def update(self, key: str, scaled, scale_factor: float, dtype: str, da):
+        """
+        Check the scaled (but not yet cast) values of a variable.
+
+        Parameters
+        ----------
+        key : str
+            CryoGrid name of the variable.
+        scaled : np.ndarray
+            The values divided by the scale factor (shape of da).
+        scale_factor : float
+            Scale factor of the variable.
+        dtype : str
+            The packed integer dtype.
+        da : xr.DataArray
+            The source variable for the coordinates of the locations.
+        """
+        import numpy as np
+
+        info = np.iinfo(dtype)
+        lower, upper = ERA5_PHYSICAL_BOUNDS.get(key, (-np.inf, np.inf))
+        with np.errstate(invalid="ignore"):
+            # astype truncates towards zero
+            truncated = np.trunc(scaled)
+            masks = dict(
+                nan=~np.isfinite(scaled),
+                below_dtype=truncated < info.min,
+                above_dtype=truncated > info.max,
+                below_physical=scaled < lower / scale_factor,
+                above_physical=scaled > upper / scale_factor,
+            )
+
+        counts = self._counts.setdefault(key, dict.fromkeys(("n",) + self.checks, 0))
+        counts["n"] += scaled.size
+        for check, mask in masks.items():
+            n_found = int(np.count_nonzero(mask))
+            if n_found == 0:
+                continue
+            n_stored = counts[check] if counts[check] < self.max_locations else None
+            counts[check] += n_found
+            if n_stored is None:
+                continue
+            index = np.nonzero(mask)
+            index = tuple(i[: self.max_locations - n_stored] for i in index)
+            location = dict(variable=key, check=check)
+            for dim, i in zip(da.dims, index):
+                location[dim] = da[dim].values[i] if dim in da.coords else i
+            location["value"] = scaled[index] * scale_factor
+            self._locations.append(location)
+
+    def merge(self, other: "PackingQA"):
+        """Add the counts and locations of another PackingQA (e.g., from a worker)."""
+        for key, other_counts in other._counts.items():
+            counts = self._counts.setdefault(key, dict.fromkeys(other_counts, 0))
+            for check, n in other_counts.items():
+                counts[check] += n
+        self._locations += other._locations
+
+    @property
+    def counts(self):
+        """pd.DataFrame with the number of values (n) and violations per variable."""
+        import pandas as pd
+
+        columns = ("n",) + self.checks
+        counts = pd.DataFrame.from_dict(self._counts, orient="index", columns=columns)
+        counts.index.name = "variable"
+        return counts
+
+    @property
+    def locations(self):
+        """pd.DataFrame with the coordinates and values of the violations."""
+        import pandas as pd
+
+        if len(self._locations) == 0:
+            return pd.DataFrame(columns=["variable", "check", "value"])
+
+        return pd.concat(
+            [pd.DataFrame(loc) for loc in self._locations], ignore_index=True
+        )
+
+    def log(self):
+        """Log a warning with the counts of the variables with violations."""
+        from loguru import logger
+
+        counts = self.counts
+        failed = counts[counts[list(self.checks)].sum(axis=1) > 0]
+        if len(failed) == 0:
+            logger.debug("All ERA5 variables are within the packed and physical ranges")
+        else:
+            logger.warning(
+                "Some ERA5 values are outside of the packed integer or physical "
+                f"range (see PackingQA):\n{failed}"
+            )
+
+    def __repr__(self):
+        return f"PackingQA\n{self.counts}"
+
+
+def era5_to_matlab(ds: xr.Dataset, save_path: str = None, qa: PackingQA = None) -> dict:
     """
     Convert a merged netCDF file from the Copernicus CDS to
     a dictionary that matches the expected format of
@@ -136,6 +380,10 @@ def era5_to_matlab(ds: xr.Dataset, save_path: str = None) -> dict:
     save_path : str, optional
         Path to save the dictionary as a .mat file, by default None, meaning
         no file is saved and only the dictionary is returned
+    qa : PackingQA, optional
+        Collects the counts and locations of values that are outside of the
+        packed integer or physical range. If None [default], a summary is
+        logged as a warning if there are any.
 
     Returns
     -------
@@ -143,8 +391,6 @@ def era5_to_matlab(ds: xr.Dataset, save_path: str = None) -> dict:
         Dictionary with the variables mapped to names that are expected by
         CryoGrid.POST_PROC.read_mat_ERA
     """
-    import numpy as np
-
     from .matlab_helpers import datetime2matlab
 
     # transpose to lon x lat x time (original is time x lat x lon)
@@ -162,58 +408,13 @@ def era5_to_matlab(ds: xr.Dataset, save_path: str = None) -> dict:
     # geopotential height at surface
     era["Zs"] = ds.Zs.values / 9.81  # gravity m/s2
 
-    # single_level variables
-    # wind and pressure (no transformations)
-    era["u10"] = ds["u10"].values
-    era["v10"] = ds["v10"].values
-    era["ps"] = ds["sp"].values
-    # temperature variables (degK -> degC)
-    era["Td2"] = ds["d2m"].values - 273.15
-    era["T2"] = ds["t2m"].values - 273.15
-    # radiation variables (/sec -> /hour)
-    era["SW"] = ds["ssrd"].values / 3600
-    era["LW"] = ds["strd"].values / 3600
-    era["S_TOA"] = ds["tisr"].values / 3600
-    # precipitation (m -> mm)
-    era["P"] = ds["tp"].values * 1000
-
-    # pressure levels
-    era["T"] = ds["t"].values - 273.15  # K to C
-    era["Z"] = ds["z"].values / 9.81  # gravity m/s2
-    era["q"] = ds["q"].values
-    era["u"] = ds["u"].values
-    era["v"] = ds["v"].values
-
-    # scaling factors
-    era["wind_sf"] = 1e-2
-    era["q_sf"] = 1e-6
-    era["ps_sf"] = 1e2
-    era["rad_sf"] = 1e-1
-    era["T_sf"] = 1e-2
-    era["P_sf"] = 1e-2
-
-    # apply scaling factors (done in the original, so we do it here)
-    # wind scaling
-    era["u"] = (era["u"] / era["wind_sf"]).astype(np.int16)
-    era["v"] = (era["v"] / era["wind_sf"]).astype(np.int16)
-    era["u10"] = (era["u10"] / era["wind_sf"]).astype(np.int16)
-    era["v10"] = (era["v10"] / era["wind_sf"]).astype(np.int16)
-    # temperature scaling
-    era["T"] = (era["T"] / era["T_sf"]).astype(np.int16)
-    era["Td2"] = (era["Td2"] / era["T_sf"]).astype(np.int16)
-    era["T2"] = (era["T2"] / era["T_sf"]).astype(np.int16)
-    # humidity scaling
-    era["q"] = (era["q"] / era["q_sf"]).astype(np.uint16)
-    # pressure scaling
-    era["ps"] = (era["ps"] / era["ps_sf"]).astype(np.uint16)
-    # radiation scaling
-    era["SW"] = (era["SW"] / era["rad_sf"]).astype(np.uint16)
-    era["LW"] = (era["LW"] / era["rad_sf"]).astype(np.uint16)
-    era["S_TOA"] = (era["S_TOA"] / era["rad_sf"]).astype(np.uint16)
-    # precipitation scaling
-    era["P"] = (era["P"] / era["P_sf"]).astype(np.uint16)
-    # no scaling for geoportential height
-    era["Z"] = era["Z"].astype(np.int16)
+    # convert units and apply scaling factors (done in the original, so we do it here)
+    log_qa = qa is None
+    qa = PackingQA() if qa is None else qa
+    era.update(_era5_pack_variables(ds, qa=qa))
+    if log_qa:
+        qa.log()
+    era.update(ERA5_SCALE_FACTORS)
 
     out = {"era": era}
 
@@ -223,3 +424,978 @@ def era5_to_matlab(ds: xr.Dataset, save_path: str = None) -> dict:
         savemat(save_path, out, appendmat=True, do_compression=True)
 
     return out
+
+
+def era5_to_matlab_chunked(
+    ds: xr.Dataset,
+    save_path: str,
+    time_chunk: int = 744,
+    per_year: bool = False,
+    qa: PackingQA = None,
+) -> list:
+    """
+    Convert ERA5 data to CryoGrid forcing files in time chunks with constant memory.
+
+    Same conversion as era5_to_matlab, but only `time_chunk` time steps are
+    loaded, scaled and packed to integers at a time, so that multi-decade
+    pressure-level forcing for large domains can be converted. Open the
+    ERA5 data lazily (e.g., xr.open_mfdataset) for this to be effective.
+
+    Parameters
+    ----------
+    ds : xr.Dataset
+        Dataset from the ERA5 Copernicus CDS with the variables required for
+        the CryoGrid.POST_PROC.read_mat_ERA class (see era5_to_matlab).
+    save_path : str
+        Path of the output .mat file. With per_year=True, the year is added
+        to the file name (e.g., ERA5.mat -> ERA5_1990.mat).
+    time_chunk : int, optional
+        Number of time steps processed at a time, by default 744 (one month
+        of hourly data).
+    per_year : bool, optional
+        If False [default], writes a single MATLAB v7.3 (HDF5) file with
+        chunked datasets that is filled chunk by chunk (requires h5py).
+        If True, writes one MATLAB v5 file per year with era5_to_matlab,
+        so that at most one year is held in memory.
+    qa : PackingQA, optional
+        Collects the counts and locations of values that are outside of the
+        packed integer or physical range. If None [default], a summary is
+        logged as a warning if there are any.
+
+    Returns
+    -------
+    list
+        The paths of the written files.
+    """
+    import pathlib
+
+    from loguru import logger
+
+    save_path = pathlib.Path(save_path).expanduser().with_suffix(".mat")
+    save_path.parent.mkdir(parents=True, exist_ok=True)
+    log_qa = qa is None
+    qa = PackingQA() if qa is None else qa
+
+    if per_year:
+        fnames = []
+        for year, ds_year in ds.groupby("time.year"):
+            sname = save_path.with_stem(f"{save_path.stem}_{year}")
+            era5_to_matlab(ds_year, save_path=str(sname), qa=qa)
+            logger.info(f"Saved ERA5 forcing for {year} to {sname}")
+            fnames.append(sname)
+    else:
+        _era5_to_matlab_v73(ds, save_path, time_chunk=time_chunk, qa=qa)
+        logger.info(f"Saved ERA5 forcing to {save_path}")
+        fnames = [save_path]
+
+    if log_qa:
+        qa.log()
+
+    return fnames
+
+
+def _era5_pack_variables(ds: xr.Dataset, qa: PackingQA = None) -> dict:
+    """
+    Convert the ERA5 variables to CryoGrid units and pack them to integers.
+
+    Returns a dictionary with the CryoGrid names as keys and the packed
+    numpy arrays as values (only loads the data of `ds`). If qa is given,
+    the values are checked before they are cast.
+    """
+    era = dict()
+    for key, (name, to_cryogrid_units, sf, dtype) in _ERA5_PACKING.items():
+        arr = to_cryogrid_units(ds[name].values)
+        if sf is not None:
+            arr = arr / ERA5_SCALE_FACTORS[sf]
+        if qa is not None:
+            scale_factor = ERA5_SCALE_FACTORS[sf] if sf is not None else 1.0
+            qa.update(key, arr, scale_factor, dtype, ds[name])
+        era[key] = arr.astype(dtype)
+
+    return era
+
+
+def _era5_to_matlab_v73(
+    ds: xr.Dataset, sname, time_chunk: int = 744, qa: PackingQA = None
+):
+    """
+    Convert ERA5 data to a MATLAB v7.3 forcing file chunk by chunk.
+    """
+    from .matlab_helpers import datetime2matlab
+
+    # HDF5 order is the reverse of the MATLAB order
+    ds = ds.transpose("time", "level", "latitude", "longitude")
+
+    constants = dict(
+        dims="lon x lat (x pressure_levels) x time",
+        lat=ds["latitude"].values[None],  # [coord x 1] in MATLAB
+        lon=ds["longitude"].values[None],
+        p=ds["level"].values[:, None] * 100.0,  # [1 x coord] in MATLAB
+        t=datetime2matlab(ds.time)[:, None],
+        Zs=ds.Zs.values / 9.81,
+        **ERA5_SCALE_FACTORS,
+    )
+
+    def pack_func(chunk):
+        return _era5_pack_variables(chunk, qa=qa)
+
+    _write_era_struct_v73(sname, constants, ds, pack_func, time_chunk)
+
+
+def _write_era_struct_v73(sname, constants: dict, ds, pack_func, time_chunk=744):
+    """
+    Write the ERA5 forcing struct `era` to a MATLAB v7.3 file chunk by chunk.
+
+    MATLAB v7.3 files are HDF5 files with a 512 byte header (user block).
+    MATLAB arrays are column-major, so the HDF5 datasets have the reversed
+    shape of the MATLAB arrays, i.e. [lon, lat, level, time] in MATLAB is
+    stored as (time, level, lat, lon), which makes time the contiguous
+    dimension that is written in chunks.
+
+    Parameters
+    ----------
+    sname : path-like
+        Output file name.
+    constants : dict
+        Fields that are written as they are (in HDF5 order).
+    ds : xr.Dataset
+        Data with time as the first dimension of all variables.
+    pack_func : callable
+        Returns a dictionary of the packed arrays (in HDF5 order) of the
+        time varying fields for a time slice of ds.
+    time_chunk : int
+        Number of time steps that are packed and written at a time.
+    """
+    import h5py
+    import numpy as np
+
+    n_time = ds.sizes["time"]
+
+    with h5py.File(sname, "w", userblock_size=512) as file:
+        era = file.create_group("era")
+        era.attrs["MATLAB_class"] = np.bytes_("struct")
+
+        for key, value in constants.items():
+            _h5_write_matlab_array(era, key, value)
+
+        # fill the packed variables one time chunk at a time
+        for t0 in range(0, n_time, time_chunk):
+            ds_chunk = ds.isel(time=slice(t0, t0 + time_chunk))
+            for key, arr in pack_func(ds_chunk).items():
+                if t0 == 0:  # allocate with the shape of the first chunk
+                    shape = (n_time,) + arr.shape[1:]
+                    chunks = (min(time_chunk, n_time),) + arr.shape[1:]
+                    _h5_write_matlab_array(
+                        era, key, shape=shape, dtype=arr.dtype, chunks=chunks
+                    )
+                era[key][t0 : t0 + arr.shape[0]] = arr
+
+        fields = np.empty(len(era), dtype=object)
+        for i, key in enumerate(era):
+            fields[i] = np.array(list(key), dtype="S1")
+        era.attrs.create("MATLAB_fields", fields, dtype=h5py.vlen_dtype(np.dtype("S1")))
+
+    _write_matlab_v73_header(sname)
+
+
+def _h5_write_matlab_array(group, key, value=None, shape=None, dtype=None, **kwargs):
+    """
+    Create a dataset in a MATLAB v7.3 file (`value` in HDF5 order or an empty
+    dataset of `shape` and `dtype`). Strings are stored as MATLAB char arrays.
+    """
+    import numpy as np
+
+    if isinstance(value, str):
+        dset = group.create_dataset(
+            key, data=np.array([[ord(c)] for c in value], dtype="uint16")
+        )
+        dset.attrs["MATLAB_class"] = np.bytes_("char")
+        dset.attrs["MATLAB_int_decode"] = np.int32(2)
+        return dset
+
+    if value is not None:
+        value = np.atleast_2d(np.asarray(value, dtype=dtype or "float64"))
+        dset = group.create_dataset(key, data=value, **kwargs)
+    else:
+        dset = group.create_dataset(
+            key, shape=shape, dtype=dtype, compression="gzip", **kwargs
+        )
+    matlab_class = {"float64": "double", "float32": "single"}.get(
+        dset.dtype.name, dset.dtype.name
+    )
+    dset.attrs["MATLAB_class"] = np.bytes_(matlab_class)
+
+    return dset
+
+
+def _write_matlab_v73_header(sname):
+    """Write the MATLAB header to the user block of an HDF5 file."""
+    import datetime
+
+    created = datetime.datetime.now().strftime("%a %b %d %H:%M:%S %Y")
+    text = (
+        "MATLAB 7.3 MAT-file, Platform: GLNXA64, "
+        f"Created on: {created} HDF5 schema 1.00 ."
+    )
+    # 116 bytes of text, 8 bytes subsystem offset, version (0x0200) and endian
+    header = text.ljust(116).encode() + b"\x00" * 8 + b"\x00\x02IM"
+
+    with open(sname, "r+b") as file:
+        file.write(header)
+
+
+def extract_point_forcing(
+    ds: xr.Dataset,
+    lat,
+    lon,
+    elevation=None,
+    time_chunk: int = 744,
+    dtype: str = "float32",
+) -> xr.Dataset:
+    """
+    Bilinearly interpolate gridded ERA5 forcing to many points at once.
+
+    The bilinear weights of all points are computed once and stored as a
+    sparse [point, lat x lon] matrix that is applied to each time chunk with
+    a single sparse matrix product. Only the bounding box of the points is
+    read and decoded. The result is lazy (dask) with one task per time chunk,
+    so memory is bounded by the chunks that are computed at a time, e.g.,
+    when the result is written with to_netcdf or to_zarr.
+
+    Parameters
+    ----------
+    ds : xr.Dataset
+        ERA5 forcing with dims [time, (level), lat, lon], e.g., from
+        read_mat_ear5 (can be lazy).
+    lat : array-like
+        Latitudes of the points. If a 1D xr.DataArray is passed (e.g., the
+        latitude of the cluster centroids), its dimension and coordinates
+        are used for the output, otherwise the dimension is `point`.
+    lon : array-like
+        Longitudes of the points (same shape as lat).
+    elevation : array-like, optional
+        Elevation of the points [m]. If given, the pressure level variables
+        are linearly interpolated to the elevation using the geopotential
+        height (Z) of the levels, so that they have dims [point, time].
+        Elevations outside the range of the levels are clipped to the
+        nearest level. If None [default], the level dimension is kept.
+    time_chunk : int, optional
+        Number of time steps per task (and dask chunk), by default 744.
+    dtype : str, optional
+        Data type of the output, by default "float32".
+
+    Returns
+    -------
+    xr.Dataset
+        Dask-backed forcing at the points with dims [point, time]
+        ([point, time, level] for pressure level variables if elevation is
+        None). Variables without lat and lon dims are dropped.
+    """
+    import dask
+    import dask.array
+    import numpy as np
+
+    if isinstance(lat, xr.DataArray) and lat.ndim == 1:
+        point_dim = lat.dims[0]
+        point_coords = {k: v for k, v in lat.coords.items() if v.dims == lat.dims}
+    else:
+        point_dim = "point"
+        point_coords = {}
+    lat = np.asarray(lat, dtype=float).ravel()
+    lon = np.asarray(lon, dtype=float).ravel()
+    assert lat.shape == lon.shape, "lat and lon must have the same shape"
+    if elevation is not None:
+        elevation = np.asarray(elevation, dtype=float).ravel()
+        assert elevation.shape == lat.shape, "elevation must have the shape of lat"
+        assert "Z" in ds, "Z is required to interpolate to the elevation"
+
+    # read only the bounding box of the points
+    bbox = dict()
+    for dim, x in [("lat", lat), ("lon", lon)]:
+        i0, i1, _ = _bilinear_neighbours(ds[dim].values, x)
+        index = np.concatenate([i0, i1])
+        bbox[dim] = slice(index.min(), index.max() + 1)
+    ds = ds.isel(**bbox)
+    weights = _bilinear_weights_sparse(ds["lat"].values, ds["lon"].values, lat, lon)
+
+    variables = [k for k in ds.data_vars if {"lat", "lon"} <= set(ds[k].dims)]
+    ds = ds[variables].transpose(..., "lat", "lon")
+    time_vars = [k for k in variables if ds[k].dims[0] == "time"]
+
+    def interpolate(arr):
+        flat = arr.reshape(-1, weights.shape[1])
+        result = (weights @ flat.T).T
+        return result.reshape(arr.shape[:-2] + (lat.size,))
+
+    def output_dims(key):
+        dims = list(ds[key].dims[:-2])
+        if elevation is not None and "level" in dims:
+            dims.remove("level")
+        return dims + [point_dim]
+
+    def interpolate_chunk(chunk):
+        out = {key: interpolate(chunk[key].values) for key in time_vars}
+        if elevation is not None:
+            z = out["Z"]
+            for key in time_vars:
+                if "level" in ds[key].dims:
+                    axis = ds[key].dims.index("level")
+                    out[key] = _interp_levels_to_elevation(out[key], z, elevation, axis)
+        return {key: arr.astype(dtype) for key, arr in out.items()}
+
+    ds_points = xr.Dataset(attrs=ds.attrs)
+    for key in variables:
+        if key not in time_vars:
+            arr = interpolate(ds[key].values).astype(dtype)
+            ds_points[key] = xr.DataArray(
+                arr, dims=output_dims(key), attrs=ds[key].attrs
+            )
+
+    # one task per time chunk, so only the chunks that are accessed are read
+    blocks = {key: [] for key in time_vars}
+    for t0 in range(0, ds.sizes["time"], time_chunk):
+        chunk = ds[time_vars].isel(time=slice(t0, t0 + time_chunk))
+        result = dask.delayed(interpolate_chunk)(chunk)
+        for key in time_vars:
+            sizes = dict(chunk[key].sizes, **{point_dim: lat.size})
+            shape = tuple(sizes[d] for d in output_dims(key))
+            blocks[key].append(
+                dask.array.from_delayed(result[key], shape=shape, dtype=dtype)
+            )
+    for key in time_vars:
+        ds_points[key] = xr.DataArray(
+            dask.array.concatenate(blocks[key], axis=0),
+            dims=output_dims(key),
+            attrs=ds[key].attrs,
+        )
+
+    ds_points = ds_points.assign_coords(
+        time=ds["time"],
+        lat=(point_dim, lat),
+        lon=(point_dim, lon),
+        **point_coords,
+    )
+    if elevation is None:
+        ds_points = ds_points.assign_coords(level=ds["level"])
+    else:
+        ds_points = ds_points.assign_coords(elevation=(point_dim, elevation))
+
+    return ds_points.transpose(point_dim, ...)
+
+
+def _bilinear_neighbours(coord, x) -> tuple:
+    """
+    Returns the indices of the two neighbours (i0, i1) in coord (ascending or
+    descending) and the weight of i1 for the points x.
+    """
+    import numpy as np
+
+    coord = np.asarray(coord, dtype=float)
+    n = coord.size
+    if n == 1:
+        zeros = np.zeros(x.size, dtype=int)
+        return zeros, zeros, np.zeros(x.size)
+
+    descending = coord[0] > coord[-1]
+    ascending = coord[::-1] if descending else coord
+    lo, hi = ascending[0], ascending[-1]
+    if np.any((x < lo) | (x > hi)):
+        raise ValueError(f"Points are outside of the grid [{lo}, {hi}]")
+
+    i0 = np.clip(np.searchsorted(ascending, x, side="right") - 1, 0, n - 2)
+    i1 = i0 + 1
+    w1 = (x - ascending[i0]) / (ascending[i1] - ascending[i0])
+    if descending:
+        i0, i1 = n - 1 - i0, n - 1 - i1
+
+    return i0, i1, w1
+
+
+def _bilinear_weights_sparse(grid_lat, grid_lon, lat, lon):
+    """Sparse [point, lat x lon] matrix of the bilinear interpolation weights."""
+    import numpy as np
+    from scipy import sparse
+
+    y0, y1, wy = _bilinear_neighbours(grid_lat, lat)
+    x0, x1, wx = _bilinear_neighbours(grid_lon, lon)
+    n_lon = len(grid_lon)
+
+    rows = np.tile(np.arange(lat.size), 4)
+    cols = np.concatenate(
+        [y0 * n_lon + x0, y0 * n_lon + x1, y1 * n_lon + x0, y1 * n_lon + x1]
+    )
+    vals = np.concatenate([(1 - wy) * (1 - wx), (1 - wy) * wx, wy * (1 - wx), wy * wx])
+
+    shape = (lat.size, len(grid_lat) * n_lon)
+    weights = sparse.coo_matrix((vals, (rows, cols)), shape=shape).tocsr()
+    weights.eliminate_zeros()
+
+    return weights
+
+
+def _interp_levels_to_elevation(arr, z, elevation, axis):
+    """
+    Linearly interpolate arr along the level axis to the elevation (last axis
+    is points) using the geopotential height z of the levels (same shape).
+    """
+    import numpy as np
+
+    arr = np.moveaxis(arr, axis, 0)
+    z = np.moveaxis(z, axis, 0)
+
+    # sort levels by height (pressure levels decrease in height)
+    if np.nanmean(z[0]) > np.nanmean(z[-1]):
+        arr, z = arr[::-1], z[::-1]
+
+    n = z.shape[0]
+    i0 = np.clip((z < elevation).sum(axis=0) - 1, 0, n - 2)[None]
+    z0 = np.take_along_axis(z, i0, axis=0)[0]
+    z1 = np.take_along_axis(z, i0 + 1, axis=0)[0]
+    a0 = np.take_along_axis(arr, i0, axis=0)[0]
+    a1 = np.take_along_axis(arr, i0 + 1, axis=0)[0]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        w1 = np.clip((elevation - z0) / (z1 - z0), 0, 1)
+
+    return a0 + w1 * (a1 - a0)
+
+
+def era5_to_zarr(
+    ds: xr.Dataset,
+    store: str,
+    time_chunk: int = 744,
+    spatial_chunk: int = None,
+    qa: PackingQA = None,
+) -> xr.Dataset:
+    """
+    Write ERA5 data to a Zarr forcing store in the packed CryoGrid units.
+
+    The store has the layout of read_mat_ear5 ([time, level, lat, lon] with
+    the CryoGrid variable names), but the variables are stored as the packed
+    integers of the ERA5.mat files with CF `scale_factor` attributes, so
+    that xr.open_zarr decodes them lazily. The extreme of each integer range
+    is the _FillValue (e.g., -32768 for int16) and the store is written in
+    Zarr format 2. If the store already exists, only the time steps after
+    the last time in the store are converted and appended, so that
+    extending the forcing (e.g., by a year) only processes the new data.
+
+    Parameters
+    ----------
+    ds : xr.Dataset
+        Dataset from the ERA5 Copernicus CDS with the variables required for
+        the CryoGrid.POST_PROC.read_mat_ERA class (see era5_to_matlab).
+    store : str
+        Path to the Zarr store.
+    time_chunk : int, optional
+        Number of time steps that are converted at a time and the time chunk
+        size of the store, by default 744.
+    spatial_chunk : int, optional
+        Chunk size of the store along lat and lon. If None [default], the
+        full domain is one chunk. Smaller chunks make reading small
+        bounding boxes faster.
+    qa : PackingQA, optional
+        Collects the counts and locations of values that are outside of the
+        packed integer or physical range. If None [default], a summary is
+        logged as a warning if there are any.
+
+    Returns
+    -------
+    xr.Dataset
+        The (lazy) packed store, opened without decoding.
+    """
+    import pathlib
+
+    from loguru import logger
+
+    store = pathlib.Path(store).expanduser()
+    ds = ds.transpose("time", "level", "latitude", "longitude")
+
+    create = not store.exists()
+    if not create:
+        existing = xr.open_zarr(store, mask_and_scale=False)
+        _check_zarr_store_grid(existing, ds.latitude, ds.longitude, ds.level, store)
+        ds = ds.sel(time=ds.time > existing.time.values[-1])
+        if ds.sizes["time"] == 0:
+            logger.info(f"No new time steps to append to {store}")
+            return existing
+
+    log_qa = qa is None
+    qa = PackingQA() if qa is None else qa
+    n_time = ds.sizes["time"]
+    for t0 in range(0, n_time, time_chunk):
+        chunk = ds.isel(time=slice(t0, t0 + time_chunk))
+        chunk = _era5_to_packed_dataset(chunk, qa=qa)
+        _write_packed_zarr(chunk, store, create, time_chunk, spatial_chunk)
+        create = False
+
+    if log_qa:
+        qa.log()
+
+    logger.info(f"Written {n_time} time steps of ERA5 forcing to {store}")
+
+    return xr.open_zarr(store, mask_and_scale=False)
+
+
+def era5_zarr_to_matlab(
+    store: str,
+    save_path: str,
+    time: slice = None,
+    bbox: tuple = None,
+    time_chunk: int = 744,
+    v73: bool = False,
+):
+    """
+    Export a time and/or bounding box window of a Zarr forcing store to the
+    ERA5.mat layout expected by CryoGrid.POST_PROC.read_mat_ERA.
+
+    The packed integers are copied without decoding and re-scaling.
+
+    Parameters
+    ----------
+    store : str
+        Path to the Zarr store written by era5_to_zarr.
+    save_path : str
+        Path of the output .mat file.
+    time : slice, optional
+        Time window, e.g. slice('2000', '2010'). If None [default], all
+        time steps are exported.
+    bbox : tuple, optional
+        Bounding box (lon_min, lat_min, lon_max, lat_max). If None [default],
+        the full domain is exported.
+    time_chunk : int, optional
+        Number of time steps written at a time (only for v73=True), by
+        default 744.
+    v73 : bool, optional
+        If False [default], writes a MATLAB v5 file with scipy (the window is
+        loaded into memory). If True, writes a MATLAB v7.3 (HDF5) file chunk
+        by chunk (requires h5py).
+
+    Returns
+    -------
+    pathlib.Path
+        The path of the written file.
+    """
+    import pathlib
+
+    import numpy as np
+    from loguru import logger
+
+    save_path = pathlib.Path(save_path).expanduser().with_suffix(".mat")
+    ds = xr.open_zarr(store, mask_and_scale=False)
+
+    if time is not None:
+        ds = ds.sel(time=time)
+    if bbox is not None:
+        lon_min, lat_min, lon_max, lat_max = bbox
+        ds = ds.isel(
+            lat=np.where((ds.lat >= lat_min) & (ds.lat <= lat_max))[0],
+            lon=np.where((ds.lon >= lon_min) & (ds.lon <= lon_max))[0],
+        )
+    assert ds.sizes["time"] > 0, "No time steps in the selected window"
+    assert ds.sizes["lat"] * ds.sizes["lon"] > 0, "No grid cells in the bbox"
+
+    write_mat_era5(ds, save_path, v73=v73, time_chunk=time_chunk)
+    logger.info(f"Exported ERA5 forcing from {store} to {save_path}")
+
+    return save_path
+
+
+def write_mat_era5(
+    ds: xr.Dataset, save_path: str, v73: bool = False, time_chunk: int = 744
+):
+    """
+    Write a dataset in the layout of read_mat_ear5 to an ERA5.mat forcing file.
+
+    This is the inverse of read_mat_ear5, e.g., to write forcing that was
+    modified in Python (e.g., bias corrected) back to CryoGrid. Decoded
+    variables are packed to the integers of the file by rounding with
+    their scale factor (from the encoding, the attributes, or
+    ERA5_SCALE_FACTORS), so unchanged values are written exactly as they
+    were read. Variables that are still packed are written as they are.
+
+    Parameters
+    ----------
+    ds : xr.Dataset
+        Forcing with dims [time, level, lat, lon] and the CryoGrid variable
+        names (u10, v10, ps, Td2, T2, SW, LW, S_TOA, P, T, Z, q, u, v, Zs).
+    save_path : str
+        Path of the output .mat file.
+    v73 : bool, optional
+        If False [default], writes a MATLAB v5 file with scipy (the data is
+        loaded into memory). If True, writes a MATLAB v7.3 (HDF5) file
+        chunk by chunk (requires h5py).
+    time_chunk : int, optional
+        Number of time steps packed and written at a time (only for
+        v73=True), by default 744.
+
+    Returns
+    -------
+    pathlib.Path
+        The path of the written file.
+    """
+    import pathlib
+
+    from .matlab_helpers import datetime2matlab
+
+    save_path = pathlib.Path(save_path).expanduser().with_suffix(".mat")
+
+    packed = [k for k in _ERA5_PACKING if k in ds]
+    scale_factors = dict()
+    for key in packed:
+        sf_key = _ERA5_PACKING[key][2]
+        scale = _get_scale_factor(ds, key)
+        if sf_key is not None:
+            scale_factors.setdefault(sf_key, scale)
+    zs = ds["Zs"].transpose("lat", "lon").values.astype(float)
+
+    def pack_func(chunk):
+        return {key: _pack_values(chunk, key) for key in packed}
+
+    if v73:
+        ds = ds.transpose("time", "level", "lat", "lon")
+        constants = dict(
+            dims="lon x lat (x pressure_levels) x time",
+            lat=ds["lat"].values[None],
+            lon=ds["lon"].values[None],
+            p=ds["level"].values[:, None] * 100.0,
+            t=datetime2matlab(ds.time)[:, None],
+            Zs=zs,
+            **scale_factors,
+        )
+        _write_era_struct_v73(save_path, constants, ds, pack_func, time_chunk)
+    else:
+        from scipy.io import savemat
+
+        ds = ds.transpose("lon", "lat", "level", "time")
+        era = dict()
+        era["dims"] = "lon x lat (x pressure_levels) x time"
+        era["lat"] = ds["lat"].values[:, None]
+        era["lon"] = ds["lon"].values[:, None]
+        era["p"] = ds["level"].values[None] * 100
+        era["t"] = datetime2matlab(ds.time)[None]
+        era["Zs"] = zs.T
+        era.update(pack_func(ds))
+        era.update(scale_factors)
+        savemat(save_path, {"era": era}, do_compression=True)
+
+    return save_path
+
+
+def _get_scale_factor(ds: xr.Dataset, key: str) -> float:
+    """Scale factor of a packed variable (encoding, attrs, dataset, default)."""
+    import numpy as np
+
+    da = ds[key]
+    sf_key = _ERA5_PACKING[key][2]
+    for source in [da.encoding, da.attrs]:
+        if "scale_factor" in source:
+            return float(source["scale_factor"])
+    if sf_key in ds:
+        return float(np.asarray(ds[sf_key]))
+    if sf_key in ds.attrs:
+        return float(ds.attrs[sf_key])
+    return ERA5_SCALE_FACTORS.get(sf_key, 1.0)
+
+
+def _pack_values(ds: xr.Dataset, key: str):
+    """
+    Packed integer values of a variable. Decoded values are rounded to the
+    nearest integer and values outside of the integer range are clipped.
+    """
+    import numpy as np
+    from loguru import logger
+
+    dtype = np.dtype(_ERA5_PACKING[key][3])
+    values = ds[key].values
+    if np.issubdtype(values.dtype, np.integer):
+        return values.astype(dtype)
+
+    info = np.iinfo(dtype)
+    with np.errstate(invalid="ignore"):
+        values = np.round(values / _get_scale_factor(ds, key))
+        n_invalid = np.count_nonzero(~(values >= info.min) | ~(values <= info.max))
+    if n_invalid:
+        logger.warning(f"{key}: {n_invalid} NaN or out of range values are clipped")
+    values = np.clip(np.nan_to_num(values), info.min, info.max)
+
+    return values.astype(dtype)
+
+
+def _check_zarr_store_grid(existing: xr.Dataset, lat, lon, level, store):
+    """Raise a ValueError if the grid of the ERA5 data does not match the store."""
+    import numpy as np
+
+    for dim, values in [("lat", lat), ("lon", lon)]:
+        if not np.allclose(existing[dim].values, values):
+            raise ValueError(f"The {dim} of ds does not match the store {store}")
+    if not np.array_equal(existing["level"].values, level):
+        raise ValueError(f"The levels of ds do not match the store {store}")
+
+
+def _write_packed_zarr(chunk, store, create, time_chunk=744, spatial_chunk=None):
+    """
+    Write (create=True) or append a packed dataset (see _era5_to_packed_dataset)
+    to a Zarr store.
+    """
+    import numpy as np
+    from loguru import logger
+
+    # move scale_factor to the encoding so that xarray writes (and appends)
+    # the packed integers, the values are already truncated integers
+    chunk = xr.decode_cf(chunk)
+    if create:
+        spatial = spatial_chunk or max(chunk.sizes["lat"], chunk.sizes["lon"])
+        sizes = dict(
+            time=time_chunk, level=chunk.sizes["level"], lat=spatial, lon=spatial
+        )
+        encoding = dict()
+        for key in chunk.data_vars:
+            if chunk[key].ndim == 0:
+                continue
+            encoding[key] = dict(chunk[key].encoding)
+            encoding[key]["chunks"] = [sizes[d] for d in chunk[key].dims]
+            dtype = np.dtype(encoding[key].get("dtype", chunk[key].dtype))
+            if dtype.kind in "iu":
+                # the extreme of the packed range marks missing values
+                info = np.iinfo(dtype)
+                encoding[key]["_FillValue"] = (
+                    info.min if dtype.kind == "i" else info.max
+                )
+        # xarray cannot read the _FillValue of Zarr format 3 stores with zarr 3.1
+        chunk.to_zarr(store, mode="w", encoding=encoding, zarr_format=2)
+    else:
+        time_vars = [k for k in chunk.data_vars if "time" in chunk[k].dims]
+        chunk[time_vars].to_zarr(store, append_dim="time")
+
+    t1 = chunk.time.values[-1].astype("datetime64[h]")
+    logger.log(5, f"Written ERA5 forcing up to {t1} to {store}")
+
+
+def _era5_to_packed_dataset(ds: xr.Dataset, qa: PackingQA = None) -> xr.Dataset:
+    """
+    Convert ERA5 data (time, level, latitude, longitude) to the packed
+    CryoGrid variables with CF scale_factor attributes (see era5_to_zarr).
+    """
+    units = dict(
+        u10="m s-1",
+        v10="m s-1",
+        u="m s-1",
+        v="m s-1",
+        Td2="degC",
+        T2="degC",
+        T="degC",
+        SW="W m-2 hr-1",
+        LW="W m-2 hr-1",
+        S_TOA="W m-2 hr-1",
+        ps="Pa",
+        P="mm hr-1",
+        q="kg kg-1",
+        Z="m",
+    )
+
+    out = xr.Dataset(
+        coords=dict(
+            time=ds["time"].values,
+            level=ds["level"].values,
+            lat=ds["latitude"].values,
+            lon=ds["longitude"].values,
+        ),
+        attrs=ERA5_SCALE_FACTORS,
+    )
+    out["level"].attrs = dict(long_name="pressure", units="hPa")
+
+    for key, arr in _era5_pack_variables(ds, qa=qa).items():
+        _, _, sf, _ = _ERA5_PACKING[key]
+        dims = (
+            ["time", "level", "lat", "lon"] if arr.ndim == 4 else ["time", "lat", "lon"]
+        )
+        attrs = dict(units=units[key])
+        attrs["scale_factor"] = ERA5_SCALE_FACTORS[sf] if sf is not None else 1.0
+        out[key] = xr.DataArray(arr, dims=dims, attrs=attrs)
+
+    out["Zs"] = xr.DataArray(
+        ds["Zs"].transpose("latitude", "longitude").values / 9.81,
+        dims=["lat", "lon"],
+        attrs=dict(units="m", long_name="surface geopotential height"),
+    )
+
+    return out
+
+
+def era5_files_to_zarr(
+    single_level_files,
+    pressure_level_files,
+    zs_file: str,
+    store: str,
+    time_chunk: int = 744,
+    spatial_chunk: int = None,
+    qa: PackingQA = None,
+    **joblib_kwargs,
+) -> xr.Dataset:
+    """
+    Assemble many (e.g., monthly) CDS ERA5 netCDF downloads into a Zarr forcing store.
+
+    Each pair of single level and pressure level files is opened, aligned,
+    converted to CryoGrid units and packed to integers by a parallel worker,
+    so no merged float cube of all files is created. The packed files are
+    written (or appended, see era5_to_zarr) to the store in time order as
+    they are finished. Files with no time steps after the end of an existing
+    store are skipped.
+
+    Parameters
+    ----------
+    single_level_files : str or list
+        Glob pattern or list of the single level files with u10, v10, sp,
+        d2m, t2m, ssrd, strd, tisr, tp.
+    pressure_level_files : str or list
+        Glob pattern or list of the pressure level files with t, z, q, u, v.
+        Must cover the same time steps as the single level files (one
+        pressure level file per single level file).
+    zs_file : str
+        File with the surface geopotential (Zs or z) of a single date.
+    store : str
+        Path to the Zarr store.
+    time_chunk : int, optional
+        Time chunk size of the store, by default 744.
+    spatial_chunk : int, optional
+        Chunk size of the store along lat and lon. If None [default], the
+        full domain is one chunk.
+    qa : PackingQA, optional
+        Collects the counts and locations of values that are outside of the
+        packed integer or physical range. If None [default], a summary is
+        logged as a warning if there are any.
+    joblib_kwargs : dict
+        Uses the joblib library to process the files in parallel.
+        Defaults are: n_jobs=-1, backend='loky'
+
+    Returns
+    -------
+    xr.Dataset
+        The (lazy) packed store, opened without decoding.
+    """
+    import pathlib
+
+    import joblib
+    from loguru import logger
+
+    sl_files = _expand_file_list(single_level_files)
+    pl_files = _expand_file_list(pressure_level_files)
+    if len(sl_files) != len(pl_files):
+        raise ValueError(
+            f"Found {len(sl_files)} single level files, but "
+            f"{len(pl_files)} pressure level files"
+        )
+
+    # pair the files by their first time step (reads only the metadata)
+    sl_files = sorted(sl_files, key=_get_first_time)
+    pl_files = sorted(pl_files, key=_get_first_time)
+
+    store = pathlib.Path(store).expanduser()
+    create = not store.exists()
+    after = None
+    if not create:
+        existing = xr.open_zarr(store, mask_and_scale=False)
+        after = existing.time.values[-1]
+
+    props = dict(n_jobs=-1, backend="loky")
+    props.update(joblib_kwargs)
+    props["return_as"] = "generator"  # written in order as they are finished
+
+    func = joblib.delayed(_pack_era5_files)
+    tasks = [func(sl, pl, zs_file, after) for sl, pl in zip(sl_files, pl_files)]
+
+    log_qa = qa is None
+    qa = PackingQA() if qa is None else qa
+    n_time = 0
+    results = joblib.Parallel(**props)(tasks)
+    for (sl, pl), (packed, file_qa) in zip(zip(sl_files, pl_files), results):
+        if packed is None:
+            logger.debug(f"No new time steps in {sl.name}")
+            continue
+        qa.merge(file_qa)
+        if not create:
+            _check_zarr_store_grid(
+                existing, packed.lat, packed.lon, packed.level, store
+            )
+        _write_packed_zarr(packed, store, create, time_chunk, spatial_chunk)
+        if create:
+            existing = xr.open_zarr(store, mask_and_scale=False)
+            create = False
+        n_time += packed.sizes["time"]
+        logger.debug(f"Written {sl.name} and {pl.name} to {store}")
+
+    logger.info(f"Written {n_time} time steps of ERA5 forcing to {store}")
+    if log_qa:
+        qa.log()
+
+    return xr.open_zarr(store, mask_and_scale=False)
+
+
+def _pack_era5_files(sl_file, pl_file, zs_file, after=None):
+    """
+    Open, align and pack a pair of single and pressure level files (worker).
+    Returns the packed dataset (None if there are no time steps after
+    `after`) and the PackingQA of the file.
+    """
+    # the files are closed on every path, also when they are skipped or invalid
+    with (
+        xr.open_dataset(sl_file) as ds_sl,
+        xr.open_dataset(pl_file) as ds_pl,
+        xr.open_dataset(zs_file) as ds_zs,
+    ):
+        ds_sl = _normalize_cds_names(ds_sl)
+        ds_pl = _normalize_cds_names(ds_pl)
+        ds_zs = _normalize_cds_names(ds_zs)
+
+        try:
+            ds_sl, ds_pl = xr.align(ds_sl, ds_pl, join="exact", exclude=["level"])
+        except ValueError as error:
+            raise ValueError(
+                f"{sl_file} and {pl_file} do not have the same time steps or grid"
+            ) from error
+
+        zs = ds_zs["Zs"] if "Zs" in ds_zs else ds_zs["z"]
+        zs = zs.squeeze(drop=True)
+        zs = zs.reindex_like(ds_sl, method="nearest", tolerance=1e-6)
+        ds = xr.merge([ds_sl, ds_pl], join="exact").assign(Zs=zs)
+
+        if after is not None:
+            ds = ds.sel(time=ds.time > after)
+            if ds.sizes["time"] == 0:
+                return None, None
+
+        ds = ds.transpose("time", "level", "latitude", "longitude")
+        qa = PackingQA()
+        # packing loads the data, so the result does not need the files
+        packed = _era5_to_packed_dataset(ds, qa=qa)
+
+    return packed, qa
+
+
+def _normalize_cds_names(ds: xr.Dataset) -> xr.Dataset:
+    """Rename the coordinates of the new CDS netCDF format to the old names."""
+    names = dict(valid_time="time", pressure_level="level")
+    ds = ds.rename({k: v for k, v in names.items() if k in ds.dims or k in ds.coords})
+    return ds.drop_vars(["number", "expver"], errors="ignore")
+
+
+def _get_first_time(fname):
+    """First time step of a netCDF file (reads only the metadata)."""
+    with xr.open_dataset(fname) as ds:
+        ds = _normalize_cds_names(ds)
+        return ds["time"].values[0]
+
+
+def _expand_file_list(files) -> list:
+    """Glob pattern or list of files to a list of paths."""
+    import glob
+    import pathlib
+
+    if isinstance(files, (str, pathlib.Path)):
+        flist = sorted(glob.glob(str(pathlib.Path(files).expanduser())))
+    else:
+        flist = list(files)
+    if len(flist) == 0:
+        raise FileNotFoundError(f"No files found with {files}")
+
+    return [pathlib.Path(f) for f in flist]
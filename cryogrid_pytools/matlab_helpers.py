@@ -212,7 +212,15 @@ def datetime2matlab(
 
         return offset_days
 
-    hours_since_ref = time.values.astype("datetime64[h]").astype(float)
+    # rounding (not truncating) to the hour, since times read from datenums
+    # (e.g., read_mat_ear5) can be a few microseconds before the full hour
+    hours_since_ref = (
+        pd.DatetimeIndex(np.ravel(time.values))
+        .round("h")
+        .values.astype("datetime64[h]")
+        .astype(float)
+        .reshape(np.shape(time.values))
+    )
     days_since_ref = hours_since_ref / 24
 
     matlab_offset = get_matlab_datenum_offset(reference_datestr)
@@ -4,6 +4,17 @@ import numpy as np
 import pandas as pd
 import xarray as xr
 
+# variables of the spatial data that are not clustering features
+_NON_FEATURE_VARIABLES = (
+    "mask",
+    "matlab_index",
+    "latitude",
+    "longitude",
+    "cluster_number_mapped",
+    "cluster_centroid_index",
+    "cluster_centroid_index_mapped",
+)
+
 
 def read_spatial_data(
     fname_spatial_mat: str,
@@ -80,13 +91,12 @@ def read_spatial_data(
     centroid_index = spatial_dict.pop("sample_centroid_index")
 
     spatial_dict["matlab_index"] = np.arange(1, spatial_dict["mask"].size + 1)
-    # convert to DataFrame and then to xarray with [y, x] as dimensions
-    ds = (
-        pd.DataFrame.from_dict(spatial_dict)
-        .set_index(["Y", "X"])
-        .to_xarray()
-        .rename(cluster_number="cluster_number_mapped")
-    )
+    # reshape the flat fields straight to [y, x] if X and Y form a regular grid
+    ds = _flat_dict_to_grid(spatial_dict)
+    if ds is None:
+        # irregular grid: convert to DataFrame and unstack to [y, x]
+        ds = pd.DataFrame.from_dict(spatial_dict).set_index(["Y", "X"]).to_xarray()
+    ds = ds.rename(cluster_number="cluster_number_mapped")
 
     # add the centroid_idx as a coordinate with cluster_number as index (0 + 1 - k)
     ds["cluster_centroid_index"] = xr.DataArray(
@@ -105,17 +115,16 @@ def read_spatial_data(
 
     # cluster_centroid_index_mapped [0-k] has cluster number index, we can thus
     # use the cluster_num to convert this flat data to 2D index data
-    ds["cluster_centroid_index_mapped"] = (
-        ds["cluster_centroid_index"]
-        .sel(cluster_number=ds.cluster_number_mapped.fillna(0))
-        .astype("uint32")
-        .assign_attrs(
-            description=(
-                "Each pixel belongs to a cluster. Each cluster has a centroid "
-                "that represents that entire cluster. This array gives the "
-                "index of the centroid mapped out to the cluster."
-            )
-        )
+    cluster_number = np.nan_to_num(ds.cluster_number_mapped.values).astype(int)
+    ds["cluster_centroid_index_mapped"] = ds.cluster_number_mapped.copy(
+        data=ds["cluster_centroid_index"].values[cluster_number]
+    ).assign_attrs(
+        long_name="Cluster centroid index",
+        description=(
+            "Each pixel belongs to a cluster. Each cluster has a centroid "
+            "that represents that entire cluster. This array gives the "
+            "index of the centroid mapped out to the cluster."
+        ),
     )
 
     ds = ds.rename(X="x", Y="y")
@@ -125,6 +134,53 @@ def read_spatial_data(
     return ds
 
 
+def _flat_dict_to_grid(spatial_dict: dict) -> Union[xr.Dataset, None]:
+    """
+    Reshapes the flat fields of spatial_dict to [Y, X] arrays.
+
+    The position of each point on the grid is found from the sorted unique
+    X and Y coordinates, so no DataFrame or MultiIndex is required.
+
+    Parameters
+    ----------
+    spatial_dict : dict
+        Dictionary with flat arrays of the same size, must contain X and Y.
+
+    Returns
+    -------
+    ds : xr.Dataset or None
+        Dataset with [Y, X] as dimensions (both ascending). None if the
+        points do not fill a regular grid (each cell exactly once).
+    """
+    x = np.asarray(spatial_dict["X"]).ravel()
+    y = np.asarray(spatial_dict["Y"]).ravel()
+
+    x_unique = np.unique(x)
+    y_unique = np.unique(y)
+    nx, ny = x_unique.size, y_unique.size
+
+    if (nx * ny != x.size) or (y.size != x.size):
+        return None
+
+    flat_index = np.searchsorted(y_unique, y) * nx + np.searchsorted(x_unique, x)
+    # every cell has to be filled exactly once
+    if np.bincount(flat_index, minlength=nx * ny).max() != 1:
+        return None
+
+    ds = xr.Dataset(coords=dict(Y=y_unique, X=x_unique))
+    for key, values in spatial_dict.items():
+        if key in ["X", "Y"]:
+            continue
+        values = np.asarray(values).ravel()
+        if values.size != x.size:
+            return None
+        grid = np.empty(nx * ny, dtype=values.dtype)
+        grid[flat_index] = values
+        ds[key] = ("Y", "X"), grid.reshape(ny, nx)
+
+    return ds
+
+
 def renamer_old_to_new(spatial_dict):
     """
     Renames the variables in the spatial_dict to match the new naming
@@ -164,70 +220,927 @@ def renamer_old_to_new(spatial_dict):
 
 
 def map_gridcells_to_clusters(
-    da: xr.DataArray, cluster_labels: xr.DataArray, missing_value=np.nan
+    da: xr.DataArray,
+    cluster_labels: xr.DataArray,
+    missing_value=np.nan,
+    dim: Union[str, None] = None,
 ) -> xr.DataArray:
     """
-    Maps the single depth selection of the profiles to the 2D clusters
+    Maps the profiles to the 2D clusters
+
+    A lookup from gridcell (cluster centroid index) to position along `dim`
+    is computed once and the data is gathered with np.take along `dim`. All
+    other dimensions (e.g., depth, time) are kept. If `da` is a dask array,
+    the mapping is lazy and each chunk is mapped independently, so large
+    maps can be written to disk chunk by chunk.
 
     Parameters
     ----------
     da : xr.DataArray
-        Single depth selection of the profiles with `index` dimension only.
-        Note that `index` must start at 1 (0 is reserved for masked data).
+        Profile data with the gridcell dimension `dim` and any number of other
+        dimensions. Note that `da[dim]` must start at 1 (0 is reserved for
+        masked data).
     cluster_labels : xr.DataArray
         2D array with the index of the cluster centroid of each cluster
         Must have dtype uint32. Can have 0 to represent masked data.
+    missing_value : scalar, optional
+        Value given to pixels whose cluster centroid is not in `da[dim]`,
+        by default np.nan. Masked pixels (0) are always NaN.
+    dim : str, optional
+        The gridcell dimension of da. If None [default], then the only
+        dimension of a 1D array is used, otherwise `profile`.
 
     Returns
     -------
     da_2d_mapped : xr.DataArray
-        The 2D array of the profiles mapped to the clusters with the same shape as
-        cluster_labels. The 2D gridcells will also be given as a coordinate
+        The profiles mapped to the clusters with the dimensions of `da` where
+        `dim` is replaced by the (trailing) dimensions of cluster_labels.
 
     Raises
     ------
     ValueError
-        If da (variable to be mapped) does not have index dimension only
+        If the gridcell dimension cannot be found in da
     """
 
-    if len(da.dims) != 1:
-        raise ValueError("da must have only one dimension that corresponds to cluster_labels")
-
-    dim = da.dims[0]
+    if dim is None:
+        dim = da.dims[0] if da.ndim == 1 else "profile"
+    if dim not in da.dims:
+        raise ValueError(
+            f"`{dim}` is not a dimension of da, pass the gridcell dimension with dim="
+        )
     if da[dim].isin([0]).any():
         raise ValueError("`da[dim]` must start at 1 (0 is reserved for masked data).")
 
     # data needs to be loaded to work for this function
     cluster_labels = cluster_labels.compute()
 
-    missing_clusters = ~cluster_labels.isin(
-        [0] + da[dim].values.tolist()
-    )
-    cluster_labels = (
-        cluster_labels.where(~missing_clusters)
-        .fillna(0)
-        .astype("uint32")
+    label_dims = cluster_labels.dims
+    position = xr.DataArray(
+        _get_gridcell_positions(da[dim].values, cluster_labels.values),
+        dims=label_dims,
     )
 
-    # if there is masked data in the cluster_labels, then we need to
-    # create a dummy index, otherwise an error will be raised when using the
-    # .sel() method below
-    if 0 in cluster_labels:
-        # create a single index with 0 value
-        dummy0 = xr.DataArray(data=0, dims=(dim,), coords={dim:[0]})
-        # concatenate the dummy index to the cluster_labels
-        da = xr.concat([dummy0, da], dim=dim).assign_attrs(**da.attrs)
+    dtype = np.result_type(da.dtype, np.float32)
+    if da.chunks is not None:
+        # the lookup is shared by all tasks as a single block
+        da = da.chunk({dim: -1})
+        position = position.chunk(-1)
 
-    # use the cluster_labels to map the index to the spatial clusters
-    da_2d_mapped = da.sel(**{dim: cluster_labels})
-    da_2d_mapped = da_2d_mapped.where(lambda x: x != 0).where(
-        ~missing_clusters, missing_value
+    da_2d_mapped = xr.apply_ufunc(
+        _gather_kernel,
+        da,
+        position,
+        input_core_dims=[[dim], label_dims],
+        output_core_dims=[label_dims],
+        kwargs=dict(missing_value=missing_value, n_label_dims=len(label_dims)),
+        dask="parallelized",
+        output_dtypes=[dtype],
     )
 
-    da_2d_mapped.attrs = da.attrs
+    da_2d_mapped = da_2d_mapped.assign_coords(cluster_labels.coords)
+    da_2d_mapped.attrs = da.attrs.copy()
     da_2d_mapped.attrs["history"] = (
         da.attrs.get("history", "")
         + f"Mapped to 2D clusters using {cluster_labels.name}"
     )
 
     return da_2d_mapped
+
+
+def _get_gridcell_positions(
+    gridcells: np.ndarray, cluster_labels: np.ndarray
+) -> np.ndarray:
+    """
+    Converts cluster labels to positions along the gridcell dimension.
+
+    Returns an int array with the shape of cluster_labels where masked pixels
+    (label 0) are -1 and labels that are not in gridcells are -2.
+    """
+    gridcells = np.asarray(gridcells).astype("int64")
+    labels = np.asarray(cluster_labels)
+    labels = np.nan_to_num(labels).astype("int64")
+
+    if gridcells.size == 0:
+        return np.where(labels == 0, -1, -2).astype("int32")
+
+    # search the sorted gridcells so the lookup scales with the number of
+    # gridcells and not with the largest (pixel) index
+    order = np.argsort(gridcells)
+    index = np.searchsorted(gridcells[order], labels)
+    index = np.clip(index, 0, gridcells.size - 1)
+
+    found = gridcells[order][index] == labels
+    position = np.where(found, order[index], -2).astype("int32")
+    position[labels == 0] = -1
+
+    return position
+
+
+def _gather_kernel(
+    arr: np.ndarray, position: np.ndarray, missing_value=np.nan, n_label_dims=2
+) -> np.ndarray:
+    """Gathers the last axis of arr to the shape of position."""
+    dtype = np.result_type(arr.dtype, np.float32)
+    # drop any broadcast axes that xarray added to the lookup
+    position = position.reshape(position.shape[-n_label_dims:])
+    flat = position.ravel()
+
+    out = np.take(arr, np.clip(flat, 0, None), axis=-1).astype(dtype, copy=False)
+    out[..., flat == -2] = missing_value
+    out[..., flat == -1] = np.nan
+
+    return out.reshape(arr.shape[:-1] + position.shape)
+
+
+def map_profiles_to_clusters_lazy(
+    ds_profiles: xr.Dataset,
+    ds_spatial: xr.Dataset,
+    variables: Union[list, None] = None,
+    chunks: Union[dict, None] = None,
+    crs: Union[str, None] = None,
+) -> xr.Dataset:
+    """
+    Lazily maps the profile outputs to the [y, x] grid of the clusters
+
+    Nothing is computed, each chunk of the output is only mapped when it is
+    written or loaded. Output dimensions are [..., time, y, x] where y is
+    descending (north up), as expected for GeoTIFFs and GeoZarr.
+
+    Parameters
+    ----------
+    ds_profiles : xr.Dataset
+        Output from read_OUT_regridded_files with a `profile` dimension.
+    ds_spatial : xr.Dataset
+        Output from read_spatial_data that contains
+        `cluster_centroid_index_mapped`.
+    variables : list, optional
+        Variables in ds_profiles to map. If None [default], all variables
+        with a profile dimension are mapped.
+    chunks : dict, optional
+        Chunks of the non-profile dimensions (e.g., dict(time=12, depth=1)).
+        Each chunk is mapped to a full [y, x] grid, so these control the
+        memory per task. By default, one time step and depth per chunk.
+    crs : str, optional
+        Coordinate reference system of the grid. If None [default], then the
+        CRS of ds_spatial is used (if any).
+
+    Returns
+    -------
+    xr.Dataset
+        Dask-backed dataset with the mapped variables (float32).
+    """
+    import rioxarray  # noqa
+
+    if variables is None:
+        variables = [
+            k for k in ds_profiles.data_vars if "profile" in ds_profiles[k].dims
+        ]
+
+    labels = ds_spatial["cluster_centroid_index_mapped"].sortby("y", ascending=False)
+    crs = crs or ds_spatial.rio.crs
+
+    ds = ds_profiles[variables]
+    default_chunks = {d: 1 for d in ds.dims if d != "profile"}
+    ds = ds.chunk(default_chunks | (chunks or {}) | dict(profile=-1))
+
+    mapped = xr.Dataset(attrs=ds_profiles.attrs)
+    for key in variables:
+        mapped[key] = map_gridcells_to_clusters(
+            ds[key].astype("float32"), labels, dim="profile"
+        ).astype("float32")
+
+    mapped = mapped.drop_vars(
+        [c for c in mapped.coords if c not in mapped.dims and c != "spatial_ref"]
+    )
+    mapped = mapped.transpose(..., "y", "x")
+    if crs is not None:
+        mapped = mapped.rio.write_crs(crs).rio.write_coordinate_system()
+
+    return mapped
+
+
+def write_mapped_profiles_zarr(
+    ds_profiles: xr.Dataset,
+    ds_spatial: xr.Dataset,
+    store: str,
+    variables: Union[list, None] = None,
+    chunks: Union[dict, None] = None,
+    crs: Union[str, None] = None,
+    n_jobs: int = -1,
+    **to_zarr_kwargs,
+):
+    """
+    Maps the profile outputs to the cluster grid and streams them to a Zarr store
+
+    Each output chunk is mapped and written by a worker independently, so
+    the memory stays bounded by (n_jobs x chunk size) regardless of the
+    length of the run. The CRS is stored with rio.write_crs.
+
+    Parameters
+    ----------
+    ds_profiles : xr.Dataset
+        Output from read_OUT_regridded_files with a `profile` dimension.
+    ds_spatial : xr.Dataset
+        Output from read_spatial_data.
+    store : str
+        Path to the output Zarr store.
+    variables : list, optional
+        Variables to write, by default all profile variables.
+    chunks : dict, optional
+        Chunks of the non-profile dimensions, by default one time step and
+        depth per chunk. These are also the chunks of the Zarr store.
+    crs : str, optional
+        Coordinate reference system, by default the CRS of ds_spatial.
+    n_jobs : int, optional
+        Number of threads that map and write chunks, by default -1 (all cores).
+    to_zarr_kwargs : dict
+        Additional keyword arguments passed to xr.Dataset.to_zarr
+        (defaults are mode="w", zarr_format=2). The store is written in
+        Zarr format 2 since xarray cannot read the NaN _FillValue of
+        float variables back from format 3 stores with zarr 3.1.
+
+    Returns
+    -------
+    str
+        The path of the store.
+    """
+    import os
+
+    import dask
+
+    mapped = map_profiles_to_clusters_lazy(
+        ds_profiles, ds_spatial, variables=variables, chunks=chunks, crs=crs
+    )
+    # the encoding chunks are taken from the dask chunks
+    for key in mapped.data_vars:
+        mapped[key].encoding.pop("chunks", None)
+
+    props = dict(mode="w", compute=False, zarr_format=2)
+    props.update(to_zarr_kwargs)
+    delayed = mapped.to_zarr(store, **props)
+
+    num_workers = os.cpu_count() if n_jobs == -1 else n_jobs
+    with dask.config.set(scheduler="threads", num_workers=num_workers):
+        dask.compute(delayed)
+
+    return store
+
+
+def write_mapped_profiles_geotiffs(
+    ds_profiles: xr.Dataset,
+    ds_spatial: xr.Dataset,
+    filename: str,
+    variables: Union[list, None] = None,
+    crs: Union[str, None] = None,
+    **joblib_kwargs,
+) -> list:
+    """
+    Maps the profile outputs to the cluster grid and writes cloud-optimised GeoTIFFs
+
+    One GeoTIFF is written for each variable and each combination of the
+    non-spatial dimensions (e.g., depth and time). Each file is mapped and
+    written by a separate task, so memory stays bounded.
+
+    Parameters
+    ----------
+    ds_profiles : xr.Dataset
+        Output from read_OUT_regridded_files with a `profile` dimension.
+    ds_spatial : xr.Dataset
+        Output from read_spatial_data.
+    filename : str
+        File name template that can contain `{variable}` and the names of the
+        non-spatial dimensions, e.g., "maps/{variable}_{depth}m_{time:%Y%m%d}.tif".
+    variables : list, optional
+        Variables to write, by default all profile variables.
+    crs : str, optional
+        Coordinate reference system, by default the CRS of ds_spatial.
+    joblib_kwargs : dict
+        Uses the joblib library to write the files in parallel.
+        Defaults are: n_jobs=-1, backend='threading', verbose=1
+
+    Returns
+    -------
+    list
+        List of the written file names
+    """
+    import pathlib
+
+    import joblib
+    import pandas as pd
+
+    mapped = map_profiles_to_clusters_lazy(
+        ds_profiles, ds_spatial, variables=variables, crs=crs
+    )
+
+    def write_slice(da: xr.DataArray, sname: pathlib.Path):
+        sname.parent.mkdir(parents=True, exist_ok=True)
+        da.compute().rio.to_raster(sname, driver="COG")
+        return str(sname)
+
+    tasks = []
+    for key in mapped.data_vars:
+        da = mapped[key]
+        dims = [d for d in da.dims if d not in ["y", "x"]]
+        stacked = da.stack(_slice=dims) if len(dims) else da.expand_dims(_slice=[0])
+        for i in range(stacked["_slice"].size):
+            da_slice = stacked.isel(_slice=i)
+            labels = {d: da_slice[d].values[()] for d in dims}
+            labels = {
+                k: pd.Timestamp(v) if isinstance(v, np.datetime64) else v
+                for k, v in labels.items()
+            }
+            sname = pathlib.Path(filename.format(variable=key, **labels))
+            da_slice = da_slice.drop_vars(["_slice"] + dims, errors="ignore")
+            tasks += (joblib.delayed(write_slice)(da_slice, sname),)
+
+    props = dict(n_jobs=-1, backend="threading", verbose=1)
+    props.update(joblib_kwargs)
+    flist = list(joblib.Parallel(**props)(tasks))  # type: ignore
+
+    return flist
+
+
+def aggregate_pixels_to_clusters(
+    data: Union[xr.Dataset, xr.DataArray],
+    cluster_labels: xr.DataArray,
+    stats: tuple = ("mean", "std", "min", "max", "count"),
+    categorical: Union[list, None] = None,
+) -> xr.Dataset:
+    """
+    Aggregates pixel-level rasters to the clusters (the reverse of mapping)
+
+    The statistics are computed with bincount reductions over the flat integer
+    labels, so all clusters are reduced in one pass over the pixels. All
+    variables of a Dataset are reduced in the same pass. If the data is a dask
+    array, each block (e.g., a chunk of time steps of a spatial tile) is
+    reduced to partial sums that are then combined, so the rasters are never
+    loaded in full.
+
+    Parameters
+    ----------
+    data : xr.Dataset or xr.DataArray
+        Rasters on the same [y, x] grid as cluster_labels (e.g., MODIS albedo,
+        snow melt DOY, land cover). Variables can have leading dimensions
+        (e.g., time or band) that are kept in the output.
+    cluster_labels : xr.DataArray
+        2D integer labels of each pixel, e.g., `cluster_number_mapped` or
+        `cluster_centroid_index_mapped` from read_spatial_data. 0 and NaN are
+        treated as masked and are not aggregated.
+    stats : tuple of str, optional
+        Statistics for the continuous variables. Any of "mean", "std", "min",
+        "max", "sum", "count". By default all but "sum". The standard
+        deviation is the population standard deviation (ddof=0).
+    categorical : list, optional
+        Names of integer variables (e.g., land cover classes) for which the
+        fraction of each class per cluster is computed instead of stats.
+
+    Returns
+    -------
+    xr.Dataset
+        Dataset with `cluster` as a dimension (labels > 0 that occur in
+        cluster_labels). Continuous variables have a `stat` dimension and
+        categorical variables are returned as `<name>_fraction` with a
+        `class` dimension.
+    """
+    import dask
+
+    valid_stats = ("mean", "std", "min", "max", "sum", "count")
+    for stat in stats:
+        assert stat in valid_stats, f"stat must be one of {valid_stats}, not {stat}"
+
+    if isinstance(data, xr.DataArray):
+        data = data.to_dataset(name=data.name or "data")
+    categorical = categorical or []
+
+    spatial_dims = cluster_labels.dims
+    labels = cluster_labels.fillna(0).astype("int64")
+    if labels.chunks is not None:
+        labels = labels.compute()
+    # compact labels (0 = masked), so that the reductions are sized by the
+    # number of clusters and not by the largest label (e.g., pixel indices)
+    labels_np = labels.values
+    uniques, labels_np = np.unique(
+        np.where(labels_np > 0, labels_np, 0), return_inverse=True
+    )
+    if uniques[0] != 0:
+        uniques, labels_np = np.r_[0, uniques], labels_np + 1
+    labels_np = labels_np.reshape(labels.shape)
+    labels = labels.copy(data=labels_np)
+    n_clusters = uniques.size
+
+    tasks = {}
+    for key in data.data_vars:
+        da = data[key].transpose(..., *spatial_dims)
+        lead_dims = da.dims[: -len(spatial_dims)]
+        if key in categorical:
+            classes = np.unique(da.data)
+            classes = np.asarray(classes.compute() if da.chunks else classes)
+            classes = classes[~np.isnan(classes)].astype("int64")
+            func, props = _bincount_class_counts, dict(classes=classes)
+        else:
+            classes = None
+            func, props = _bincount_partial_stats, {}
+
+        if da.chunks is None:
+            partials = [[dask.delayed(func)(labels_np, da.values, n_clusters, **props)]]
+        else:
+            # one partial reduction per leading chunk and spatial block
+            spatial_chunks = da.chunks[-len(spatial_dims) :]
+            labels_chunked = labels.chunk(dict(zip(spatial_dims, spatial_chunks)))
+            label_blocks = labels_chunked.data.to_delayed().reshape(-1)
+            value_blocks = da.data.to_delayed().reshape(-1, label_blocks.size)
+            partials = [
+                [
+                    dask.delayed(func)(lab, val, n_clusters, **props)
+                    for val in value_blocks[:, i]
+                ]
+                for i, lab in enumerate(label_blocks)
+            ]
+        tasks[key] = (dask.delayed(_combine_partials)(partials), lead_dims, classes)
+
+    results = dask.compute({k: v[0] for k, v in tasks.items()})[0]
+
+    present = np.bincount(labels_np.ravel(), minlength=n_clusters) > 0
+    present[0] = False
+    cluster = uniques[present]
+
+    ds = xr.Dataset(coords=dict(cluster=cluster))
+    for key, (_, lead_dims, classes) in tasks.items():
+        lead_shape = tuple(data[key].sizes[d] for d in lead_dims)
+        lead_coords = {d: data[key][d].values for d in lead_dims if d in data.coords}
+        partial = results[key]
+        if classes is not None:
+            counts = partial["counts"][:, present, :]
+            total = counts.sum(axis=-1, keepdims=True)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                fraction = counts / total
+            ds[f"{key}_fraction"] = xr.DataArray(
+                fraction.reshape(lead_shape + fraction.shape[1:]),
+                dims=lead_dims + ("cluster", "class"),
+                coords={"class": classes, **lead_coords},
+            )
+        else:
+            arr = _finalize_partial_stats(partial, stats)[:, present, :]
+            arr = arr.reshape(lead_shape + arr.shape[1:])
+            ds[key] = xr.DataArray(
+                arr,
+                dims=lead_dims + ("cluster", "stat"),
+                coords=dict(stat=list(stats), **lead_coords),
+                attrs=data[key].attrs,
+            )
+
+    ds.attrs["description"] = (
+        f"Pixels aggregated to clusters using {cluster_labels.name}"
+    )
+
+    return ds
+
+
+def _bincount_partial_stats(labels, values, n_clusters):
+    """
+    Returns count, sum, squared deviations from the mean (m2), min and max per
+    label and leading row.
+
+    m2 is accumulated about the mean of each label (a second pass over the
+    values), so that the variance does not cancel for values with a large
+    offset (e.g., elevation in m or temperature in K).
+    """
+    labels = np.asarray(labels).ravel()
+    n_pix = labels.size
+    values = np.asarray(values, dtype="float64").reshape(-1, n_pix)
+    n_rows = values.shape[0]
+
+    valid = ~np.isnan(values) & (labels > 0)
+    # combined index so that all leading rows are reduced in one bincount
+    index = (np.arange(n_rows)[:, None] * n_clusters + labels[None])[valid]
+    x = values[valid]
+    size = n_rows * n_clusters
+
+    count = np.bincount(index, minlength=size)
+    total = np.bincount(index, weights=x, minlength=size)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = total / count
+
+    out = dict(
+        count=count,
+        sum=total,
+        m2=np.bincount(index, weights=(x - mean[index]) ** 2, minlength=size),
+        min=np.full(size, np.inf),
+        max=np.full(size, -np.inf),
+    )
+    np.minimum.at(out["min"], index, x)
+    np.maximum.at(out["max"], index, x)
+
+    return {k: v.reshape(n_rows, n_clusters) for k, v in out.items()}
+
+
+def _bincount_class_counts(labels, values, n_clusters, classes):
+    """Returns the count of each class per label and leading row."""
+    labels = np.asarray(labels).ravel()
+    n_pix = labels.size
+    values = np.asarray(values).reshape(-1, n_pix)
+    n_rows = values.shape[0]
+    n_classes = classes.size
+
+    valid = ~np.isnan(values) & (labels > 0)
+    class_index = np.searchsorted(classes, np.nan_to_num(values).astype("int64"))
+    valid &= class_index < n_classes
+    valid[valid] &= classes[class_index[valid]] == values[valid]
+
+    rows = np.arange(n_rows)[:, None]
+    index = ((rows * n_clusters + labels[None]) * n_classes + class_index)[valid]
+    size = n_rows * n_clusters * n_classes
+    counts = np.bincount(index, minlength=size)
+
+    return dict(counts=counts.reshape(n_rows, n_clusters, n_classes))
+
+
+def _combine_partials(partials):
+    """
+    Combines the partial reductions of the blocks, where partials[i][j] is
+    the partial of spatial block i and leading chunk j. The leading chunks
+    are concatenated along the rows, the spatial blocks are merged.
+    """
+    partials = [
+        {k: np.concatenate([p[k] for p in rows]) for k in rows[0]} for rows in partials
+    ]
+    out = dict(partials[0])
+    for partial in partials[1:]:
+        # m2 is merged before count and sum are updated
+        if "m2" in partial:
+            out["m2"] = _merge_m2(out, partial)
+        for key, value in partial.items():
+            if key == "min":
+                out[key] = np.minimum(out[key], value)
+            elif key == "max":
+                out[key] = np.maximum(out[key], value)
+            elif key != "m2":
+                out[key] = out[key] + value
+    return out
+
+
+def _merge_m2(a, b):
+    """Pairwise (Chan et al.) merge of the squared deviations of two partials."""
+    na = a["count"].astype("float64")
+    nb = b["count"].astype("float64")
+    with np.errstate(invalid="ignore", divide="ignore"):
+        delta = b["sum"] / nb - a["sum"] / na
+        shift = np.where((na > 0) & (nb > 0), delta**2 * na * nb / (na + nb), 0)
+    return a["m2"] + b["m2"] + shift
+
+
+def _finalize_partial_stats(partial, stats):
+    count = partial["count"].astype("float64")
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = partial["sum"] / count
+        var = partial["m2"] / count
+    empty = count == 0
+
+    computed = dict(
+        mean=mean,
+        std=np.sqrt(var),
+        min=np.where(empty, np.nan, partial["min"]),
+        max=np.where(empty, np.nan, partial["max"]),
+        sum=partial["sum"],
+        count=count,
+    )
+    arr = np.stack([computed[s] for s in stats], axis=-1)
+
+    return arr
+
+
+def calc_cluster_representativeness(
+    ds_spatial: xr.Dataset, variables: Union[list, None] = None
+) -> xr.Dataset:
+    """
+    Reports how well the cluster centroids represent the members of each cluster
+
+    For each spatial variable, the within-cluster spread and the difference
+    between each member and its centroid are aggregated per cluster. The
+    differences are also standardised by the domain-wide standard deviation
+    of each variable and combined to a single (Euclidean) distance in feature
+    space. All statistics are computed in a single pass over the labels with
+    aggregate_pixels_to_clusters, so chunked (dask) inputs are supported.
+
+    Parameters
+    ----------
+    ds_spatial : xr.Dataset
+        Output from read_spatial_data.
+    variables : list, optional
+        The spatial variables to assess. If None [default], all variables
+        from run_info.SPATIAL.STATVAR are used, except for the coordinates,
+        mask and index variables.
+
+    Returns
+    -------
+    xr.Dataset
+        Tidy dataset with dims [cluster, variable] and the variables:
+        - n_pixels: number of pixels in each cluster
+        - centroid_value: value of the variable at the centroid
+        - member_mean / member_std: mean and std of the cluster members
+        - centroid_bias: member_mean - centroid_value
+        - centroid_mae / centroid_max_abs_diff: mean and max absolute
+          difference between members and the centroid
+        - distance_mean / distance_max: standardised distance between
+          members and the centroid (all variables)
+        - rank: 1 is the worst represented cluster (largest distance_mean).
+          Use `ds.sortby("rank")` to list the worst clusters first.
+    """
+    if variables is None:
+        variables = [
+            k
+            for k in ds_spatial.data_vars
+            if k not in _NON_FEATURE_VARIABLES and ds_spatial[k].dims == ("y", "x")
+        ]
+
+    labels = ds_spatial["cluster_number_mapped"].fillna(0).astype("int64").compute()
+    matlab_index = ds_spatial["matlab_index"].values.ravel()
+    centroid_index = ds_spatial["cluster_centroid_index"].values.astype("int64")
+
+    values = xr.concat(
+        [ds_spatial[k].astype("float64") for k in variables],
+        dim=xr.Variable("variable", variables),
+    )
+
+    # centroid value of each cluster: [variable, cluster_number]
+    is_centroid = np.isin(matlab_index, centroid_index[1:])
+    flat = values.data.reshape(len(variables), -1)
+    flat_centroids = flat[:, is_centroid]
+    if not isinstance(flat_centroids, np.ndarray):
+        flat_centroids = flat_centroids.compute()
+    # search the centroid pixels, so the table is sized by the clusters and
+    # not by the largest pixel index
+    centroid_pixels = matlab_index[is_centroid]
+    order = np.argsort(centroid_pixels)
+    centroid_table = np.full((len(variables), centroid_index.size), np.nan)
+    if centroid_pixels.size > 0:
+        pos = np.searchsorted(centroid_pixels[order], centroid_index)
+        pos = order[np.clip(pos, 0, centroid_pixels.size - 1)]
+        found = centroid_pixels[pos] == centroid_index
+        centroid_table[:, found] = flat_centroids[:, pos[found]]
+    centroid_table[:, 0] = np.nan  # masked pixels
+
+    # broadcast the centroid values to the members
+    centroid_mapped = xr.apply_ufunc(
+        lambda lab: centroid_table.T[lab],
+        labels,
+        output_core_dims=[["variable"]],
+        dask="parallelized",
+        output_dtypes=["float64"],
+        dask_gufunc_kwargs=dict(output_sizes=dict(variable=len(variables))),
+    ).transpose("variable", ...)
+
+    diff = values - centroid_mapped
+    scale = values.std(["y", "x"]).compute()
+    distance = np.sqrt(((diff / scale) ** 2).sum("variable", min_count=1))
+
+    ds_pixels = xr.Dataset(
+        dict(values=values, absdiff=abs(diff), distance=distance)
+    ).drop_vars(["latitude", "longitude", "spatial_ref"], errors="ignore")
+    agg = aggregate_pixels_to_clusters(ds_pixels, labels)
+
+    cluster = agg["cluster"].values
+    centroid_value = xr.DataArray(
+        centroid_table[:, cluster],
+        dims=("variable", "cluster"),
+        coords=dict(variable=variables, cluster=cluster),
+    )
+
+    ds = xr.Dataset(coords=dict(cluster=cluster, variable=variables))
+    ds["n_pixels"] = agg["distance"].sel(stat="count", drop=True).astype("int64")
+    ds["centroid_value"] = centroid_value
+    ds["member_mean"] = agg["values"].sel(stat="mean", drop=True)
+    ds["member_std"] = agg["values"].sel(stat="std", drop=True)
+    ds["centroid_bias"] = ds["member_mean"] - ds["centroid_value"]
+    ds["centroid_mae"] = agg["absdiff"].sel(stat="mean", drop=True)
+    ds["centroid_max_abs_diff"] = agg["absdiff"].sel(stat="max", drop=True)
+    ds["distance_mean"] = agg["distance"].sel(stat="mean", drop=True)
+    ds["distance_max"] = agg["distance"].sel(stat="max", drop=True)
+
+    order = np.argsort(-ds["distance_mean"].fillna(-np.inf).values, kind="stable")
+    rank = np.empty_like(order)
+    rank[order] = np.arange(1, order.size + 1)
+    ds["rank"] = ("cluster", rank)
+
+    ds = ds.transpose("cluster", "variable")
+    ds["distance_mean"].attrs = dict(
+        description="Mean standardised distance between the members and the centroid"
+    )
+    ds["rank"].attrs = dict(description="1 is the worst represented cluster")
+    ds.attrs["description"] = "Representativeness of the cluster centroids"
+
+    return ds
+
+
+def recluster_spatial_data(
+    ds_spatial: xr.Dataset,
+    n_clusters: int,
+    variables: Union[list, None] = None,
+    batch_size: int = 10_000,
+    max_iter: int = 300,
+    tol: float = 1e-4,
+    chunk_bytes: int = 256 * 2**20,
+    random_state: int = 0,
+) -> xr.Dataset:
+    """
+    Recomputes the clusters and centroids of the spatial data with mini-batch k-means
+
+    Allows testing other cluster counts without rerunning the MATLAB
+    clustering. The features are standardised (zero mean, unit std) and the
+    cluster centres are fit on random mini-batches of pixels. All pixels are
+    then assigned to the nearest centre in chunks of pixels, so that the
+    [pixels, n_clusters] distance matrix stays within `chunk_bytes`. As in
+    CryoGrid, the sample centroid of each cluster is the pixel closest to the
+    cluster centre.
+
+    Parameters
+    ----------
+    ds_spatial : xr.Dataset
+        Output from read_spatial_data.
+    n_clusters : int
+        The number of clusters.
+    variables : list, optional
+        The variables used as features. If None [default], the same variables
+        as in calc_cluster_representativeness are used.
+    batch_size : int, optional
+        Number of pixels in each mini-batch, by default 10 000.
+    max_iter : int, optional
+        Maximum number of mini-batch iterations, by default 300.
+    tol : float, optional
+        Stop when the largest shift of the centres (in standardised units)
+        is smaller than tol, by default 1e-4.
+    chunk_bytes : int, optional
+        Memory budget of the distance matrix in bytes, by default 256 MiB.
+        The number of pixels per chunk is chunk_bytes / n_clusters / 4, so
+        larger budgets mean fewer chunks when there are many clusters.
+    random_state : int, optional
+        Seed of the random number generator, by default 0.
+
+    Returns
+    -------
+    xr.Dataset
+        A copy of ds_spatial where `cluster_number_mapped`,
+        `cluster_centroid_index` and `cluster_centroid_index_mapped` are
+        replaced, so it can be passed to map_gridcells_to_clusters.
+    """
+    from loguru import logger
+
+    rng = np.random.default_rng(random_state)
+
+    if variables is None:
+        variables = [
+            k
+            for k in ds_spatial.data_vars
+            if k not in _NON_FEATURE_VARIABLES and ds_spatial[k].dims == ("y", "x")
+        ]
+
+    features = np.stack(
+        [ds_spatial[k].values.ravel().astype("float32") for k in variables], axis=1
+    )
+    valid = np.isfinite(features).all(axis=1)
+    if "mask" in ds_spatial:
+        valid &= ds_spatial["mask"].values.ravel() > 0
+    features = features[valid]
+
+    n_samples = features.shape[0]
+    if n_samples < n_clusters:
+        raise ValueError(
+            f"Fewer valid pixels ({n_samples}) than clusters ({n_clusters})"
+        )
+
+    # standardise the features
+    mean = features.mean(axis=0)
+    std = features.std(axis=0)
+    std[std == 0] = 1
+    features = (features - mean) / std
+
+    # pixels per chunk of the [pixels, n_clusters] distance matrix
+    chunk_size = max(1, chunk_bytes // (n_clusters * features.itemsize))
+
+    centres = _kmeans_plusplus(features, n_clusters, rng)
+    counts = np.zeros(n_clusters)
+    for i in range(max_iter):
+        batch = features[rng.integers(0, n_samples, size=min(batch_size, n_samples))]
+        labels, _ = _assign_nearest(batch, centres, chunk_size)
+
+        previous = centres.copy()
+        batch_counts = np.bincount(labels, minlength=n_clusters)
+        counts += batch_counts
+        for j in range(features.shape[1]):
+            batch_sum = np.bincount(labels, weights=batch[:, j], minlength=n_clusters)
+            # per-centre learning rate of 1 / count (Sculley, 2010)
+            updated = batch_counts > 0
+            centres[updated, j] += (
+                batch_sum[updated] - batch_counts[updated] * centres[updated, j]
+            ) / counts[updated]
+
+        shift = np.abs(centres - previous).max()
+        if shift < tol:
+            logger.debug(f"Mini-batch k-means converged after {i + 1} iterations")
+            break
+
+    # assign all pixels in chunks and find the pixel closest to each centre
+    labels = np.empty(n_samples, dtype="int64")
+    best_distance = np.full(n_clusters, np.inf)
+    best_index = np.full(n_clusters, -1)
+    for i0 in range(0, n_samples, chunk_size):
+        chunk_labels, chunk_distance = _assign_nearest(
+            features[i0 : i0 + chunk_size], centres, chunk_size
+        )
+        labels[i0 : i0 + chunk_size] = chunk_labels
+
+        order = np.lexsort((chunk_distance, chunk_labels))
+        present, first = np.unique(chunk_labels[order], return_index=True)
+        closest = order[first]
+        better = chunk_distance[closest] < best_distance[present]
+        best_distance[present[better]] = chunk_distance[closest[better]]
+        best_index[present[better]] = closest[better] + i0
+
+    # drop empty clusters and number from 1 to k
+    present = best_index >= 0
+    renumber = np.zeros(n_clusters, dtype="int64")
+    renumber[present] = np.arange(1, present.sum() + 1)
+    labels = renumber[labels]
+
+    matlab_index = ds_spatial["matlab_index"].values.ravel()[valid]
+    centroid_index = matlab_index[best_index[present]]
+
+    cluster_number = np.full(valid.size, np.nan)
+    cluster_number[valid] = labels
+    shape = ds_spatial["matlab_index"].shape
+
+    ds = ds_spatial.drop_vars(
+        [
+            "cluster_number_mapped",
+            "cluster_centroid_index",
+            "cluster_centroid_index_mapped",
+        ]
+    ).drop_dims("cluster_number", errors="ignore")
+    centroid_index = np.r_[0, centroid_index].astype("uint32")
+    cluster_number = cluster_number.reshape(shape)
+    ds["cluster_number_mapped"] = ds_spatial["matlab_index"].copy(data=cluster_number)
+    ds["cluster_centroid_index"] = xr.DataArray(
+        data=centroid_index,
+        coords={"cluster_number": np.arange(centroid_index.size)},
+        dims=("cluster_number",),
+        attrs=ds_spatial["cluster_centroid_index"].attrs,
+    )
+    ds["cluster_centroid_index_mapped"] = (
+        ds_spatial["matlab_index"]
+        .copy(data=centroid_index[np.nan_to_num(cluster_number).astype(int)])
+        .assign_attrs(ds_spatial["cluster_centroid_index_mapped"].attrs)
+    )
+    ds.attrs["clustering"] = (
+        f"Mini-batch k-means with k={n_clusters} on standardised {variables}"
+    )
+
+    return ds
+
+
+def _kmeans_plusplus(features, n_clusters, rng, n_candidates=100_000):
+    """k-means++ initialisation on a random subset of the features."""
+    n = features.shape[0]
+    sample = features[rng.choice(n, size=min(n, n_candidates), replace=False)]
+
+    centres = np.empty((n_clusters, features.shape[1]), dtype="float64")
+    centres[0] = sample[rng.integers(sample.shape[0])]
+    distance = ((sample - centres[0]) ** 2).sum(axis=1)
+    for k in range(1, n_clusters):
+        total = distance.sum()
+        if total > 0:
+            i = rng.choice(sample.shape[0], p=distance / total)
+        else:
+            i = rng.integers(sample.shape[0])
+        centres[k] = sample[i]
+        distance = np.minimum(distance, ((sample - centres[k]) ** 2).sum(axis=1))
+
+    return centres
+
+
+def _assign_nearest(features, centres, chunk_size):
+    """
+    Returns the nearest centre and the squared distance to it for each row.
+
+    The distances are computed in the dtype of the features for chunks of
+    chunk_size rows, so only one [chunk_size, n_centres] matrix is held.
+    """
+    centres = centres.astype(features.dtype, copy=False)
+    centres_sq = (centres**2).sum(axis=1)
+
+    labels = np.empty(features.shape[0], dtype="int64")
+    nearest = np.empty(features.shape[0], dtype=features.dtype)
+    for i0 in range(0, features.shape[0], chunk_size):
+        chunk = features[i0 : i0 + chunk_size]
+        # |f|^2 - 2 f.c + |c|^2, built in place
+        distance = chunk @ centres.T
+        distance *= -2
+        distance += centres_sq[None]
+        distance += (chunk**2).sum(axis=1)[:, None]
+
+        chunk_labels = distance.argmin(axis=1)
+        labels[i0 : i0 + chunk_size] = chunk_labels
+        nearest[i0 : i0 + chunk_size] = np.maximum(
+            distance[np.arange(chunk_labels.size), chunk_labels], 0
+        )
+
+    return labels, nearest
@@ -0,0 +1,244 @@
+import warnings
+
+import numpy as np
+import xarray as xr
+
+
+def calc_trends(da: xr.DataArray, dim: str = "year") -> xr.Dataset:
+    """
+    Compute long-term trend and change-point statistics along a dimension
+
+    All statistics are computed with vectorised numpy kernels over every
+    series in the array at once (e.g., all pixels and depths). If `da` is a
+    dask array, the statistics are computed lazily chunk by chunk, which is
+    the path to use for pixel-level rasters whose values are not constant
+    within a cluster.
+
+    Parameters
+    ----------
+    da : xr.DataArray
+        Data with `dim` as a dimension (e.g., active layer depth with
+        dims [year, y, x] or ground temperature with [profile, depth, year]).
+    dim : str, optional
+        The dimension along which trends are computed, by default "year".
+        The coordinate must be numeric or datetime.
+
+    Returns
+    -------
+    xr.Dataset
+        Dataset with the following variables:
+        - slope: Theil-Sen slope (units of da per unit of dim, per year for
+          datetime coordinates)
+        - intercept: Theil-Sen intercept, i.e., the value of the trend line
+          at the first coordinate of `dim`
+        - mk_s: Mann-Kendall S statistic
+        - mk_z: Mann-Kendall Z score
+        - mk_pvalue: two-sided Mann-Kendall p-value
+        - changepoint: coordinate value of `dim` of the Pettitt change-point
+        - changepoint_pvalue: approximate Pettitt p-value
+    """
+    assert dim in da.dims, f"{dim} dimension is required"
+
+    # t is relative to the first coordinate so that the intercept is the
+    # value of the trend line at the start of the series
+    coord = da[dim]
+    if np.issubdtype(coord.dtype, np.datetime64):
+        # express datetime slopes per year
+        t = (coord - coord[0]).values / np.timedelta64(1, "D") / 365.25
+    else:
+        t = coord.values.astype("float64") - float(coord[0])
+
+    if da.chunks is not None:
+        da = da.chunk({dim: -1})
+
+    names = [
+        "slope",
+        "intercept",
+        "mk_s",
+        "mk_z",
+        "mk_pvalue",
+        "changepoint_index",
+        "changepoint_pvalue",
+    ]
+
+    outputs = xr.apply_ufunc(
+        _trend_kernel,
+        da,
+        input_core_dims=[[dim]],
+        output_core_dims=[[] for _ in names],
+        kwargs=dict(t=t),
+        dask="parallelized",
+        output_dtypes=["float64"] * len(names),
+    )
+
+    ds = xr.Dataset(dict(zip(names, outputs)))
+
+    # convert the change-point index to the coordinate of dim
+    values = coord.values
+    missing = np.datetime64("NaT") if values.dtype.kind == "M" else np.nan
+    index = ds["changepoint_index"]
+    ds["changepoint"] = xr.apply_ufunc(
+        lambda i: np.where(np.isnan(i), missing, values[np.nan_to_num(i).astype(int)]),
+        index,
+        dask="parallelized",
+        output_dtypes=[np.result_type(values.dtype, type(missing))],
+    )
+    ds = ds.drop_vars("changepoint_index")
+
+    units = da.attrs.get("units", "")
+    t_units = "year" if coord.dtype.kind == "M" else dim
+    ds["slope"].attrs = dict(long_name="Theil-Sen slope", units=f"{units} / {t_units}")
+    ds["intercept"].attrs = dict(
+        long_name=f"Theil-Sen intercept at the first {dim}", units=units
+    )
+    ds["mk_s"].attrs = dict(long_name="Mann-Kendall S statistic")
+    ds["mk_z"].attrs = dict(long_name="Mann-Kendall Z score")
+    ds["mk_pvalue"].attrs = dict(long_name="Mann-Kendall two-sided p-value")
+    ds["changepoint"].attrs = dict(long_name=f"Pettitt change-point ({dim})")
+    ds["changepoint_pvalue"].attrs = dict(long_name="Pettitt p-value (approx.)")
+    ds.attrs["description"] = f"Trend statistics of {da.name} along {dim}"
+
+    return ds
+
+
+def calc_cluster_trends(
+    da: xr.DataArray, cluster_labels: xr.DataArray, dim: str = "year"
+) -> xr.Dataset:
+    """
+    Compute trend statistics once per cluster and map them to 2D
+
+    Since all pixels in a cluster share the same centroid profile, the
+    statistics only have to be computed for each profile and can then be
+    broadcast to the pixels with map_gridcells_to_clusters.
+
+    Parameters
+    ----------
+    da : xr.DataArray
+        Profile data (e.g., from read_OUT_regridded_files or analyze) with a
+        `profile` dimension, `dim` and any number of other dimensions (e.g.
+        depth).
+    cluster_labels : xr.DataArray
+        2D array with the index of the cluster centroid of each pixel, e.g.,
+        `cluster_centroid_index_mapped` from spatial_clusters.read_spatial_data.
+    dim : str, optional
+        The dimension along which trends are computed, by default "year".
+
+    Returns
+    -------
+    xr.Dataset
+        Trend statistics (see calc_trends) mapped to the [y, x] grid of
+        cluster_labels.
+    """
+    from .spatial_clusters import map_gridcells_to_clusters
+
+    assert "profile" in da.dims, "da must have a `profile` dimension"
+
+    trends = calc_trends(da, dim=dim).compute()
+
+    ds = xr.Dataset(attrs=trends.attrs)
+    epoch = np.datetime64(0, "ns")
+    for key in trends.data_vars:
+        da_key = trends[key]
+        if da_key.dtype.kind == "M":
+            # datetime change-points are mapped as seconds since the epoch
+            seconds = (da_key - epoch) / np.timedelta64(1, "s")
+            seconds = map_gridcells_to_clusters(seconds, cluster_labels, dim="profile")
+            mapped = epoch + (seconds * 1e9).astype("timedelta64[ns]")
+            ds[key] = mapped.assign_attrs(da_key.attrs)
+        else:
+            ds[key] = map_gridcells_to_clusters(da_key, cluster_labels, dim="profile")
+
+    return ds
+
+
+def _trend_kernel(arr: np.ndarray, t: np.ndarray) -> tuple:
+    """
+    Vectorised Theil-Sen, Mann-Kendall and Pettitt statistics along the last axis.
+    """
+    from scipy.stats import norm, rankdata
+
+    n = arr.shape[-1]
+    n_valid = np.sum(~np.isnan(arr), axis=-1)
+    if n < 3:
+        return tuple(np.full(arr.shape[:-1], np.nan) for _ in range(7))
+
+    slope = _theil_sen_slope(arr, t)
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", "All-NaN slice", RuntimeWarning)
+        intercept = np.nanmedian(arr - slope[..., None] * t, axis=-1)
+
+    # Mann-Kendall S, summed lag by lag to avoid an [..., n x n] temporary
+    s = np.zeros(arr.shape[:-1])
+    for lag in range(1, n):
+        s += np.nansum(np.sign(arr[..., lag:] - arr[..., :-lag]), axis=-1)
+
+    # variance with the correction for tied values (e.g., snapped depths)
+    var_s = (n_valid * (n_valid - 1) * (2 * n_valid + 5) - _tie_sums(arr)) / 18
+    with np.errstate(invalid="ignore", divide="ignore"):
+        z = np.where(s > 0, s - 1, np.where(s < 0, s + 1, 0)) / np.sqrt(var_s)
+    pvalue = 2 * norm.sf(np.abs(z))
+
+    # Pettitt change-point: U_t = cumsum(2 * rank - n - 1) (ranks with ties averaged)
+    ranks = rankdata(arr, axis=-1, nan_policy="omit")
+    u = np.abs(np.nancumsum(2 * ranks - n_valid[..., None] - 1, axis=-1))
+    k = u.max(axis=-1)
+    changepoint = u.argmax(axis=-1).astype("float64")
+    with np.errstate(invalid="ignore", divide="ignore", over="ignore"):
+        cp_pvalue = np.clip(2 * np.exp(-6 * k**2 / (n_valid**3 + n_valid**2)), 0, 1)
+
+    # series that are all NaN or too short are undefined
+    invalid = n_valid < 3
+    outputs = (slope, intercept, s, z, pvalue, changepoint, cp_pvalue)
+    outputs = tuple(np.where(invalid, np.nan, o) for o in outputs)
+
+    return outputs
+
+
+def _tie_sums(arr: np.ndarray) -> np.ndarray:
+    """
+    Sum of t (t - 1) (2 t + 5) over the groups of t tied values along the
+    last axis of arr (NaNs are ignored).
+    """
+    n = arr.shape[-1]
+    flat = np.sort(arr.reshape(-1, n), axis=-1)
+    n_rows = flat.shape[0]
+    if flat.size == 0:
+        return np.zeros(arr.shape[:-1])
+
+    # each run of equal values is a group, numbered over all rows
+    new_group = np.ones(flat.shape, dtype=bool)
+    new_group[:, 1:] = flat[:, 1:] != flat[:, :-1]
+    group = np.cumsum(new_group.ravel()) - 1
+    valid = ~np.isnan(flat.ravel())
+    t = np.bincount(group[valid], minlength=group[-1] + 1).astype("float64")
+
+    row = np.repeat(np.arange(n_rows), n)[new_group.ravel()]
+    sums = np.bincount(row, weights=t * (t - 1) * (2 * t + 5), minlength=n_rows)
+
+    return sums.reshape(arr.shape[:-1])
+
+
+def _theil_sen_slope(
+    arr: np.ndarray, t: np.ndarray, max_elements: int = 2**22
+) -> np.ndarray:
+    """
+    Median of the pairwise slopes (i < j) along the last axis of arr.
+
+    The [cells, n (n - 1) / 2] pairwise slopes are computed for blocks of
+    cells so that a temporary holds at most max_elements values.
+    """
+    n = arr.shape[-1]
+    i, j = np.triu_indices(n, k=1)
+    dt = t[j] - t[i]
+
+    flat = arr.reshape(-1, n)
+    slope = np.full(flat.shape[0], np.nan)
+    block = max(1, max_elements // i.size)
+    for c0 in range(0, flat.shape[0], block):
+        cells = flat[c0 : c0 + block]
+        with np.errstate(invalid="ignore", divide="ignore"), warnings.catch_warnings():
+            warnings.filterwarnings("ignore", "All-NaN slice", RuntimeWarning)
+            slopes = (cells[:, j] - cells[:, i]) / dt
+            slope[c0 : c0 + block] = np.nanmedian(slopes, axis=-1)
+
+    return slope.reshape(arr.shape[:-1])
@@ -11,6 +11,7 @@ from .conversion import (
 from . import vector
 from . import raster
 from . import utils
+from . import tiling
 from . import accessors
 
 
@@ -39,6 +40,7 @@ __all__ = [
     "vector",
     "raster",
     "utils",
+    "tiling",
     "accessors",
     "info",
 ]
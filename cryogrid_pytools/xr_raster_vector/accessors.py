@@ -1,3 +1,4 @@
+import xarray as xr
 from xarray import register_dataarray_accessor, apply_ufunc
 
 # import pandas equivalent to register accessor for pandas
@@ -7,7 +8,7 @@ from loguru import logger
 from functools import wraps
 from skimage import morphology, measure
 
-from .utils import enable_xarray_wrapper
+from .tiling import get_footprint_depth, map_tiles
 from .conversion import (
     raster_int_to_vector,
     raster_bool_to_vector,
@@ -23,7 +24,7 @@ class VectorRaster:
 
     def __repr__(self):
         out = "<df.rv accessor>\n"
-        out += "    df.rv.to_raster ( da_target, by_column=None, **joblib_kwargs )\n"
+        out += "    df.rv.to_raster ( da_target, by_column=None, tile_size=8192, **joblib_kwargs )\n"
         out += "    df.rv.crop_to_da ( da )\n"
         out += "    df.rv.get_bbox_latlon ( as_geopandas=False )\n"
 
@@ -50,6 +51,9 @@ class VectorRaster:
         by_column : str, optional
             The column in the GeoDataFrame to group the polygons by. If None, then each
             row is converted to a separate integer value. The default is None.
+        tile_size : int, optional
+            Grids larger than this along x or y are rasterized in tiles.
+            The default is 8192.
         kwargs : dict, optional
             Additional keyword arguments to pass to joblib.Parallel. The default is {}.
 
@@ -69,14 +73,12 @@ class VectorRaster:
         geom = df.geometry
         da = prep_raster(da_target)
 
-        if len(geom) == 1:
+        if len(geom) == 0:
+            raise ValueError("No polygons to convert to raster.")
+        elif len(geom) == 1:
             mask = polygon_to_raster_bool(geom.iloc[0], da)
-        elif len(geom) < 20:
+        else:
             mask = polygons_to_raster_int(df, da, **kwargs)
-        elif len(geom) >= 20:
-            raise ValueError("Too many polygons to convert to raster.")
-        elif len(geom) == 0:
-            raise ValueError("No polygons to convert to raster.")
 
         return mask
 
@@ -137,7 +139,11 @@ class RasterVector:
         names : list, optional [None]
             If the mask is integer type, then a list of names for each class
             can be provided. The default is None, in which case the classes
-            are numbered according to their integer value.
+            are numbered according to their integer value. There is no
+            limit on the number of classes.
+        n_jobs : int, optional [-1]
+            For integer masks, the polygons of the classes are combined in
+            parallel (passed to joblib.Parallel with other joblib arguments).
 
         Returns
         -------
@@ -148,7 +154,7 @@ class RasterVector:
 
         if da.dtype == bool:
             df = raster_bool_to_vector(da, **kwargs)
-        elif da.dtype == int:
+        elif da.dtype.kind in "iu":
             df = raster_int_to_vector(da, **kwargs)
         else:
             raise TypeError("DataArray must be type [int|bool]")
@@ -259,28 +265,35 @@ class ScikitImage:
             func = getattr(morphology, name)
             setattr(self, name, wraps(func)(partial(self._caller, name)))
 
-    def _caller(self, func_name, **kwargs):
-        from xarray import concat
+    def _caller(self, func_name, dim=None, n_jobs=-1, tile_size=None, **kwargs):
+        from functools import partial
 
         da = self._da
         func = getattr(morphology, func_name)
 
         assert da.dtype == bool, "DataArray must be boolean type."
 
-        if "dim" not in kwargs:
-            result = apply_ufunc(func, da, kwargs=kwargs)
+        # only the binary operations are local, so can run on overlapping tiles
+        if func_name.startswith("binary_"):
+            n_passes = 2 if func_name in ["binary_opening", "binary_closing"] else 1
+            depth = get_footprint_depth(kwargs.get("footprint"), n_passes)
         else:
-            dim = kwargs.pop("dim")
-            assert dim in da.dims, f"Dimension {dim} not found in DataArray."
-
-            result = concat(
-                [
-                    apply_ufunc(func, da.isel(**{dim: i}), kwargs=kwargs)
-                    for i in range(da[dim].size)
-                ],
-                dim=dim,
+            depth = None
+
+        if tile_size is not None and depth is None:
+            raise ValueError(
+                f"{func_name} is not a local operation and cannot be tiled"
             )
 
+        result = _apply_morph(
+            partial(func, **kwargs),
+            da,
+            dim=dim,
+            depth=depth,
+            n_jobs=n_jobs,
+            tile_size=tile_size,
+        )
+
         return result
 
     def __repr__(self):
@@ -297,6 +310,10 @@ class ScikitImage:
 
         sig = get_func_signature(self.clean, drop_first=False)
         out += (f"da.morph.clean{sig} ",)
+        out += (
+            "all functions take dim=None (slices along dim) and n_jobs=-1, "
+            "binary_* also tile_size=None (lazy tiles with halos)",
+        )
 
         text = "<xr.morph accessor>" + ("\n" + " " * 4).join(out)
         return text
@@ -308,10 +325,14 @@ class ScikitImage:
         opening_footprint=None,
         closing_footprint=None,
         dim=None,
+        n_jobs=-1,
     ):
         """
         Cleans the mask by removing small objects and holes.
 
+        The four steps (removing small objects and holes, opening and
+        closing) are run in a single pass over each slice.
+
         Parameters
         ----------
         min_hole_size : int, optional [64]
@@ -322,54 +343,169 @@ class ScikitImage:
             The footprint for the binary opening operation.
         closing_footprint : np.ndarray, optional [None]
             The footprint for the binary closing operation.
+        dim : str, optional [None]
+            If given, each slice along dim is cleaned separately (e.g., time).
+        n_jobs : int, optional [-1]
+            Number of threads used for the slices.
 
         Returns
         -------
         xr.DataArray
             A cleaned mask with small objects removed.
         """
+        from functools import partial
+
         da = self._da
 
         assert da.dtype == bool, "DataArray must be boolean type."
 
-        kwargs = dict(dim=dim) if dim is not None else {}
-        da = (
-            da.morph.remove_small_objects(min_size=min_object_size, **kwargs)
-            .morph.remove_small_holes(area_threshold=min_hole_size, **kwargs)
-            .morph.binary_opening(footprint=opening_footprint, **kwargs)
-            .morph.binary_closing(footprint=closing_footprint, **kwargs)
+        func = partial(
+            _clean_mask,
+            min_hole_size=min_hole_size,
+            min_object_size=min_object_size,
+            opening_footprint=opening_footprint,
+            closing_footprint=closing_footprint,
         )
+        da = _apply_morph(func, da, dim=dim, n_jobs=n_jobs)
+
         return da
 
     @wraps(measure.label)
-    def label(self, **kwargs):
-        from xarray import concat
+    def label(self, dim=None, n_jobs=-1, **kwargs):
+        from functools import partial
 
-        da = self._da
+        import numpy as np
 
-        if "dim" in kwargs:
-            dim = kwargs.pop("dim")
-            out = [
-                da.isel(**{dim: t}).morph.label(**kwargs) for t in range(da[dim].size)
-            ]
-            return concat(out, dim=dim)
+        da = self._da
 
         return_num = kwargs.pop("return_num", False)
 
-        func = enable_xarray_wrapper(measure.label)
-        out = func(da, **kwargs)
+        func = partial(measure.label, **kwargs)
+        out = _apply_morph(func, da, dim=dim, n_jobs=n_jobs, dtype=int)
 
-        ser = out.to_series()
-        counts = ser.value_counts()
-        out.attrs["n_labels"] = len(counts)
+        # the counts require the labels, so are not added to lazy (dask) output
+        if out.chunks is not None and not return_num:
+            return out
+
+        labels = out.values
+        if dim is None:
+            counts = np.bincount(labels.ravel())
+            out.attrs["n_labels"] = counts.size
+            counts = xr.DataArray(counts, dims="label")
+        else:
+            axis = out.get_axis_num(dim)
+            slices = np.moveaxis(labels, axis, 0).reshape(labels.shape[axis], -1)
+            counts = [np.bincount(s) for s in slices]
+            # padded with NaN for labels that are not in a slice
+            n_labels = max(c.size for c in counts)
+            padded = np.full((len(counts), n_labels), np.nan)
+            for i, c in enumerate(counts):
+                padded[i, : c.size] = c
+            out.attrs["n_labels"] = n_labels
+            counts = xr.DataArray(padded, dims=[dim, "label"])
 
         if return_num:
             out = out.to_dataset(name="labels")
-            out["counts"] = counts.to_xarray().rename({da.name: "label"})
+            out["counts"] = counts.assign_coords(label=np.arange(counts.sizes["label"]))
 
         return out
 
 
+def _clean_mask(
+    arr,
+    min_hole_size=64,
+    min_object_size=64,
+    opening_footprint=None,
+    closing_footprint=None,
+):
+    arr = morphology.remove_small_objects(arr, min_size=min_object_size)
+    arr = morphology.remove_small_holes(arr, area_threshold=min_hole_size)
+    arr = morphology.binary_opening(arr, footprint=opening_footprint)
+    arr = morphology.binary_closing(arr, footprint=closing_footprint)
+    return arr
+
+
+def _apply_morph(func, da, dim=None, depth=None, n_jobs=-1, tile_size=None, dtype=bool):
+    """
+    Apply func to the slices along dim (or to the full array if dim is None).
+
+    The slices are processed in a thread pool (scikit-image releases the GIL
+    for most operations). Dask arrays (or any array if tile_size is given)
+    are processed lazily: on overlapping tiles (see tiling.map_tiles) if the
+    operation is local (depth is the reach of the footprint per axis of the
+    slices), otherwise per block of slices with the slice dimensions in a
+    single chunk.
+    """
+    from functools import partial
+
+    if dim is None:
+        core_dims = list(da.dims)
+    else:
+        assert dim in da.dims, f"Dimension {dim} not found in DataArray."
+        core_dims = [d for d in da.dims if d != dim]
+
+    if depth is not None and (da.chunks is not None or tile_size is not None):
+        if isinstance(depth, int):
+            depth = (depth,) * len(core_dims)
+        # one thread per tile, the tiles run in parallel under dask
+        kernel = partial(
+            _apply_to_slices,
+            func=func,
+            n_core=len(core_dims),
+            n_jobs=1,
+            axis=_get_axis(da, dim),
+        )
+        depth = dict(zip(core_dims, depth))
+        return map_tiles(kernel, da, depth, tile_size=tile_size, dtype=dtype)
+
+    # nested threads are avoided within dask tasks
+    kwargs = dict(func=func, n_core=len(core_dims), n_jobs=n_jobs)
+    props = dict(input_core_dims=[core_dims], output_core_dims=[core_dims])
+    if da.chunks is not None:
+        da = da.chunk({d: -1 for d in core_dims})
+        kwargs["n_jobs"] = 1
+        props.update(dask="parallelized", output_dtypes=[dtype])
+
+    result = apply_ufunc(_apply_to_slices, da, kwargs=kwargs, **props)
+    result = result.transpose(*da.dims)
+
+    return result
+
+
+def _get_axis(da, dim):
+    return None if dim is None else da.get_axis_num(dim)
+
+
+def _apply_to_slices(arr, func=None, n_core=2, n_jobs=-1, axis=None):
+    """
+    Apply func to each slice of the last n_core axes of arr in a thread
+    pool. If axis is given, the slices are taken along this axis instead.
+    """
+    import joblib
+    import numpy as np
+
+    if axis is not None:
+        arr = np.moveaxis(arr, axis, 0)
+
+    shape = arr.shape
+    n_loop = arr.ndim - n_core
+    if n_loop == 0:
+        out = func(arr)
+    else:
+        slices = arr.reshape(-1, *shape[n_loop:])
+        props = dict(n_jobs=n_jobs, backend="threading")
+        if n_jobs == 1 or len(slices) == 1:
+            results = [func(s) for s in slices]
+        else:
+            results = joblib.Parallel(**props)(joblib.delayed(func)(s) for s in slices)
+        out = np.stack(results).reshape(shape)
+
+    if axis is not None:
+        out = np.moveaxis(out, 0, axis)
+
+    return out
+
+
 def get_func_signature(func, drop_first=True):
     from inspect import signature
 
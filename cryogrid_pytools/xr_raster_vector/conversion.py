@@ -65,32 +65,47 @@ def raster_bool_to_vector(
 
 
 def raster_int_to_vector(
-    da: xr.DataArray, names=None, buffer_dist=0, simplify_dist=0
+    da: xr.DataArray, names=None, buffer_dist=0, simplify_dist=0, **joblib_kwargs
 ) -> gpd.GeoDataFrame:
     """
     Converts a rasterized mask with several classes to a vectorized representation.
 
+    The raster is traced once for all classes and the polygons of each class
+    are then combined into a single (multi)polygon in parallel using joblib,
+    so that there is no limit on the number of classes.
+
     Parameters
     ----------
     da : xr.DataArray (int)
         The rasterized mask with several classes.
     names : list, optional
         The names of the classes. The default is None, in which case the classes are numbered.
+    buffer_dist : float, optional
+        Polygons are smoothed by expanding and then shrinking them by this
+        distance. The default is 0 (no smoothing).
+    simplify_dist : float, optional
+        Polygons are simplified with this tolerance. The default is 0.
+    joblib_kwargs : dict, optional
+        Additional keyword arguments to pass to joblib.Parallel for combining
+        the polygons of each class. The default is {}.
 
     Returns
     -------
     gpd.GeoDataFrame
         A GeoDataFrame with the vectorized representation of the mask.
     """
+    import joblib
+    import rasterio.features
+    import shapely
+    from shapely import geometry
 
-    assert da.dtype == int, "Input array must be integer"
+    assert da.dtype.kind in "iu", "Input array must be integer"
+    assert da.ndim == 2, "Input array must be 2D"
 
-    mask_values = np.sort(np.unique(da.values))
+    arr = da.values
+    mask_values = np.sort(np.unique(arr))
     n_classes = mask_values.size
 
-    if n_classes > 20:
-        raise ValueError("Too many classes to convert to vector")
-
     if names is None:
         names = [str(i) for i in mask_values]
     else:
@@ -98,20 +113,41 @@ def raster_int_to_vector(
             f"Number of names (n={len(names)}) must match number of classes (n={n_classes})"
         )
 
-    polygons = []
-    for m, name in zip(mask_values, names):
-        # logger.debug(f"Converting class {name} [{m}] to vector")
-        mask = da == m
-        polygons += (
-            raster_bool_to_vector(
-                da=mask,
-                combine_polygons=True,
-                simplify_dist=simplify_dist,
-                buffer_dist=buffer_dist,
-            ),
-        )
+    # rasterio.features.shapes does not support 64-bit integers
+    info = np.iinfo(np.int32)
+    if mask_values[0] < info.min or mask_values[-1] > info.max:
+        raise ValueError("Mask values must fit into int32 to convert to vector")
+
+    crs = da.rio.crs
+    if crs is None:
+        logger.warning("No CRS found in DataArray, assuming EPSG:4326 (lat/lon)")
+        crs = "EPSG:4326"
+
+    # a single pass over the raster for all classes
+    shapes = rasterio.features.shapes(
+        arr.astype(np.int32), transform=da.rio.transform()
+    )
+    shapes = pd.DataFrame(
+        [(geometry.shape(geom), int(value)) for geom, value in shapes],
+        columns=["geometry", "value"],
+    )
+    groups = shapes.groupby("value").geometry
+
+    def combine_polygons(polygons):
+        polygon = shapely.union_all(polygons.values)
+        if buffer_dist > 0:
+            polygon = polygon.buffer(buffer_dist).buffer(-buffer_dist)
+        if simplify_dist > 0:
+            polygon = polygon.simplify(simplify_dist)
+        return polygon
+
+    props = dict(n_jobs=-1, backend="threading")
+    props.update(joblib_kwargs)
+    polygons = joblib.Parallel(**props)(
+        joblib.delayed(combine_polygons)(groups.get_group(m)) for m in mask_values
+    )
 
-    polygons = pd.concat(polygons, ignore_index=True)
+    polygons = gpd.GeoDataFrame(geometry=polygons, crs=crs)
     polygons["class"] = names
 
     return polygons
@@ -133,31 +169,14 @@ def polygon_to_raster_bool(polygon, da_target):
     mask_da : xr.DataArray
         A boolean DataArray with the mask on the target grid.
     """
-    import rasterio
     from rasterio.features import rasterize
     from shapely.geometry import mapping
 
     if isinstance(polygon, (gpd.GeoSeries, gpd.GeoDataFrame)):
         polygon = polygon.unary_union
 
-    # Get the spatial dimensions of the data array
-    if "x" in da_target.dims and "y" in da_target.dims:
-        x, y = "x", "y"
-    else:
-        raise ValueError("Data array must have 'x' and 'y' dimensions")
-
-    # make sure lat is descending, otherwise upside down coords
-    da_target = da_target.sortby("y", ascending=False)
-
-    # Define the transformation from pixel coordinates to geographical coordinates
-    transform = rasterio.transform.from_bounds(
-        min(da_target[x].values),
-        min(da_target[y].values),
-        max(da_target[x].values),
-        max(da_target[y].values),
-        len(da_target[x]),
-        len(da_target[y]),
-    )
+    da_target, transform = _get_target_grid(da_target)
+    x, y = "x", "y"
 
     # Rasterize the polygon
     mask = rasterize(
@@ -179,14 +198,24 @@ def polygon_to_raster_bool(polygon, da_target):
 
 
 def polygons_to_raster_int(
-    df: gpd.GeoDataFrame, da_target: xr.DataArray, by_column=None, **joblib_kwargs
+    df: gpd.GeoDataFrame,
+    da_target: xr.DataArray,
+    by_column=None,
+    tile_size: int = 8192,
+    **joblib_kwargs,
 ) -> xr.DataArray:
     """
     Convert a GeoDataFrame with polygons to a raster mask with integer values.
 
     Each row of polygons in the GeoDataFrame is converted to a separate integer
     value in the raster mask. The integer values are assigned in the order of the
-    rows in the GeoDataFrame. The conversion is run in parallel using joblib.
+    rows in the GeoDataFrame (starting at 1, 0 is the background). Where polygons
+    overlap, the later row (i.e., higher value) is kept.
+
+    All polygons are burned into a single int32 grid in one pass, so memory does
+    not scale with the number of polygons. Grids larger than `tile_size` along
+    x or y are rasterized in tiles (in parallel using joblib), where each tile
+    only burns the polygons that intersect it.
 
     Parameters
     ----------
@@ -197,35 +226,130 @@ def polygons_to_raster_int(
     by_column : str, optional
         The column in the GeoDataFrame to group the polygons by. If None, then each
         row is converted to a separate integer value. The default is None.
+    tile_size : int, optional
+        The maximum size of the grid along x and y that is rasterized in one
+        pass. Larger grids are split into tiles of this size. The default is 8192.
     joblib_kwargs : dict, optional
-        Additional keyword arguments to pass to joblib.Parallel. The default is {}.
+        Additional keyword arguments to pass to joblib.Parallel for the tiles.
+        The default is {}.
 
     Returns
     -------
     xr.DataArray
         A DataArray with the raster mask with integer values.
     """
-    import joblib
-
     if by_column is not None:
         assert by_column in df.columns, f"Column {by_column} not found in DataFrame"
         df = df.dissolve(by=by_column).reset_index()
 
-    func = joblib.delayed(
-        lambda ser, i: polygon_to_raster_bool(ser, da_target) * (i + 1)
+    da_target, transform = _get_target_grid(da_target)
+    shape = (da_target["y"].size, da_target["x"].size)
+
+    geoms = df.geometry.values
+    values = np.arange(1, len(df) + 1, dtype=np.int32)
+    valid = ~(geoms.is_empty | geoms.isna())
+    geoms, values = geoms[valid], values[valid]
+
+    if max(shape) <= tile_size:
+        mask = _rasterize_int(geoms, values, shape, transform)
+    else:
+        mask = _rasterize_int_tiled(
+            geoms, values, shape, transform, tile_size, **joblib_kwargs
+        )
+
+    mask = xr.DataArray(
+        mask, dims=("y", "x"), coords={"y": da_target["y"], "x": da_target["x"]}
     )
-    tasks = [func(row.geometry, i) for i, row in df.iterrows()]
 
-    props = dict(n_jobs=-1, backend="threading")
-    props.update(joblib_kwargs)
+    return mask
+
+
+def _get_target_grid(da_target: xr.DataArray):
+    """
+    Returns the target grid with descending y and its affine transform
+    (as used for rasterizing polygons).
+    """
+    import rasterio
 
-    polygons = joblib.Parallel(**props)(tasks)
+    # Get the spatial dimensions of the data array
+    if "x" in da_target.dims and "y" in da_target.dims:
+        x, y = "x", "y"
+    else:
+        raise ValueError("Data array must have 'x' and 'y' dimensions")
 
-    polygons = (
-        xr.concat(polygons, dim="polygons")
-        .assign_coords(polygons=df.index)
-        .max(dim="polygons")
-        .astype(int)
+    # make sure lat is descending, otherwise upside down coords
+    da_target = da_target.sortby(y, ascending=False)
+
+    # Define the transformation from pixel coordinates to geographical coordinates
+    transform = rasterio.transform.from_bounds(
+        min(da_target[x].values),
+        min(da_target[y].values),
+        max(da_target[x].values),
+        max(da_target[y].values),
+        len(da_target[x]),
+        len(da_target[y]),
     )
 
-    return polygons
+    return da_target, transform
+
+
+def _rasterize_int(geoms, values, shape, transform) -> np.ndarray:
+    """
+    Burn all (geometry, value) pairs into a single int32 grid. Later
+    geometries overwrite earlier ones.
+    """
+    from rasterio.features import rasterize
+
+    if len(geoms) == 0:
+        return np.zeros(shape, dtype=np.int32)
+
+    return rasterize(
+        zip(geoms, values.tolist()),
+        out_shape=shape,
+        transform=transform,
+        fill=0,
+        all_touched=True,
+        dtype=np.int32,
+    )
+
+
+def _rasterize_int_tiled(
+    geoms, values, shape, transform, tile_size, **joblib_kwargs
+) -> np.ndarray:
+    """
+    Same as _rasterize_int, but in tiles of tile_size x tile_size, where each
+    tile only burns the geometries that intersect its bounds.
+    """
+    import joblib
+    import shapely
+    from rasterio import windows
+
+    tree = shapely.STRtree(geoms)
+    out = np.zeros(shape, dtype=np.int32)
+
+    def rasterize_tile(window):
+        bounds = windows.bounds(window, transform)
+        # sorted, so that later geometries still overwrite earlier ones
+        index = np.sort(tree.query(shapely.box(*bounds)))
+        tile = _rasterize_int(
+            geoms[index],
+            values[index],
+            (window.height, window.width),
+            windows.transform(window, transform),
+        )
+        out[window.toslices()] = tile
+
+    tiles = [
+        windows.Window(
+            col, row, min(tile_size, shape[1] - col), min(tile_size, shape[0] - row)
+        )
+        for row in range(0, shape[0], tile_size)
+        for col in range(0, shape[1], tile_size)
+    ]
+    logger.debug(f"Rasterizing {len(geoms)} polygons in {len(tiles)} tiles")
+
+    props = dict(n_jobs=-1, backend="threading")
+    props.update(joblib_kwargs)
+    joblib.Parallel(**props)(joblib.delayed(rasterize_tile)(w) for w in tiles)
+
+    return out
@@ -0,0 +1,109 @@
+import xarray as xr
+
+
+def map_tiles(
+    func, da: xr.DataArray, depth: dict, tile_size=None, dtype=None, **kwargs
+) -> xr.DataArray:
+    """
+    Apply a function lazily to overlapping tiles of a DataArray with dask.
+
+    Each tile is extended by a halo of `depth` pixels from its neighbours, so
+    that local operations (smoothing, morphological operations, etc.) give
+    the same result as on the full array. The outer edges of the array are
+    not padded, so the function sees the same edges as in memory. Memory
+    per worker is bounded by the size of the tiles plus their halos.
+
+    Parameters
+    ----------
+    func : callable
+        Function that takes a numpy array (with the dims of da) and returns
+        an array of the same shape, called as func(arr, **kwargs).
+    da : xr.DataArray
+        The input data. If already chunked with dask, the chunks are kept
+        unless tile_size is given.
+    depth : dict
+        The halo width {dim: n_pixels} of the dims that are tiled. Use
+        get_footprint_depth or get_smoothing_depth to derive it.
+    tile_size : int, optional
+        The tile size (in pixels) of the dims in depth. The default is None,
+        in which case the existing chunks are used (or 2048 if da is not
+        chunked).
+    dtype : np.dtype, optional
+        The dtype of the output. The default is None (same as da).
+    kwargs : dict
+        Additional keyword arguments passed to func.
+
+    Returns
+    -------
+    xr.DataArray
+        The lazy (dask) result with the same dims and coords as da.
+    """
+    missing = set(depth) - set(da.dims)
+    assert not missing, f"Dimensions {missing} not found in DataArray"
+
+    if tile_size is None and da.chunks is None:
+        tile_size = 2048
+    if tile_size is not None:
+        da = da.chunk({d: tile_size for d in depth})
+
+    axis_depth = {da.get_axis_num(d): int(n) for d, n in depth.items()}
+    data = da.data.map_overlap(
+        func,
+        depth=axis_depth,
+        boundary="none",
+        dtype=da.dtype if dtype is None else dtype,
+        **kwargs,
+    )
+
+    return da.copy(data=data)
+
+
+def get_footprint_depth(footprint, n_passes=1):
+    """
+    The halo width (per axis) needed for a binary morphological operation.
+
+    Parameters
+    ----------
+    footprint : np.ndarray or tuple
+        The footprint of the operation. The default footprint (None) is a
+        cross with a radius of 1 per axis. Footprint sequences
+        [(footprint, n), ...] add up.
+    n_passes : int, optional
+        The number of times the footprint is applied (e.g., 2 for opening
+        and closing). The default is 1.
+
+    Returns
+    -------
+    int | tuple
+        The halo width for all axes (int) or per axis (tuple).
+    """
+    import numpy as np
+
+    if footprint is None:
+        return n_passes
+
+    if isinstance(footprint, tuple) and isinstance(footprint[0], tuple):
+        radius = sum(n * (np.array(fp.shape) // 2) for fp, n in footprint)
+    else:
+        radius = np.array(np.shape(footprint)) // 2
+
+    return tuple(int(r) * n_passes for r in radius)
+
+
+def get_smoothing_depth(kernel_size: int, n_iters: int = 1) -> int:
+    """
+    The halo width needed for n_iters iterations of a box kernel.
+
+    Parameters
+    ----------
+    kernel_size : int
+        The size of the box kernel (pixels).
+    n_iters : int, optional
+        The number of times the kernel is applied. The default is 1.
+
+    Returns
+    -------
+    int
+        The halo width in pixels.
+    """
+    return (kernel_size // 2) * n_iters
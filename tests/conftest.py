@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def _class_rows(category, name, index, params):
+    rows = [[category, "index"], [name, str(index)]]
+    rows += params
+    rows.append(["CLASS_END"])
+    return rows
+
+
+def _strat_layers_rows(index, water_ice=(0.3, 0.3, 0.3)):
+    header = ["layers", "V_MATRIX", "depth", "mineral", "organic", "waterIce"]
+    header += ["field_capacity", "END"]
+    rows = [header]
+    for i, w in enumerate(water_ice):
+        rows.append([None, None, i * 1.0, 0.5, 0.05, w, 0.2])
+    rows.append([None, "END"])
+    return _class_rows("STRATIGRAPHY_CLASS", "STRAT_layers", index, rows)
+
+
+def _make_config(fname, strat_layers=((0.3, 0.3, 0.3),), years=(1990, 2000)):
+    """
+    Write a minimal CryoGrid Excel configuration with one STRAT_layers class
+    per item of strat_layers (the waterIce of each layer).
+    """
+    rows = [["> minimal CryoGrid configuration"], []]
+    rows += _class_rows(
+        "TIME",
+        "set_start_end_time",
+        1,
+        [
+            ["start_time", "H_LIST", years[0], 1, 1, "END"],
+            ["end_time", "H_LIST", years[1], 12, 31, "END"],
+        ],
+    )
+    rows += _class_rows(
+        "FORCING",
+        "read_mat_ERA",
+        1,
+        [["forcing_path", "forcing"], ["filename", f"ERA5_{years[0]}_{years[1]}.mat"]],
+    )
+    for i, water_ice in enumerate(strat_layers):
+        rows += _strat_layers_rows(i + 1, water_ice)
+
+    width = max(len(row) for row in rows)
+    df = pd.DataFrame([row + [None] * (width - len(row)) for row in rows])
+    df.to_excel(fname, header=False, index=False)
+
+    return fname
+
+
+@pytest.fixture
+def make_config():
+    """Factory that writes minimal CryoGrid Excel configurations."""
+    return _make_config
+
+
+@pytest.fixture
+def run_dir(tmp_path):
+    """A CryoGrid run directory (with run_cryogrid.m) for the configurations."""
+    (tmp_path / "run_cryogrid.m").touch()
+    (tmp_path / "config").mkdir()
+    return tmp_path
+
+
+def _write_spatial_mat(fname, ny=4, nx=5, n_clusters=3):
+    """
+    Write a run_spatial_info.mat file on a regular [ny, nx] grid where the
+    pixels are assigned to n_clusters clusters and the centroid of each cluster
+    is its first pixel (MATLAB order, starting at 1).
+    """
+    from scipy.io import savemat
+
+    y, x = np.meshgrid(100 + 10.0 * np.arange(ny), 10.0 * np.arange(nx), indexing="ij")
+    n = ny * nx
+    cluster_number = np.arange(n) % n_clusters + 1
+    data = dict(
+        X=x.ravel(order="F"),
+        Y=y.ravel(order="F"),
+        mask=np.ones(n),
+        cluster_number=cluster_number,
+        sample_centroid_index=np.arange(1, n_clusters + 1),
+        elevation=1000 + np.arange(n, dtype=float),
+        slope_angle=np.arange(n, dtype=float) % 7,
+    )
+    savemat(fname, dict(data={k: v[:, None] for k, v in data.items()}))
+
+    return fname
+
+
+@pytest.fixture
+def write_spatial_mat():
+    """Factory that writes small run_spatial_info.mat files."""
+    return _write_spatial_mat
+
+
+@pytest.fixture
+def spatial_mat(tmp_path):
+    """Path to a small run_spatial_info.mat on a regular 4 x 5 grid."""
+    return _write_spatial_mat(tmp_path / "run_spatial_info.mat")
@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from cryogrid_pytools import analyze
+
+
+def test_zero_isotherm_depth_is_interpolated():
+    depth = np.array([0.0, -1.0, -2.0, -3.0])
+    temperature = xr.DataArray(
+        [
+            [2.0, 1.0, -1.0, -2.0],  # crosses between -1 and -2 m
+            [-1.0, -2.0, -3.0, -4.0],  # frozen throughout
+            [4.0, 3.0, 2.0, 1.0],  # thawed throughout
+            [3.0, np.nan, -1.0, -2.0],  # gap next to the crossing
+        ],
+        dims=("profile", "depth"),
+        coords={"depth": depth},
+    )
+
+    from_surface = analyze.get_zero_isotherm_depth(temperature)
+    np.testing.assert_allclose(from_surface.values, [-1.5, np.nan, np.nan, np.nan])
+
+    ascending = temperature.sortby("depth")
+    from_bottom = analyze.get_zero_isotherm_depth(ascending, from_surface=False)
+    np.testing.assert_allclose(from_bottom.values, [-1.5, np.nan, np.nan, np.nan])
+
+    lazy = analyze.get_zero_isotherm_depth(temperature.chunk(profile=2))
+    np.testing.assert_allclose(lazy.compute().values, from_surface.values)
+
+
+def test_active_layer_depth_between_levels():
+    time = pd.date_range("2000-01-01", "2001-12-31", freq="MS")
+    depth = np.array([0.0, -0.5, -1.0, -1.5, -2.0])
+    season = np.sin(2 * np.pi * (time.month.values - 4) / 12)[:, None]
+    # the July maximum is 3 degC at the surface and crosses 0 degC at -0.75 m
+    temperature = xr.DataArray(
+        season * 3 + 4 * depth[None, :] - (1 - season) * 2,
+        dims=("time", "depth"),
+        coords={"time": time, "depth": depth},
+    )
+
+    active_layer = analyze.calc_active_layer_depth(temperature)
+
+    assert active_layer.dims == ("year",)
+    np.testing.assert_allclose(active_layer.values, [-0.75, -0.75])
+
+
+def test_trumpet_curves_match_groupby_reductions():
+    time = pd.date_range("2000-01-01", "2002-12-31", freq="D")
+    rng = np.random.default_rng(0)
+    temperature = xr.DataArray(
+        rng.normal(size=(2, time.size, 3)),
+        dims=("profile", "time", "level"),
+        coords={
+            "profile": [1, 2],
+            "time": time,
+            "depth": ("level", [0.0, -1.0, -2.0]),
+        },
+    )
+
+    ds = analyze.calc_trumpet_curves(temperature.chunk(time=200))
+
+    assert ds.envelope.dims == ("profile", "year", "depth", "stat")
+    assert ds.envelope.stat.values.tolist() == ["min", "mean", "max"]
+    annual = temperature.swap_dims(level="depth").groupby("time.year")
+    np.testing.assert_allclose(ds.envelope.sel(stat="min"), annual.min("time"))
+    np.testing.assert_allclose(ds.envelope.sel(stat="mean"), annual.mean("time"))
+    np.testing.assert_allclose(ds.amplitude, annual.max("time") - annual.min("time"))
+
+    labels = xr.DataArray(np.array([[1, 2], [2, 0]], dtype="uint32"), dims=("y", "x"))
+    mapped = analyze.calc_trumpet_curves(temperature, cluster_labels=labels)
+    assert mapped.amplitude.dims == ("year", "depth", "y", "x")
+    np.testing.assert_allclose(
+        mapped.amplitude.isel(y=1, x=0), ds.amplitude.sel(profile=2)
+    )
+    assert mapped.amplitude.isel(y=1, x=1).isnull().all()
+
+
+def test_profile_props_without_permafrost_match_for_both_depth_methods():
+    time = pd.date_range("2000-01-01", "2001-12-31", freq="D")
+    depth = np.array([1.0, 0.0, -5.0, -10.0, -15.0, -20.0])
+    season = np.sin(2 * np.pi * (time.dayofyear.values - 100) / 365)[:, None]
+    # permafrost below an active layer of -7.5 m (interpolated)
+    frozen = season * 2 + 0.4 * depth[None] + 1
+    temperature = xr.DataArray(
+        np.stack([frozen, frozen + 20]),
+        dims=("profile", "time", "depth"),
+        coords={"profile": ["permafrost", "warm"], "time": time, "depth": depth},
+        name="temperature",
+    )
+
+    for interpolate_depths in [False, True]:
+        props = [
+            analyze.calc_profile_props(profile, interpolate_depths=interpolate_depths)
+            for profile in temperature
+        ]
+        permafrost, warm = props
+
+        # thawed throughout: no active layer depth and no permafrost
+        assert warm.active_layer_depth.isnull().all()
+        np.testing.assert_array_equal(warm.permafrost_thickness, [0, 0])
+
+        ald = permafrost.active_layer_depth.values
+        expected = -7.5 if interpolate_depths else -5.0
+        np.testing.assert_allclose(ald, [expected, expected], atol=1e-3)
+        np.testing.assert_allclose(permafrost.permafrost_thickness, ald + 20)
@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from cryogrid_pytools import bias_correction
+
+
+def _daily_grid(seed=0):
+    """Two years of daily data on a 3 x 2 grid."""
+    rng = np.random.default_rng(seed)
+    time = pd.date_range("2000-01-01", "2001-12-31", freq="D")
+    return xr.DataArray(
+        rng.normal(size=(time.size, 3, 2)),
+        dims=("time", "lat", "lon"),
+        coords=dict(time=time, lat=[61.0, 60.5, 60.0], lon=[10.0, 10.5]),
+    )
+
+
+def test_quantile_mapping_matches_per_cell_interpolation():
+    model = _daily_grid(0)
+    # a different offset per gridcell and month, and a wider spread
+    offset = model.lat - model.lon + model.time.dt.month / 2
+    observed = 1.5 * _daily_grid(1) + offset
+
+    qmap = bias_correction.fit_quantile_mapping(model, observed, n_quantiles=21)
+    corrected = bias_correction.apply_quantile_mapping(model, qmap, time_chunk=100)
+
+    assert qmap.model_quantiles.dims == ("month", "quantile", "lat", "lon")
+    assert corrected.dims == model.dims
+    assert corrected.chunks[0][0] == 100
+
+    # reference: np.interp per gridcell and month
+    expected = xr.full_like(model, np.nan)
+    for month in range(1, 13):
+        index = model.time.dt.month == month
+        for i in range(3):
+            for j in range(2):
+                q = qmap.isel(lat=i, lon=j).sel(month=month)
+                expected[index, i, j] = np.interp(
+                    model[index, i, j], q.model_quantiles, q.observed_quantiles
+                )
+    np.testing.assert_allclose(corrected, expected, rtol=1e-10, atol=1e-10)
+    # the corrected data has (about) the observed distribution per gridcell
+    # and month
+    np.testing.assert_allclose(
+        corrected.groupby("time.month").quantile(0.5, dim="time"),
+        observed.groupby("time.month").quantile(0.5, dim="time"),
+        atol=0.1,
+    )
+
+
+def test_quantile_mapping_outside_fitted_range():
+    model = _daily_grid(0)
+    station = observed = (model * 2).isel(lat=0, lon=0, drop=True)
+
+    qmap = bias_correction.fit_quantile_mapping(model, station, by_month=False)
+    assert qmap.model_quantiles.dims == ("quantile", "lat", "lon")
+
+    # additive: the correction of the outermost quantile is kept
+    shifted = model + 100
+    corrected = bias_correction.apply_quantile_mapping(shifted, qmap).compute()
+    top = qmap.observed_quantiles[-1] - qmap.model_quantiles[-1]
+    np.testing.assert_allclose(corrected, shifted + top)
+
+    # multiplicative: zeros stay zero and the output is not negative
+    precip = np.maximum(model, 0)
+    qmap = bias_correction.fit_quantile_mapping(
+        precip, np.maximum(observed, 0), by_month=False
+    )
+    precip = precip.where(precip.time.dt.day != 1, 10.0)
+    corrected = bias_correction.apply_quantile_mapping(
+        precip, qmap, kind="multiplicative"
+    ).compute()
+    assert (corrected.where(precip == 0) == 0).sum() == (precip == 0).sum()
+    assert (corrected >= 0).all()
+    ratio = qmap.observed_quantiles[-1] / qmap.model_quantiles[-1]
+    np.testing.assert_allclose(
+        corrected.where(precip == 10, drop=True),
+        (10 * ratio).broadcast_like(corrected.where(precip == 10, drop=True)),
+    )
@@ -0,0 +1,111 @@
+from cryogrid_pytools import excel_config
+from cryogrid_pytools.excel_config import CryoGridConfigExcel
+
+
+def test_config_without_strat_layers(run_dir, make_config):
+    fname = make_config(run_dir / "config" / "no_strat.xlsx", strat_layers=())
+
+    config = CryoGridConfigExcel(fname, check_file_paths=False)
+    violations = config.check_strat_layers()
+
+    assert violations.empty
+    assert list(violations.columns) == [
+        "class",
+        "layer",
+        "check",
+        *excel_config.STRAT_LAYER_PARAMS,
+    ]
+
+    report = excel_config.validate_configs([fname], n_jobs=1)
+    assert not (report.check == "strat_layers").any()
+
+
+def test_strat_layer_violations(run_dir, make_config):
+    fname = make_config(
+        run_dir / "config" / "bad_strat.xlsx", strat_layers=((0.3, 0.6, 0.3),)
+    )
+
+    config = CryoGridConfigExcel(fname, check_file_paths=False)
+    violations = config.check_strat_layers()
+
+    assert set(violations["class"]) == {"STRAT_layers_1"}
+    assert set(violations["layer"]) == {1}
+
+
+def test_generate_config_sweep_strat_layers(run_dir, make_config):
+    import pandas as pd
+
+    template = make_config(run_dir / "config" / "template.xlsx")
+    params = pd.DataFrame({"STRAT_layers_1.waterIce[0]": [0.2, 0.7]})
+
+    summary, violations = excel_config.generate_config_sweep(
+        template, params, run_dir / "config" / "sweep", n_jobs=1
+    )
+
+    assert summary.valid.tolist() == [True, False]
+    assert set(violations.run) == {1}
+    assert set(violations.layer) == {0}
+
+    for fname, water_ice in zip(summary.fname, params.iloc[:, 0]):
+        config = CryoGridConfigExcel(
+            fname, check_file_paths=False, check_strat_layers=False
+        )
+        matrix = config.get_class("STRAT_layers").iloc[0, 0][0]
+        assert float(matrix["waterIce"][0]) == water_ice
+
+
+def test_validate_configs_keeps_log_handlers(run_dir, make_config):
+    from loguru import logger
+
+    fname = make_config(run_dir / "config" / "config.xlsx")
+
+    messages = []
+    handler_id = logger.add(messages.append, level="DEBUG")
+    try:
+        excel_config.validate_configs([fname], n_jobs=1)
+        logger.info("still logging")
+    finally:
+        logger.remove(handler_id)
+
+    assert any("still logging" in message for message in messages)
+
+
+def test_parallel_cold_cache_loads(run_dir, make_config):
+    import joblib
+
+    fname = make_config(run_dir / "config" / "config.xlsx")
+    cache_dir = run_dir / "cache"
+
+    def load(fname):
+        config = CryoGridConfigExcel(fname, check_file_paths=False, cache_dir=cache_dir)
+        return config.get_classes()
+
+    results = joblib.Parallel(n_jobs=4, backend="threading")(
+        joblib.delayed(load)(fname) for _ in range(8)
+    )
+
+    assert all(result == results[0] for result in results)
+    assert [p.suffix for p in cache_dir.iterdir()] == [".pkl"]
+
+
+def test_get_classes_keys_are_python_ints(run_dir, make_config):
+    fname = make_config(run_dir / "config" / "config.xlsx")
+    config = CryoGridConfigExcel(fname, check_file_paths=False)
+
+    classes = config.get_classes()
+
+    assert "STRAT_layers" in classes.values()
+    assert all(type(key) is int for key in classes)
+
+
+def test_find_root_path_is_not_cached(tmp_path):
+    config_dir = tmp_path / "run" / "config"
+    config_dir.mkdir(parents=True)
+
+    assert excel_config._find_root_path(config_dir) is None
+
+    (tmp_path / "run" / "run_cryogrid.m").touch()
+    assert excel_config._find_root_path(config_dir) == tmp_path / "run"
+
+    (tmp_path / "run" / "run_cryogrid.m").rename(config_dir / "run_cryogrid.m")
+    assert excel_config._find_root_path(config_dir) == config_dir
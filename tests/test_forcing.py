@@ -0,0 +1,310 @@
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+from cryogrid_pytools import forcing
+
+
+def _cds_era5(n_time=30, start="2000-12-31 20:00"):
+    """ERA5 data with the CDS variable names in plausible ranges."""
+    rng = np.random.default_rng(0)
+    coords = dict(
+        time=pd.date_range(start, periods=n_time, freq="h"),
+        level=np.array([1000, 850]),
+        latitude=np.array([61.0, 60.75, 60.5]),
+        longitude=np.array([10.0, 10.25]),
+    )
+    sl_shape = (n_time, 3, 2)
+    pl_shape = (n_time, 2, 3, 2)
+
+    def field(shape, low, high):
+        return rng.uniform(low, high, size=shape)
+
+    sl_dims = ("time", "latitude", "longitude")
+    pl_dims = ("time", "level", "latitude", "longitude")
+    return xr.Dataset(
+        dict(
+            u10=(sl_dims, field(sl_shape, -10, 10)),
+            v10=(sl_dims, field(sl_shape, -10, 10)),
+            sp=(sl_dims, field(sl_shape, 9e4, 1e5)),
+            d2m=(sl_dims, field(sl_shape, 250, 280)),
+            t2m=(sl_dims, field(sl_shape, 250, 290)),
+            ssrd=(sl_dims, field(sl_shape, 0, 3e6)),
+            strd=(sl_dims, field(sl_shape, 0, 1e6)),
+            tisr=(sl_dims, field(sl_shape, 0, 4e6)),
+            tp=(sl_dims, field(sl_shape, 0, 2e-3)),
+            t=(pl_dims, field(pl_shape, 240, 290)),
+            z=(pl_dims, field(pl_shape, 1e3, 1.5e4)),
+            q=(pl_dims, field(pl_shape, 0, 1e-2)),
+            u=(pl_dims, field(pl_shape, -20, 20)),
+            v=(pl_dims, field(pl_shape, -20, 20)),
+            Zs=(("latitude", "longitude"), field((3, 2), 0, 1e4)),
+        ),
+        coords=coords,
+    )
+
+
+def test_era5_to_matlab_chunked_matches_in_memory(tmp_path):
+    ds = _cds_era5()
+
+    era = forcing.era5_to_matlab(ds, save_path=str(tmp_path / "ERA5.mat"))["era"]
+    (fname,) = forcing.era5_to_matlab_chunked(
+        ds.chunk(time=7), tmp_path / "chunked" / "ERA5.mat", time_chunk=7
+    )
+    flist = forcing.era5_to_matlab_chunked(
+        ds, tmp_path / "per_year" / "ERA5.mat", per_year=True
+    )
+
+    assert [f.name for f in flist] == ["ERA5_2000.mat", "ERA5_2001.mat"]
+    expected = forcing.read_mat_ear5(tmp_path / "ERA5.mat", decode=False)
+    chunked = forcing.read_mat_ear5(fname, decode=False)
+    per_year = xr.concat(
+        [forcing.read_mat_ear5(f, decode=False) for f in flist], dim="time"
+    )
+    for key in ["T2", "SW", "T", "q", "Z"]:
+        assert chunked[key].dtype == era[key].dtype
+        np.testing.assert_array_equal(chunked[key], expected[key])
+        np.testing.assert_array_equal(per_year[key], expected[key])
+    np.testing.assert_array_equal(chunked.time.dt.round("s"), ds.time)
+    np.testing.assert_allclose(chunked.Zs, expected.Zs)
+
+
+def test_read_mat_ear5_decodes_packed_values_lazily(tmp_path):
+    ds = _cds_era5()
+    forcing.era5_to_matlab_chunked(ds, tmp_path / "ERA5.mat", time_chunk=7)
+
+    packed = forcing.read_mat_ear5(tmp_path / "ERA5.mat", decode=False)
+    decoded = forcing.read_mat_ear5(tmp_path / "ERA5.mat")
+
+    assert packed.T2.dtype == "int16"
+    assert packed.T2.attrs["scale_factor"] == forcing.ERA5_SCALE_FACTORS["T_sf"]
+    # v7.3 files are read from disk as dask arrays
+    assert packed.T.chunks is not None and decoded.T.chunks is not None
+    assert decoded.T.dims == ("time", "level", "lat", "lon")
+
+    expected = (ds.t2m - 273.15).rename(latitude="lat", longitude="lon")
+    point = decoded.T2.isel(lat=1, lon=0).values
+    assert point.dtype.kind == "f"
+    np.testing.assert_allclose(point, expected.isel(lat=1, lon=0), atol=0.01)
+    np.testing.assert_allclose(
+        decoded.q, ds.q.rename(latitude="lat", longitude="lon"), atol=1e-6
+    )
+
+
+def _gridded_forcing(n_time=10):
+    """Forcing like read_mat_ear5 where all variables are linear in lat and lon."""
+    time = pd.date_range("2000-01-01", periods=n_time, freq="h")
+    lat = np.array([62.0, 61.5, 61.0, 60.5])  # descending as in ERA5
+    lon = np.array([10.0, 10.5, 11.0])
+    level = np.array([1000, 850, 700])
+    t = np.arange(n_time)[:, None, None, None]
+    z = np.array([100.0, 1500.0, 3000.0])[None, :, None, None]
+    lat4, lon4 = lat[None, None, :, None], lon[None, None, None, :]
+
+    return xr.Dataset(
+        dict(
+            T2=(("time", "lat", "lon"), (t + 2 * lat4 - lon4)[:, 0]),
+            T=(("time", "level", "lat", "lon"), t + lat4 + lon4 - z / 100),
+            Z=(("time", "level", "lat", "lon"), z + 0 * (t + lat4 + lon4)),
+            Zs=(("lat", "lon"), (lat4 + lon4)[0, 0]),
+        ),
+        coords=dict(time=time, level=level, lat=lat, lon=lon),
+    )
+
+
+def test_extract_point_forcing_is_lazy_and_bilinear():
+    ds = _gridded_forcing()
+    lat = xr.DataArray([61.2, 60.75], dims="cluster", coords=dict(cluster=[3, 7]))
+    lon = np.array([10.25, 10.9])
+
+    points = forcing.extract_point_forcing(ds, lat, lon, time_chunk=4)
+
+    assert points.T.dims == ("cluster", "time", "level")
+    assert points.T2.dims == ("cluster", "time")
+    assert points.T.chunks[1] == (4, 4, 2)
+    assert points.T.dtype == "float32"
+    np.testing.assert_array_equal(points.cluster, [3, 7])
+
+    t = np.arange(10)[None]
+    np.testing.assert_allclose(
+        points.T2, t + 2 * lat.values[:, None] - lon[:, None], rtol=1e-6
+    )
+    np.testing.assert_allclose(points.Zs, lat.values + lon, rtol=1e-6)
+    expected = ds.T.interp(lat=lat, lon=xr.DataArray(lon, dims="cluster"))
+    np.testing.assert_allclose(points.T, expected.transpose(*points.T.dims), rtol=1e-6)
+
+
+def test_extract_point_forcing_to_elevation():
+    ds = _gridded_forcing()
+    lat, lon = np.array([61.0, 61.5]), np.array([10.5, 11.0])
+
+    points = forcing.extract_point_forcing(ds, lat, lon, elevation=[800.0, 5000.0])
+
+    assert points.T.dims == ("point", "time")
+    # 800 m is halfway between the 100 m and 1500 m levels, 5000 m is clipped
+    t = np.arange(10)
+    np.testing.assert_allclose(points.T[0], t + 61.0 + 10.5 - 8.0, rtol=1e-6)
+    np.testing.assert_allclose(points.T[1], t + 61.5 + 11.0 - 30.0, rtol=1e-6)
+
+
+def test_era5_zarr_store_append_and_export(tmp_path):
+    ds = _cds_era5()
+    store = tmp_path / "era5.zarr"
+
+    forcing.era5_to_zarr(ds.isel(time=slice(0, 20)), store, time_chunk=8)
+    packed = forcing.era5_to_zarr(ds, store, time_chunk=8)
+    # appending the same data again adds nothing
+    packed = forcing.era5_to_zarr(ds, store, time_chunk=8)
+
+    assert packed.sizes["time"] == 30
+    assert packed.T.dtype == "int16" and packed.q.dtype == "uint16"
+    assert packed.T.encoding["chunks"] == (8, 2, 3, 3)
+    decoded = xr.open_zarr(store)
+    expected_t2 = (ds.t2m - 273.15).rename(latitude="lat", longitude="lon")
+    np.testing.assert_allclose(decoded.T2, expected_t2, atol=0.01)
+
+    forcing.era5_to_matlab(ds, save_path=str(tmp_path / "ERA5.mat"))
+    expected = forcing.read_mat_ear5(tmp_path / "ERA5.mat", decode=False)
+    fname = forcing.era5_zarr_to_matlab(store, tmp_path / "from_zarr.mat")
+    exported = forcing.read_mat_ear5(fname, decode=False)
+    for key in ["T2", "P", "T", "q", "Z"]:
+        np.testing.assert_array_equal(packed[key], expected[key])
+        np.testing.assert_array_equal(exported[key], expected[key])
+    np.testing.assert_allclose(exported.Zs, expected.Zs)
+
+    window = forcing.era5_zarr_to_matlab(
+        store,
+        tmp_path / "window.mat",
+        time=slice("2001-01-01", None),
+        bbox=(10.0, 60.6, 10.3, 61.0),
+        v73=True,
+    )
+    window = forcing.read_mat_ear5(window, decode=False)
+    assert dict(window.sizes) == dict(time=26, level=2, lat=2, lon=2)
+    np.testing.assert_array_equal(
+        window.T, expected.T.isel(time=slice(4, None), lat=[0, 1])
+    )
+
+
+def _write_cds_files(ds, path, n_files=3):
+    """Split ERA5 data into single level, pressure level and Zs netCDF files."""
+    names = dict(time="valid_time", level="pressure_level")
+    pl_vars = ["t", "z", "q", "u", "v"]
+    sl_vars = [k for k in ds.data_vars if k not in pl_vars + ["Zs"]]
+
+    path.mkdir()
+    zs = ds[["Zs"]].rename(Zs="z").expand_dims(valid_time=ds.time.values[:1])
+    zs.to_netcdf(path / "zs.nc")
+    bounds = np.linspace(0, ds.sizes["time"], n_files + 1).astype(int)
+    # reversed, so the files are not written in time order
+    for i0, i1 in reversed(list(zip(bounds[:-1], bounds[1:]))):
+        part = ds.isel(time=slice(i0, i1)).rename(names)
+        part[sl_vars].to_netcdf(path / f"sl_{i0:02d}.nc")
+        part[pl_vars].to_netcdf(path / f"pl_{i0:02d}.nc")
+
+    return path
+
+
+def test_era5_files_to_zarr_matches_era5_to_zarr(tmp_path):
+    ds = _cds_era5()
+    path = _write_cds_files(ds, tmp_path / "cds")
+    store = tmp_path / "files.zarr"
+
+    def assemble():
+        return forcing.era5_files_to_zarr(
+            path / "sl_*.nc",
+            path / "pl_*.nc",
+            path / "zs.nc",
+            store,
+            time_chunk=8,
+            n_jobs=1,
+        )
+
+    packed = assemble()
+    expected = forcing.era5_to_zarr(ds, tmp_path / "single.zarr", time_chunk=8)
+
+    assert packed.sizes["time"] == 30
+    xr.testing.assert_identical(packed.drop_attrs(), expected.drop_attrs())
+
+    # running again on the same files adds no time steps
+    packed = assemble()
+    assert packed.sizes["time"] == 30
+    np.testing.assert_array_equal(packed.time, ds.time)
+
+
+def test_packing_qa_counts_and_locates_violations(tmp_path):
+    ds = _cds_era5()
+    ds["tp"][3, 1, 0] = -1e-3  # -1 mm wraps around in uint16
+    ds["t2m"][20, 2, 1] = 273.15 + 400  # 40000 is above the int16 range
+    ds["t2m"][21, 0, 0] = 273.15 + 80  # packs fine, but is not plausible
+    ds["u"][5, 1, 2, 0] = np.nan
+
+    qa = forcing.PackingQA()
+    forcing.era5_to_matlab_chunked(ds, tmp_path / "ERA5.mat", time_chunk=7, qa=qa)
+
+    counts = qa.counts
+    assert (counts.n == ds.t2m.size).loc[["T2", "P"]].all()
+    assert counts.loc["u", "n"] == ds.u.size
+    assert counts.loc["P", ["below_dtype", "below_physical"]].tolist() == [1, 1]
+    assert counts.loc["T2", ["above_dtype", "above_physical"]].tolist() == [1, 2]
+    assert counts.loc["u", "nan"] == 1
+    assert counts.drop(["P", "T2", "u"]).drop(columns="n").eq(0).all().all()
+
+    def location(variable, check):
+        locations = qa.locations
+        found = locations[(locations.variable == variable) & (locations.check == check)]
+        assert len(found) == 1
+        return found.iloc[0]
+
+    overflow = location("T2", "above_dtype")
+    assert overflow.time == ds.time[20]
+    assert (overflow.latitude, overflow.longitude) == (60.5, 10.25)
+    np.testing.assert_allclose(overflow.value, 400)
+    assert location("P", "below_dtype").time == ds.time[3]
+    assert location("u", "nan").level == 850
+
+    # the counts of worker instances add up
+    total = forcing.PackingQA()
+    for part in (ds.isel(time=slice(0, 10)), ds.isel(time=slice(10, None))):
+        worker = forcing.PackingQA()
+        forcing.era5_to_matlab(part, qa=worker)
+        total.merge(worker)
+    assert total.counts.equals(counts)
+    assert len(total.locations) == len(qa.locations)
+
+
+def test_pack_era5_files_closes_files(tmp_path, monkeypatch):
+    ds = _cds_era5()
+    path = _write_cds_files(ds, tmp_path / "cds")
+
+    opened = []
+    open_dataset = xr.open_dataset
+
+    def open_and_keep(*args, **kwargs):
+        opened.append(open_dataset(*args, **kwargs))
+        return opened[-1]
+
+    def n_open():
+        # Dataset.close removes the close callback
+        return sum(d._close is not None for d in opened)
+
+    monkeypatch.setattr(xr, "open_dataset", open_and_keep)
+
+    # no time steps after the end of the store
+    packed, qa = forcing._pack_era5_files(
+        path / "sl_00.nc", path / "pl_00.nc", path / "zs.nc", after=ds.time[-1].values
+    )
+    assert packed is None and qa is None
+    assert len(opened) == 3 and n_open() == 0
+
+    # the pressure level file of other time steps
+    with pytest.raises(ValueError, match="do not have the same time steps"):
+        forcing._pack_era5_files(path / "sl_00.nc", path / "pl_10.nc", path / "zs.nc")
+    assert len(opened) == 6 and n_open() == 0
+
+    packed, qa = forcing._pack_era5_files(
+        path / "sl_10.nc", path / "pl_10.nc", path / "zs.nc"
+    )
+    assert n_open() == 0
+    assert packed.sizes["time"] == 10 and qa.counts.loc["T2", "n"] == 10 * 3 * 2
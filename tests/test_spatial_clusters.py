@@ -0,0 +1,277 @@
+import numpy as np
+import xarray as xr
+
+from cryogrid_pytools import spatial_clusters
+
+
+def test_aggregate_pixels_to_clusters_sparse_labels():
+    rng = np.random.default_rng(0)
+    labels = rng.integers(0, 4, (20, 30))
+    data = xr.DataArray(rng.normal(size=(20, 30)), dims=("y", "x"), name="a")
+
+    dense = xr.DataArray(labels, dims=("y", "x"), name="cluster_number_mapped")
+    # e.g., cluster_centroid_index_mapped where the labels are pixel indices
+    sparse = dense.where(dense == 0, dense * 10**9 + 7).rename("centroid_index")
+
+    ds_dense = spatial_clusters.aggregate_pixels_to_clusters(data, dense)
+    ds_sparse = spatial_clusters.aggregate_pixels_to_clusters(data, sparse)
+
+    assert ds_sparse.cluster.values.tolist() == [
+        10**9 + 7,
+        2 * 10**9 + 7,
+        3 * 10**9 + 7,
+    ]
+    np.testing.assert_allclose(ds_sparse.a.values, ds_dense.a.values)
+    for label in [1, 2, 3]:
+        expected = data.values[labels == label].mean()
+        actual = ds_dense.a.sel(cluster=label, stat="mean").item()
+        np.testing.assert_allclose(actual, expected)
+
+
+def test_read_spatial_data_regular_grid(spatial_mat):
+    import pandas as pd
+
+    from cryogrid_pytools.matlab_helpers import read_mat_struct_flat_as_dict
+
+    ds = spatial_clusters.read_spatial_data(spatial_mat)
+
+    flat = read_mat_struct_flat_as_dict(spatial_mat)
+    flat.pop("sample_centroid_index")
+    expected = pd.DataFrame(flat).set_index(["Y", "X"]).to_xarray()
+
+    assert ds.elevation.dims == ("y", "x")
+    np.testing.assert_array_equal(ds.elevation, expected.elevation)
+    np.testing.assert_array_equal(ds.cluster_number_mapped, expected.cluster_number)
+    # the first three pixels (MATLAB order) are the centroids of clusters 1-3
+    assert ds.cluster_centroid_index_mapped.dtype == "uint32"
+    np.testing.assert_array_equal(
+        ds.cluster_centroid_index_mapped, expected.cluster_number
+    )
+    assert ds.matlab_index.values[1, 0] == 2
+
+
+def test_read_spatial_data_irregular_grid(tmp_path, write_spatial_mat):
+    from scipy.io import loadmat, savemat
+
+    fname = tmp_path / "run_spatial_info.mat"
+    raw = loadmat(write_spatial_mat(fname))["data"][0, 0]
+    # drop the last pixel so that the points do not fill the grid
+    data = {k: raw[k][:-1] for k in raw.dtype.names}
+    data["sample_centroid_index"] = raw["sample_centroid_index"]
+    savemat(fname, dict(data=data))
+
+    ds = spatial_clusters.read_spatial_data(fname)
+
+    assert ds.elevation.shape == (4, 5)
+    assert np.isnan(ds.elevation.values[-1, -1])
+    assert ds.cluster_centroid_index_mapped.values[-1, -1] == 0
+
+
+def test_map_gridcells_to_clusters_keeps_other_dims():
+    labels = xr.DataArray(
+        np.array([[5, 9, 0], [9, 7, 5]], dtype="uint32"), dims=("y", "x")
+    )
+    rng = np.random.default_rng(0)
+    da = xr.DataArray(
+        rng.normal(size=(3, 4, 2)).astype("float32"),
+        dims=("profile", "time", "depth"),
+        coords={"profile": [5, 9, 11]},
+    )
+
+    mapped = spatial_clusters.map_gridcells_to_clusters(da, labels, missing_value=-1)
+    lazy = spatial_clusters.map_gridcells_to_clusters(
+        da.chunk(time=1), labels, missing_value=-1
+    )
+
+    assert mapped.dims == ("time", "depth", "y", "x")
+    assert mapped.dtype == "float32"
+    assert lazy.chunks is not None
+    np.testing.assert_array_equal(lazy.compute(), mapped)
+    np.testing.assert_array_equal(mapped[..., 0, 0], da.sel(profile=5))
+    np.testing.assert_array_equal(mapped[..., 1, 0], da.sel(profile=9))
+    assert np.isnan(mapped[..., 0, 2]).all()  # masked
+    assert (mapped[..., 1, 1] == -1).all()  # centroid 7 is not a profile
+
+
+def _profile_outputs(n_profiles=3):
+    import pandas as pd
+
+    time = pd.date_range("2000-01-01", periods=2, freq="MS")
+    rng = np.random.default_rng(0)
+    return xr.Dataset(
+        dict(
+            T=(("profile", "time", "depth"), rng.normal(size=(n_profiles, 2, 2))),
+            elevation=("profile", 1000 + np.arange(n_profiles, dtype=float)),
+        ),
+        coords=dict(profile=np.arange(1, n_profiles + 1), time=time, depth=[0, -1]),
+    )
+
+
+def test_write_mapped_profiles_zarr(tmp_path, spatial_mat):
+    import rioxarray  # noqa
+
+    ds_spatial = spatial_clusters.read_spatial_data(spatial_mat, crs="EPSG:32633")
+    ds_profiles = _profile_outputs()
+
+    store = spatial_clusters.write_mapped_profiles_zarr(
+        ds_profiles, ds_spatial, tmp_path / "mapped.zarr", chunks=dict(time=1), n_jobs=2
+    )
+    ds = xr.open_zarr(store, decode_coords="all")
+
+    assert ds["T"].dims == ("time", "depth", "y", "x")
+    assert ds["T"].dtype == "float32"
+    assert ds.y.values[0] > ds.y.values[-1]  # north up
+    assert ds.rio.crs == "EPSG:32633"
+
+    expected = spatial_clusters.map_gridcells_to_clusters(
+        ds_profiles["T"].astype("float32"),
+        ds_spatial.cluster_centroid_index_mapped,
+        dim="profile",
+    ).sortby("y", ascending=False)
+    np.testing.assert_array_equal(ds["T"], expected)
+
+
+def test_write_mapped_profiles_geotiffs(tmp_path, spatial_mat):
+    import rioxarray
+
+    ds_spatial = spatial_clusters.read_spatial_data(spatial_mat, crs="EPSG:32633")
+    ds_profiles = _profile_outputs()
+
+    flist = spatial_clusters.write_mapped_profiles_geotiffs(
+        ds_profiles,
+        ds_spatial,
+        str(tmp_path / "{variable}" / "{time:%Y%m}_{depth}.tif"),
+        variables=["T"],
+        n_jobs=1,
+        verbose=0,
+    )
+
+    assert len(flist) == 4
+    da = rioxarray.open_rasterio(tmp_path / "T" / "200002_-1.tif").squeeze("band")
+    expected = spatial_clusters.map_gridcells_to_clusters(
+        ds_profiles["T"].isel(time=1).sel(depth=-1),
+        ds_spatial.cluster_centroid_index_mapped,
+        dim="profile",
+    ).sortby("y", ascending=False)
+    np.testing.assert_allclose(da.values, expected.values, rtol=1e-6)
+
+
+def test_aggregate_pixels_to_clusters_std_large_offset():
+    rng = np.random.default_rng(0)
+    labels = xr.DataArray(rng.integers(0, 4, (40, 60)), dims=("y", "x"))
+    # e.g., elevation in mm: a large offset with a small spread
+    values = 1e9 + rng.normal(size=(2, 40, 60))
+    data = xr.DataArray(values, dims=("band", "y", "x"), name="elevation")
+
+    in_memory = spatial_clusters.aggregate_pixels_to_clusters(data, labels)
+    chunked = spatial_clusters.aggregate_pixels_to_clusters(
+        data.chunk(y=15, x=25), labels
+    )
+
+    for label in [1, 2, 3]:
+        members = values[:, labels.values == label]
+        for ds in [in_memory, chunked]:
+            std = ds.elevation.sel(cluster=label, stat="std").values
+            np.testing.assert_allclose(std, members.std(axis=-1), rtol=1e-6)
+            mean = ds.elevation.sel(cluster=label, stat="mean").values
+            np.testing.assert_allclose(mean, members.mean(axis=-1))
+
+
+def test_aggregate_pixels_to_clusters_keeps_leading_chunks(monkeypatch):
+    rng = np.random.default_rng(0)
+    labels = xr.DataArray(rng.integers(0, 4, (40, 60)), dims=("y", "x"))
+    data = xr.Dataset(
+        dict(
+            albedo=(("band", "y", "x"), rng.uniform(size=(3, 40, 60))),
+            land_cover=(("band", "y", "x"), rng.integers(1, 4, (3, 40, 60)) * 10.0),
+        )
+    )
+
+    shapes = []
+    partial_stats = spatial_clusters._bincount_partial_stats
+
+    def record_shapes(labels, values, n_clusters):
+        shapes.append(np.shape(values))
+        return partial_stats(labels, values, n_clusters)
+
+    in_memory = spatial_clusters.aggregate_pixels_to_clusters(
+        data, labels, categorical=["land_cover"]
+    )
+    monkeypatch.setattr(spatial_clusters, "_bincount_partial_stats", record_shapes)
+    chunked = spatial_clusters.aggregate_pixels_to_clusters(
+        data.chunk(band=1, y=15, x=25), labels, categorical=["land_cover"]
+    )
+
+    # each task only reduces one band of one spatial block
+    assert len(shapes) == 3 * 3 * 3
+    assert max(shapes) == (1, 15, 25)
+    xr.testing.assert_allclose(chunked, in_memory)
+    members = data.albedo.values[:, labels.values == 2]
+    np.testing.assert_allclose(
+        chunked.albedo.sel(cluster=2, stat="std"), members.std(axis=-1)
+    )
+
+
+def test_cluster_representativeness(spatial_mat):
+    ds_spatial = spatial_clusters.read_spatial_data(spatial_mat)
+
+    report = spatial_clusters.calc_cluster_representativeness(ds_spatial)
+
+    assert report.variable.values.tolist() == ["elevation", "slope_angle"]
+    assert report.cluster.values.tolist() == [1, 2, 3]
+    assert report.n_pixels.values.tolist() == [7, 7, 6]
+
+    labels = ds_spatial.cluster_number_mapped.values
+    matlab_index = ds_spatial.matlab_index.values
+    for cluster, centroid in zip([1, 2, 3], [1, 2, 3]):
+        elevation = ds_spatial.elevation.values
+        centroid_value = elevation[matlab_index == centroid].item()
+        members = elevation[labels == cluster]
+        rep = report.sel(cluster=cluster, variable="elevation")
+        assert rep.centroid_value == centroid_value
+        np.testing.assert_allclose(rep.centroid_bias, members.mean() - centroid_value)
+        np.testing.assert_allclose(
+            rep.centroid_max_abs_diff, np.abs(members - centroid_value).max()
+        )
+    worst = report.distance_mean.idxmax().item()
+    assert report["rank"].sel(cluster=worst) == 1
+    assert sorted(report["rank"].values.tolist()) == [1, 2, 3]
+
+
+def test_recluster_spatial_data_chunked_assignment(spatial_mat):
+    ds_spatial = spatial_clusters.read_spatial_data(spatial_mat)
+    # three well separated groups of pixels along x
+    group = np.broadcast_to(np.arange(5) // 2, (4, 5))
+    ds_spatial["elevation"] = ds_spatial.elevation.copy(data=1000.0 * group)
+    ds_spatial["slope_angle"] = ds_spatial.slope_angle.copy(data=10.0 * group)
+
+    ds = spatial_clusters.recluster_spatial_data(ds_spatial, 3)
+    # a budget of 12 bytes assigns one pixel at a time
+    ds_small = spatial_clusters.recluster_spatial_data(ds_spatial, 3, chunk_bytes=12)
+
+    np.testing.assert_array_equal(
+        ds.cluster_number_mapped, ds_small.cluster_number_mapped
+    )
+    labels = ds.cluster_number_mapped.values
+    for g in range(3):
+        assert np.unique(labels[group == g]).size == 1
+    assert np.unique(labels).size == 3
+
+    # each centroid is a member of its own cluster
+    centroid_index = ds.cluster_centroid_index.values
+    for k in range(1, 4):
+        pixel = ds.matlab_index.values == centroid_index[k]
+        assert labels[pixel].item() == k
+
+
+def test_assign_nearest_keeps_feature_dtype():
+    rng = np.random.default_rng(0)
+    features = rng.normal(size=(50, 3)).astype("float32")
+    centres = rng.normal(size=(4, 3))
+
+    labels, distance = spatial_clusters._assign_nearest(features, centres, 7)
+
+    expected = ((features[:, None] - centres[None]) ** 2).sum(axis=-1)
+    np.testing.assert_array_equal(labels, expected.argmin(axis=1))
+    np.testing.assert_allclose(distance, expected.min(axis=1), rtol=1e-4, atol=1e-5)
+    assert distance.dtype == "float32"
@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from cryogrid_pytools import trends
+
+
+def _step_series(coord, dim):
+    # cell 0: a jump of 10 after the 12th step, cell 1: a linear trend of 0.5
+    # per step starting at 1, cell 2: missing
+    n = coord.size
+    step = np.where(np.arange(n) >= 12, 10.0, 0.0) + 0.5 * (-1) ** np.arange(n)
+    linear = 1 + 0.5 * np.arange(n)
+    data = np.stack([step, linear, np.full(n, np.nan)])
+    return xr.DataArray(data, dims=("cell", dim), coords={dim: coord})
+
+
+def test_trends_numeric_coordinate():
+    da = _step_series(np.arange(1990, 2020), "year")
+
+    ds = trends.calc_trends(da)
+
+    assert ds.changepoint.sel(cell=0).item() == 2001
+    assert ds.changepoint_pvalue.sel(cell=0) < 0.01
+    # the intercept is the trend line at the first year, not at year 0
+    np.testing.assert_allclose(ds.slope.sel(cell=1), 0.5)
+    np.testing.assert_allclose(ds.intercept.sel(cell=1), 1.0)
+    assert ds.mk_pvalue.sel(cell=1) < 0.01
+    assert ds.sel(cell=2).isnull().all()
+
+
+def test_trends_datetime_coordinate():
+    time = pd.date_range("2000-01-01", periods=30, freq="YS")
+    da = _step_series(time, "time")
+
+    ds = trends.calc_trends(da, dim="time")
+
+    assert ds.changepoint.dtype.kind == "M"
+    assert ds.changepoint.sel(cell=0).values == time[11]
+    assert np.isnat(ds.changepoint.sel(cell=2).values)
+
+    # slopes are per year and intercepts at the first time step
+    np.testing.assert_allclose(ds.slope.sel(cell=1), 0.5, rtol=1e-2)
+    np.testing.assert_allclose(ds.intercept.sel(cell=1), 1.0, atol=1e-2)
+
+
+def test_theil_sen_blocks_match_single_pass():
+    rng = np.random.default_rng(0)
+    arr = rng.normal(size=(5, 7, 20))
+    arr[1, 2, ::3] = np.nan
+    t = np.arange(20.0)
+
+    single = trends._theil_sen_slope(arr, t)
+    blocked = trends._theil_sen_slope(arr, t, max_elements=1)
+
+    i, j = np.triu_indices(20, k=1)
+    expected = np.nanmedian((arr[..., j] - arr[..., i]) / (t[j] - t[i]), axis=-1)
+    np.testing.assert_allclose(single, expected)
+    np.testing.assert_allclose(blocked, expected)
+
+
+def test_cluster_trends_map_datetime_changepoints():
+    time = pd.date_range("2000-01-01", periods=30, freq="YS")
+    da = _step_series(time, "time").rename(cell="profile")
+    da = da.assign_coords(profile=[1, 2, 3])
+    labels = xr.DataArray(np.array([[1, 2], [3, 0]], dtype="uint32"), dims=("y", "x"))
+
+    ds = trends.calc_cluster_trends(da, labels, dim="time")
+
+    assert ds.changepoint.dims == ("y", "x")
+    assert ds.changepoint.values[0, 0] == time[11]
+    assert np.isnat(ds.changepoint.values[1, 1])
+    assert ds.slope.values[0, 1] == trends.calc_trends(da, dim="time").slope[1]
+
+
+def test_mann_kendall_variance_is_corrected_for_ties():
+    # e.g., active layer depths snapped to the output levels
+    tied = np.array([0.0, 0.0, 0.0, 1.0, 1.0, 2.0, 2.0, 2.0, 2.0, 3.0])
+    da = xr.DataArray(
+        np.stack([tied, np.r_[tied[:4], np.nan, tied[5:]], -tied]),
+        dims=("cell", "year"),
+        coords={"year": np.arange(2000, 2010)},
+        attrs={"units": "m"},
+    )
+
+    ds = trends.calc_trends(da)
+
+    # 45 pairs of which 10 are tied; tie groups of 3, 2 and 4 values give
+    # var(S) = (10 * 9 * 25 - (3 * 2 * 11 + 2 * 1 * 9 + 4 * 3 * 13)) / 18
+    np.testing.assert_allclose(ds.mk_s.values, [35, 27, -35])
+    np.testing.assert_allclose(ds.mk_z[0], 34 / np.sqrt(335 / 3))
+    np.testing.assert_allclose(ds.mk_z[2], -ds.mk_z[0])
+    # 9 values with tie groups of 3, 1 and 4: (9 * 8 * 23 - (66 + 156)) / 18
+    np.testing.assert_allclose(ds.mk_z[1], 26 / np.sqrt(1434 / 18))
+    assert ds.slope.attrs["units"] == "m / year"
+
+    time = pd.date_range("2000-01-01", periods=10, freq="YS")
+    per_time = trends.calc_trends(
+        da.rename(year="time").assign_coords(time=time), "time"
+    )
+    assert per_time.slope.attrs["units"] == "m / year"
+    np.testing.assert_allclose(per_time.mk_z, ds.mk_z)
@@ -0,0 +1,151 @@
+import geopandas as gpd
+import numpy as np
+import xarray as xr
+from shapely import geometry
+
+from cryogrid_pytools import xr_raster_vector as rv
+
+
+def _target_grid(ny=30, nx=40):
+    return xr.DataArray(
+        np.zeros((ny, nx)),
+        dims=("y", "x"),
+        coords=dict(y=np.arange(ny)[::-1] + 0.5, x=np.arange(nx) + 0.5),
+    ).rio.write_crs(32632)
+
+
+def test_polygons_to_raster_int_single_pass_and_tiles():
+    da = _target_grid()
+    df = gpd.GeoDataFrame(
+        dict(
+            kind=["a", "b", "a", "c", "b"],
+            geometry=[
+                geometry.box(2, 3, 15, 12),
+                geometry.box(10, 8, 30, 25),  # overlaps the first box
+                geometry.Polygon(),
+                geometry.box(33, 1, 39, 29).union(geometry.box(5, 20, 8, 28)),
+                geometry.box(18.3, 2.2, 25.7, 6.6),  # not aligned to the grid
+            ],
+        ),
+        crs=32632,
+    )
+
+    mask = rv.polygons_to_raster_int(df, da)
+    tiled = rv.polygons_to_raster_int(df, da, tile_size=7, n_jobs=2)
+
+    # the previous implementation: one boolean grid per polygon and the max
+    expected = np.zeros(mask.shape, dtype=int)
+    for value, polygon in enumerate(df.geometry, start=1):
+        if not polygon.is_empty:
+            burned = rv.polygon_to_raster_bool(polygon, da).values
+            expected = np.maximum(expected, burned * value)
+
+    assert mask.dtype == "int32"
+    assert mask.dims == ("y", "x")
+    np.testing.assert_array_equal(mask.y, da.y)
+    np.testing.assert_array_equal(mask, expected)
+    np.testing.assert_array_equal(tiled, expected)
+    assert set(np.unique(mask)) == {0, 1, 2, 4, 5}
+
+    grouped = rv.polygons_to_raster_int(df, da, by_column="kind")
+    assert set(np.unique(grouped)) == {0, 1, 2, 3}
+    np.testing.assert_array_equal(grouped == 3, expected == 4)
+
+
+def test_raster_int_to_vector_many_classes():
+    rng = np.random.default_rng(0)
+    # 40 classes in blocks of 2 x 2 pixels, 8 of them appear twice
+    blocks = rng.permutation(np.arange(48) % 40 + 100).reshape(6, 8)
+    da = _target_grid(12, 16).copy(data=np.kron(blocks, np.ones((2, 2), dtype=int)))
+
+    gdf = rv.raster_int_to_vector(da, n_jobs=2)
+
+    values = np.unique(da)
+    assert len(gdf) == values.size > 20
+    assert gdf["class"].tolist() == [str(v) for v in values]
+    assert gdf.crs == da.rio.crs
+    # each class is one (multi)polygon with the area of its pixels
+    counts = [(da == v).sum().item() for v in values]
+    np.testing.assert_allclose(gdf.area, counts)
+    for value, polygon in zip(values, gdf.geometry):
+        y, x = np.nonzero((da == value).values)
+        points = gpd.points_from_xy(da.x.values[x], da.y.values[y])
+        assert polygon.contains(points).all()
+
+    names = [f"cluster {v}" for v in values]
+    named = rv.raster_int_to_vector(da, names=names, simplify_dist=0.1)
+    assert named["class"].tolist() == names
+
+
+def _snow_masks(n_time=4):
+    rng = np.random.default_rng(0)
+    da = _target_grid(20, 24)
+    noise = rng.uniform(size=(n_time, 20, 24))
+    return xr.DataArray(
+        noise > 0.4,
+        dims=("time", "y", "x"),
+        coords=dict(time=np.arange(n_time), y=da.y, x=da.x),
+    )
+
+
+def test_morph_slices_threaded_lazy_and_tiled(monkeypatch):
+    import joblib
+    from skimage import morphology
+
+    da = _snow_masks()
+    footprint = np.ones((3, 3), dtype=bool)
+    expected = np.stack(
+        [morphology.binary_opening(s, footprint=footprint) for s in da.values]
+    )
+
+    threaded = da.morph.binary_opening(dim="time", footprint=footprint, n_jobs=2)
+    lazy = da.chunk(time=1).morph.binary_opening(dim="time", footprint=footprint)
+    np.testing.assert_array_equal(threaded, expected)
+    assert lazy.chunks is not None
+    np.testing.assert_array_equal(lazy, expected)
+
+    # the tiles run in the dask scheduler without a nested thread pool
+    def no_pool(*args, **kwargs):
+        raise AssertionError("joblib.Parallel used within a dask task")
+
+    monkeypatch.setattr(joblib, "Parallel", no_pool)
+    tiled = da.morph.binary_opening(dim="time", footprint=footprint, tile_size=8)
+    assert tiled.chunks[1:] == ((8, 8, 4), (8, 8, 8))
+    np.testing.assert_array_equal(tiled.compute(), expected)
+    monkeypatch.undo()
+
+    cleaned = da.morph.clean(min_hole_size=4, min_object_size=4, dim="time")
+    for i, s in enumerate(da.values):
+        s = morphology.remove_small_objects(s, min_size=4)
+        s = morphology.remove_small_holes(s, area_threshold=4)
+        s = morphology.binary_closing(morphology.binary_opening(s))
+        np.testing.assert_array_equal(cleaned[i], s)
+
+    labels = cleaned.morph.label(dim="time", return_num=True)
+    assert labels.counts.dims == ("time", "label")
+    for i in range(da.sizes["time"]):
+        n_pixels = np.bincount(labels.labels[i].values.ravel())
+        np.testing.assert_array_equal(labels.counts[i, : n_pixels.size], n_pixels)
+
+
+def test_smooth_data_tiled_keeps_dtype():
+    from cryogrid_pytools.data.utils import smooth_data
+
+    rng = np.random.default_rng(0)
+    dem = _target_grid().copy(data=rng.uniform(0, 3000, size=(30, 40)))
+
+    # non-float data is smoothed as float64, as before tiling was added
+    dtypes = dict(float64="float64", float32="float32", int16="float64", bool="float64")
+    for dtype, expected in dtypes.items():
+        da = dem.astype(dtype)
+        in_memory = smooth_data(da, kernel_size=5, n_iters=2)
+        tiled = smooth_data(da, kernel_size=5, n_iters=2, tile_size=8)
+        lazy = smooth_data(da.chunk(x=13, y=11), kernel_size=5, n_iters=2)
+
+        assert in_memory.dtype == expected
+        assert tiled.chunks[0] == (8, 8, 8, 6)
+        for result in [tiled, lazy]:
+            assert result.dtype == expected
+            computed = result.compute()
+            assert computed.dtype == expected
+            np.testing.assert_allclose(computed, in_memory, rtol=1e-6)